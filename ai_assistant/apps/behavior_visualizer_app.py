@@ -7,6 +7,9 @@ from PIL import Image
 # 从我们自己的包里导入模块
 from ai_assistant.core.webcam_handler import WebcamHandler
 from ai_assistant.ui.charts import BehaviorVisualizer
+from ai_assistant.core.observation_store import observation_store
+from ai_assistant.core.rollups import rollup_engine
+from ai_assistant.core.series import observation_series
 
 class BehaviorVisualizationApp(ctk.CTk):
     """
@@ -45,7 +48,8 @@ class BehaviorVisualizationApp(ctk.CTk):
         main_frame = ctk.CTkFrame(self, fg_color="#1a1a1a")
         main_frame.grid(row=1, column=0, sticky="nsew", padx=10, pady=10)
         # 将BehaviorVisualizer实例放入这个框架
-        self.behavior_visualizer = BehaviorVisualizer(main_frame)
+        # 饼图的统计来自统计引擎，与主应用的每日总结、报表使用同一份数据
+        self.behavior_visualizer = BehaviorVisualizer(main_frame, rollups=rollup_engine)
         
         # --- 状态与控制栏 ---
         status_frame = ctk.CTkFrame(self, fg_color="#2a2a2a", corner_radius=0)
@@ -75,7 +79,12 @@ class BehaviorVisualizationApp(ctk.CTk):
         """
         # 在主线程中安全地更新UI
         self.update_status(f"最新检测: {behavior_desc} (情绪: {emotion})")
-        self.behavior_visualizer.add_behavior_data(timestamp, behavior_num)
+        observation = {"timestamp": timestamp, "behavior_num": behavior_num, "behavior_desc": behavior_desc,
+                       "emotion": emotion, "analysis": analysis_text}
+        observation_store.add(observation)
+        rollup_engine.add(observation)
+        # 图表直接读取共享观察序列
+        observation_series.add(observation)
 
     def update_status(self, text: str):
         """更新UI上的状态标签。"""
@@ -99,6 +108,7 @@ class BehaviorVisualizationApp(ctk.CTk):
         print("正在关闭应用...")
         self.webcam_handler.stop()
         self.behavior_visualizer.stop()
+        observation_store.close()
         self.destroy()
 
 def main():
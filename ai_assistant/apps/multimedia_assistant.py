@@ -1,19 +1,35 @@
 # ai_assistant/apps/multimedia_assistant.py
 
 import customtkinter as ctk
-import queue
+import asyncio
+import itertools
 import threading
 import time
 from PIL import Image
 from datetime import datetime
-import logging
+from concurrent.futures import CancelledError
 import os
 
 # 从我们自己的包里导入所有需要的模块
 from ai_assistant.core.webcam_handler import WebcamHandler
 from ai_assistant.core.audio_processing import VoiceActivityDetector, AudioPlayer, AudioTranscriber
-from ai_assistant.core.api_clients import deepseek_client
-from ai_assistant.utils.helpers import extract_emotion_type, extract_behavior_type, log_observation_to_file
+from ai_assistant.core.audio_devices import audio_manager
+from ai_assistant.core.api_clients import async_deepseek_client
+from ai_assistant.core.async_runtime import runtime
+from ai_assistant.core.http_transport import call_with_retry, transport_stats
+from ai_assistant.core.conversation import ConversationContext, estimate_message_tokens
+from ai_assistant.core.governor import governor, ThrottledError
+from ai_assistant.core.speculator import ReplySpeculator
+from ai_assistant.core.coalescer import UtteranceCoalescer
+from ai_assistant.core.observation_store import observation_store
+from ai_assistant.core.series import observation_series
+from ai_assistant.core.log_writer import setup_logging, archive_legacy_logs
+from ai_assistant.core.rollups import rollup_engine, format_rollup
+from ai_assistant.core.daily_summary import daily_summarizer
+from ai_assistant.core.retrieval import memory_index
+from ai_assistant.core.scheduler import MessageScheduler, Job, JobCancelled
+from ai_assistant.utils.helpers import extract_emotion_type, extract_behavior_type, split_completed_sentences
+from ai_assistant.utils.metrics import turn_metrics, llm_usage
 from ai_assistant.utils import config
 
 class MultimediaAssistantApp(ctk.CTk):
@@ -28,10 +44,10 @@ class MultimediaAssistantApp(ctk.CTk):
         self.geometry("1000x800")
         
         # --- 数据与状态管理 ---
-        self.message_queue = queue.PriorityQueue() # 优先级队列，用于异步处理任务
         self.message_id_counter = 0
         self.placeholder_map = {} # 用于存储UI占位符 {placeholder_id: ctk_widget}
-        self.observation_history = [] # 存储最近的观察结果
+        self.stream_bubbles = {} # 流式回复中的聊天气泡 {bubble_id: text_label}
+        self.turn_ids = itertools.count(1) # 多个通道并发生成回复，用线程安全的计数器
         self.is_playing_audio = False # 全局状态，用于避免在TTS播放时进行VAD
 
         # --- 对话上下文管理 ---
@@ -56,16 +72,19 @@ class MultimediaAssistantApp(ctk.CTk):
         self.last_response_time = 0
 
         # --- 新增情绪计数器 ---
-        self.negative_emotion_streak = 0 # 用于记录连续负面情绪的次数
-        self.chat_context = [self.system_message]
+        # 连续负面情绪次数由 rollup_engine.negative_streak 维护
+        # 按token预算管理上下文，旧消息在后台折叠为摘要 (见 core/conversation.py)
+        self.conversation = ConversationContext(self.system_message)
 
 
         
         # --- 日志配置 ---
-        logging.basicConfig(
-            filename=config.LOG_FILE, level=logging.INFO,
-            format='%(asctime)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S'
-        )
+        # 日志由后台线程批量写入、按天轮转并压缩归档，不在界面和分析线程上做文件I/O
+        self.log_writer = setup_logging()
+        # 旧版的每日JSONL观察日志在后台导入数据库后，与不分天的 behavior_log.txt 一起压缩归档（不参与过期清理）
+        threading.Thread(target=archive_legacy_logs, daemon=True).start()
+        # 在后台载入最近几天的历史到本地检索索引，之后增量更新
+        threading.Thread(target=memory_index.bootstrap, daemon=True).start()
         
         # --- UI初始化 ---
         self._setup_ui()
@@ -77,14 +96,29 @@ class MultimediaAssistantApp(ctk.CTk):
         self.audio_transcriber = AudioTranscriber(self)
         
         # --- 启动所有后台进程 ---
-        self.processing_running = True
-        self.processing_thread = threading.Thread(target=self._process_message_queue)
-        self.processing_thread.daemon = True
-        self.processing_thread.start()
+        # 音频设备只在启动时初始化一次，之后所有组件共享，避免在关键路径上枚举设备
+        threading.Thread(target=audio_manager.start, daemon=True).start()
+
+        # 分通道、可抢占的消息调度器：语音提问不再排在过时的图像分析后面
+        self.scheduler = MessageScheduler({
+            "image_analysis": self._handle_image_analysis_message,
+            "voice_input": self._handle_voice_input_message,
+            "special_care_prompt": self._handle_special_care_message,
+            "daily_summary": self._handle_daily_summary_message,
+        })
+        self.scheduler.start()
+
+        # 空闲时预生成“下一次状态变化”的候选回复，命中时可以立即播放
+        self.speculator = ReplySpeculator(self, self._build_observation_prompt)
+
+        # 把被停顿切开的多段语音合并成一轮提问，再交给调度器
+        self.utterance_coalescer = UtteranceCoalescer(self, self._dispatch_voice_turn, self.scheduler.cancel)
         
         self.after(1000, self.webcam_handler.start)
         self.after(2000, self.voice_detector.start_monitoring)
         self.after(3000, self.audio_player.start_tts_thread)
+        # 界面显示后再在后台加载ASR模型，不阻塞窗口出现
+        self.after(500, self.audio_transcriber.start)
         self.last_notable_behavior = None # 上一个值得注意的行为
         self.last_response_time = 0       # 上一次回应的时间
         # --- 新增：启动每日总结的定时器 ---
@@ -148,31 +182,30 @@ class MultimediaAssistantApp(ctk.CTk):
         self.update_status(f"观察到: {behavior_desc} (情绪: {emotion})")
         
         observation = { "timestamp": timestamp, "behavior_num": behavior_num, "behavior_desc": behavior_desc, "emotion": emotion, "analysis": analysis_text }
-        self.observation_history.append(observation)
-        if len(self.observation_history) > 20: self.observation_history.pop(0)
+        observation_series.add(observation)
 
-        # --- 新增：调用日志记录函数 ---
-        log_observation_to_file(observation.copy()) # 传入副本以防后续被修改
+        # --- 写入观察记录数据库（后台批量写入，不阻塞界面），并增量更新统计 ---
+        observation_store.add(observation)
+        rollup_engine.add(observation)
+        memory_index.add_observation(observation)
 
 
         # --- 核心修改：情绪计数与主动关怀逻辑 ---
         
-        # 1. 更新情绪计数器
-        if emotion in config.NEGATIVE_EMOTIONS:
-            self.negative_emotion_streak += 1
-            print(f"检测到负面情绪，连续次数: {self.negative_emotion_streak}")
+        # 1. 连续负面情绪次数已由统计引擎在上面更新（非负面情绪会将其清零）
+        negative_streak = rollup_engine.negative_streak
+        if negative_streak:
+            print(f"检测到负面情绪，连续次数: {negative_streak}")
         else:
-            # 如果检测到非负面情绪，则重置计数器
-            self.negative_emotion_streak = 0
             print("情绪正常，重置连续负面情绪计数。")
 
         # 2. 检查是否触发“主动关怀”模式
-        if self.negative_emotion_streak >= config.EMOTION_TRIGGER_THRESHOLD:
+        if negative_streak >= config.EMOTION_TRIGGER_THRESHOLD:
             print(f"达到主动关怀阈值({config.EMOTION_TRIGGER_THRESHOLD})！准备发送主动关怀。")
             
             # 使用一个特殊的、更高优先级的prompt
             care_prompt = (
-                f"我注意到溢涛已经连续多次（{self.negative_emotion_streak}次）看起来情绪是'{emotion}'。\n"
+                f"我注意到溢涛已经连续多次（{negative_streak}次）看起来情绪是'{emotion}'。\n"
                 "作为他的朋友婉晴，你觉得必须主动去关心他一下了。请你组织语言，"
                 "用一种非常温暖、真诚、不突兀的方式，主动向他表达你的关心，并试着询问他发生了什么。"
             )
@@ -186,7 +219,7 @@ class MultimediaAssistantApp(ctk.CTk):
             )
             
             # 触发后，重置计数器，避免在短时间内重复触发
-            self.negative_emotion_streak = 0
+            rollup_engine.reset_negative_streak()
             self.last_response_time = time.time() # 同时也更新回应时间
             return # 主动关怀任务已发出，本次观察流程结束
 
@@ -203,21 +236,32 @@ class MultimediaAssistantApp(ctk.CTk):
 
         if behavior_changed and enough_time_passed:
             print(f"判断需要常规回应：行为变化[{behavior_changed}], 时间足够[{enough_time_passed}]")
-            
-            placeholder_id = self.add_ai_message("...", screenshot, is_placeholder=True)
-            
-            self._add_to_message_queue(
-                priority=2,
-                msg_type="image_analysis",
-                content={
-                    "analysis_text": analysis_text, "behavior_desc": behavior_desc,
-                    "emotion": emotion, "placeholder_id": placeholder_id, "screenshot": screenshot
-                }
-            )
+
+            speculated = self.speculator.take(behavior_desc, emotion)
+            if speculated:
+                # 命中预生成的回复：文字和语音都已就绪，直接显示和播放
+                print(f"命中预生成回复: {behavior_desc}/{emotion}")
+                self.add_ai_message(f"📷 {analysis_text}", screenshot)
+                self.add_ai_message(speculated.text)
+                self.audio_player.play_text(speculated.text, priority=2, audio=speculated.audio)
+                self.conversation.commit_turn(speculated.prompt, speculated.text)
+            else:
+                placeholder_id = self.add_ai_message("...", screenshot, is_placeholder=True)
+
+                self._add_to_message_queue(
+                    priority=2,
+                    msg_type="image_analysis",
+                    content={
+                        "analysis_text": analysis_text, "behavior_desc": behavior_desc,
+                        "emotion": emotion, "placeholder_id": placeholder_id, "screenshot": screenshot
+                    }
+                )
             self.last_notable_behavior = behavior_desc
             self.last_response_time = now
         else:
             print(f"判断无需常规回应：行为未变或时间太短。当前行为: {behavior_desc}")
+            # 这一轮不需要说话，正好利用空闲时间预生成下一次可能用到的回复
+            self.speculator.maybe_speculate(observation_series)
 
 
 
@@ -228,15 +272,20 @@ class MultimediaAssistantApp(ctk.CTk):
 
 
 
-    def transcribe_audio(self, audio_file: str):
-        """[回调] VoiceActivityDetector检测到语音后调用此方法。"""
-        self.audio_transcriber.transcribe(audio_file, high_priority=True)
+    def transcribe_audio(self, pcm: bytes):
+        """[回调] VoiceActivityDetector检测到一段完整语音(16位PCM)后调用此方法。"""
+        self.audio_transcriber.transcribe(pcm, high_priority=True)
 
     def handle_transcription_result(self, text: str, high_priority: bool):
         """[回调] AudioTranscriber完成转录后调用此方法。"""
         self.add_user_message(text)
-        self._add_to_message_queue(
-            priority=1 if high_priority else 2, # 用户主动说话是最高优先级
+        # 先交给合并器等一个短窗口，紧接着的后续片段会并入同一轮
+        self.utterance_coalescer.add_fragment(text, priority=1 if high_priority else 2) # 用户主动说话是最高优先级
+
+    def _dispatch_voice_turn(self, text: str, priority: int) -> Job:
+        """[主线程] 合并窗口结束后，提交一轮完整的语音提问。"""
+        return self._add_to_message_queue(
+            priority=priority,
             msg_type="voice_input",
             content={"text": text}
         )
@@ -253,92 +302,66 @@ class MultimediaAssistantApp(ctk.CTk):
 
 
 
-    # --- 消息队列与后台处理 ---
-    def _process_message_queue(self):
-        """[后台线程] 持续处理消息队列中的任务。"""
-        while self.processing_running:
-            try:
-                #这里非常非常的重要！！！！！
-                # 从队列中获取任务，阻塞直到有任务可用
-                priority, msg_id, message = self.message_queue.get()
-                
-                msg_type = message["type"]
-                content = message["content"]
-                
-                if msg_type == "image_analysis":
-                    self._handle_image_analysis_message(content)
-                elif msg_type == "voice_input":
-                    self._handle_voice_input_message(content)
-                # --- 新增分支：处理主动关怀任务 ---
-                elif msg_type == "special_care_prompt":
-                    self._handle_special_care_message(content)
-                # --- 新增分支：处理每日总结任务 ---
-                elif msg_type == "daily_summary":
-                    self._handle_daily_summary_message()
-
-                self.message_queue.task_done()
-            except Exception as e:
-                print(f"消息队列处理错误: {e}")
-                time.sleep(1)
-
-
-
-
-
-
-
+    # --- 消息调度与后台处理 ---
+    # 各类任务由 MessageScheduler 分通道执行 (见 core/scheduler.py)，
+    # 每个处理函数都会收到自己的 Job，用于检查和响应取消。
 
-    def _handle_image_analysis_message(self, content: dict):
-        """[后台线程] 处理图像分析消息，生成AI回应。"""
-        # --- 关键修改：构建一个更丰富的prompt ---
-        prompt = (
-            f"我刚刚看到溢涛正在'{content['behavior_desc']}'，而且他的情绪看起来是'{content['emotion']}'。\n"
-            f"作为他的朋友婉晴，你会怎么用一种自然、温暖的方式跟他说话呢？请根据你的角色设定，结合这个情景给出一句回应。"
-        )
+    def _handle_image_analysis_message(self, content: dict, job: Job):
+        """[视觉通道] 处理图像分析消息，生成AI回应。语音等更高优先级任务到达时会被取消。"""
+        prompt = self._build_observation_prompt(content['behavior_desc'], content['emotion'])
         
 
 
 
-        self.chat_context.append({"role": "user", "content": prompt})
-        assistant_reply = self._get_deepseek_response()
-        
         # 在主线程中更新UI
         self.after(0, self.update_placeholder, content["placeholder_id"], f"📷 {content['analysis_text']}", content['screenshot'])
-        self.after(0, self.add_ai_message, assistant_reply)
-        
-        # 播放语音
-        self.audio_player.play_text(assistant_reply, priority=2)
+
+        # 流式生成回复，逐句播放语音
+        self._get_deepseek_response(job, prompt, tts_priority=2)
 
 
 
 
 
-    def _handle_voice_input_message(self, content: dict):
-        """[后台线程] 处理用户语音输入，生成AI回应。"""
+    @staticmethod
+    def _build_observation_prompt(behavior_desc: str, emotion: str) -> str:
+        """图像点评的prompt模板；预生成的候选回复也使用同一个模板，保证命中时内容一致。"""
+        # --- 关键修改：构建一个更丰富的prompt ---
+        return (
+            f"我刚刚看到溢涛正在'{behavior_desc}'，而且他的情绪看起来是'{emotion}'。\n"
+            f"作为他的朋友婉晴，你会怎么用一种自然、温暖的方式跟他说话呢？请根据你的角色设定，结合这个情景给出一句回应。"
+        )
+
+    def _handle_voice_input_message(self, content: dict, job: Job):
+        """[语音通道] 处理用户语音输入，生成AI回应。"""
         user_text = content["text"]
         
-        history_summary = "作为参考，这是我最近5次观察到的你的行为记录：\n"
-        if not self.observation_history:
-            history_summary += "暂无记录。\n"
+        # 当前状态只取最新一条观察；更早的历史从本地检索索引中按问题取最相关的几条，prompt 长度有上限
+        latest = observation_series.latest()
+        if not latest:
+            history_summary = "作为参考，我现在还没有观察到你的行为记录。\n"
         else:
-            for obs in self.observation_history[-5:]:
-                history_summary += (f"- {obs['timestamp'].strftime('%H:%M:%S')}: "
-                                    f"行为是 {obs['behavior_desc']}, 情绪是 {obs['emotion']}\n")
-
-        prompt = f"{history_summary}\n以上是背景信息。现在，请回答我的问题：'{user_text}'"
-        self.chat_context.append({"role": "user", "content": prompt})
-        
-        assistant_reply = self._get_deepseek_response()
+            obs = latest[0]
+            history_summary = (f"作为参考，我最近一次（{obs['timestamp'].strftime('%H:%M:%S')}）观察到你"
+                               f"在{obs['behavior_desc']}，情绪是{obs['emotion']}。\n")
+        related = memory_index.context_for(user_text)
+        if related:
+            history_summary += f"和你的问题可能相关的过往记录：\n{related}\n"
+
+        # 历史中只保存用户原话；易变的观察记录只放在本次请求的末尾，
+        # 这样之前的消息在后续请求中保持逐字节不变，可以命中DeepSeek的上下文缓存
+        prompt = f"请回答我的问题：'{user_text}'\n\n{history_summary}以上是背景信息，仅供参考。"
         
-        self.after(0, self.add_ai_message, assistant_reply)
-        self.audio_player.play_text(assistant_reply, priority=1) # 最高优先级播放
+        reply = self._get_deepseek_response(job, user_text, tts_priority=1, request_content=prompt) # 最高优先级播放
+        if reply:
+            memory_index.add_chat_turn(user_text, reply)
         
 
 
 
 
-    def _handle_special_care_message(self, content: dict):
-        """[后台线程] 处理特殊的主动关怀消息。"""
+    def _handle_special_care_message(self, content: dict, job: Job):
+        """[关怀通道] 处理特殊的主动关怀消息。"""
         print("正在生成主动关怀回应...")
         prompt = content["prompt"]
         
@@ -347,50 +370,124 @@ class MultimediaAssistantApp(ctk.CTk):
         care_context = [self.system_message, {"role": "user", "content": prompt}]
         
         try:
-            response = deepseek_client.chat.completions.create(
-                model="deepseek-chat",
-                messages=care_context,
-                stream=False
-            )
-            reply = response.choices[0].message.content
+            # 流式显示并用最高优先级逐句播放，优先级0，绝对插队！
+            reply = self._stream_deepseek_reply(job, care_context, tts_priority=0)
             
             # 将这次主动关怀也记录到主聊天历史中
-            self.chat_context.append({"role": "user", "content": "[AI 主动发起的关怀]"})
-            self.chat_context.append({"role": "assistant", "content": reply})
-
-            # 在主线程中显示并用最高优先级播放
-            self.after(0, self.add_ai_message, reply)
-            self.audio_player.play_text(reply, priority=0) # 优先级0，绝对插队！
+            self.conversation.commit_turn("[AI 主动发起的关怀]", reply)
             
+        except JobCancelled:
+            raise
         except Exception as e:
             print(f"生成主动关怀回应时出错: {e}")
 
 
 
 
-    def _get_deepseek_response(self) -> str:
-        """调用DeepSeek API并返回文本结果。"""
+    def _get_deepseek_response(self, job: Job, user_content: str, tts_priority: int,
+                               request_content: str = None) -> str:
+        """
+        基于主聊天上下文流式调用DeepSeek，边生成边显示和播放，返回完整回复。
+        只有在请求完整结束后才把本轮对话写入上下文；被取消的请求不会留下半截历史。
+        """
         try:
-            # 限制上下文长度，防止超出token限制
-            if len(self.chat_context) > 10: 
-                self.chat_context = [self.system_message] + self.chat_context[-9:]
+            # 按token预算组装上下文，超出部分会在后台折叠为摘要
+            messages = self.conversation.build_messages(user_content, request_content)
 
-            response = deepseek_client.chat.completions.create(
-                model="deepseek-chat", messages=self.chat_context, stream=False
-            )
-            reply = response.choices[0].message.content
-            self.chat_context.append({"role": "assistant", "content": reply})
+            reply = self._stream_deepseek_reply(job, messages, tts_priority)
+            self.conversation.commit_turn(user_content, reply)
             return reply
+        except JobCancelled:
+            raise
+        except ThrottledError as e:
+            # 限流属于正常降级：图像点评直接跳过，只有用户主动提问才需要回一句
+            print(f"DeepSeek 请求被限流: {e}")
+            if tts_priority <= config.GOVERNOR_RESERVED_PRIORITY:
+                reply = "溢涛，我刚才说得有点多，先歇一会儿，稍后再回答你。"
+                self.after(0, self.add_ai_message, reply)
+                return reply
+            return ""
         except Exception as e:
             print(f"DeepSeek API 错误: {e}")
-            return "溢涛！抱歉，我的大脑暂时连接不上，请稍后再试。"
+            reply = "溢涛！抱歉，我的大脑暂时连接不上，请稍后再试。"
+            self.after(0, self.add_ai_message, reply)
+            return reply
+
+    def _stream_deepseek_reply(self, job: Job, messages: list, tts_priority: int) -> str:
+        """
+        [调度通道线程] 以流式方式调用DeepSeek：
+        - token 到达后通过Tk事件循环增量更新同一个聊天气泡；
+        - 每凑满一个完整句子就立即交给TTS，而不是等整段回复生成完；
+        - 记录本回合的首token延迟(first_token)，首段语音延迟(first_audio)由AudioPlayer记录；
+        - 任务被取消时取消对应的协程（中止HTTP请求），并撤回本回合尚未播放的语音。
+        请求本身运行在异步运行时的事件循环上，本线程只是等待结果。
+        """
+        job.raise_if_cancelled()
+        governor.require("deepseek", job.priority, cost=estimate_message_tokens(messages))
+        turn_id = f"turn_{next(self.turn_ids)}"
+        turn_metrics.start(turn_id)
+
+        future = runtime.submit(self._stream_deepseek_reply_async(messages, tts_priority, turn_id))
+        job.add_cancel_callback(future.cancel)
+        job.add_cancel_callback(lambda: self.audio_player.cancel_turn(turn_id))
+        try:
+            return future.result()
+        except CancelledError:
+            raise JobCancelled(job.cancel_reason)
+
+    async def _stream_deepseek_reply_async(self, messages: list, tts_priority: int, turn_id: str) -> str:
+        """[事件循环] _stream_deepseek_reply 的实际实现。"""
+        # 只重试建立流式连接这一步；一旦开始接收内容就不再重试，避免重复朗读
+        stream = await call_with_retry("deepseek", lambda: async_deepseek_client.chat.completions.create(
+            model="deepseek-chat", messages=messages, stream=True,
+            # 最后一个chunk携带usage，其中包含上下文缓存的命中/未命中token数
+            stream_options={"include_usage": True}
+        ))
+        self.after(0, self._create_stream_bubble, turn_id)
+        parts, pending_text = [], ""
+        last_ui_update = 0
+        cancelled = False
+        try:
+            async for chunk in stream:
+                if chunk.usage:
+                    self._record_llm_usage(turn_id, chunk.usage)
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if not delta:
+                    continue
+                if not parts:
+                    turn_metrics.mark(turn_id, "first_token")
+                parts.append(delta)
+                pending_text += delta
+
+                sentences, pending_text = split_completed_sentences(pending_text)
+                for sentence in sentences:
+                    self.audio_player.play_text(sentence, priority=tts_priority, turn_id=turn_id)
+
+                # 控制界面刷新频率，避免每个token都排一次UI任务
+                now = time.time()
+                if sentences or now - last_ui_update >= 0.05:
+                    self.after(0, self._update_stream_bubble, turn_id, "".join(parts))
+                    last_ui_update = now
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        finally:
+            await stream.close()
+            reply = "".join(parts)
+            if cancelled:
+                reply += "……（已打断）"
+            elif pending_text.strip():
+                self.audio_player.play_text(pending_text.strip(), priority=tts_priority, turn_id=turn_id)
+            self.after(0, self._update_stream_bubble, turn_id, reply or "...", True)
+        return reply
 
     # --- UI更新与辅助方法 ---
     
-    def _add_to_message_queue(self, priority: int, msg_type: str, content: dict):
-        msg_id = self.message_id_counter
+    def _add_to_message_queue(self, priority: int, msg_type: str, content: dict) -> Job:
         self.message_id_counter += 1
-        self.message_queue.put((priority, msg_id, {"type": msg_type, "content": content}))
+        return self.scheduler.submit(priority, msg_type, content)
 
     def update_status(self, text: str):
         self.status_label.configure(text=text)
@@ -401,8 +498,29 @@ class MultimediaAssistantApp(ctk.CTk):
     def add_user_message(self, text):
         self._add_chat_message("user", text)
 
-    def _add_chat_message(self, role, text, screenshot=None, is_placeholder=False) -> str:
-        """向聊天窗口添加一条新消息，支持占位符。"""
+    def _record_llm_usage(self, turn_id: str, usage):
+        """记录一次请求的token用量，并打印本会话的上下文缓存命中率。"""
+        current = llm_usage.record(usage)
+        governor.record("deepseek", usage.total_tokens)
+        rate = llm_usage.hit_rate()
+        rate_text = f"{rate:.0%}" if rate is not None else "-"
+        print(f"[{turn_id}] prompt {current['prompt']} tokens (缓存命中 {current['hit']} / 未命中 {current['miss']})，"
+              f"本会话缓存命中率 {rate_text}")
+
+    def _create_stream_bubble(self, bubble_id: str):
+        """[主线程] 为流式回复创建一个AI聊天气泡，后续由 _update_stream_bubble 增量填充。"""
+        self._add_chat_message("ai", "...", bubble_id=bubble_id)
+
+    def _update_stream_bubble(self, bubble_id: str, text: str, final: bool = False):
+        """[主线程] 用目前已生成的文本刷新流式气泡。"""
+        text_label = self.stream_bubbles.pop(bubble_id, None) if final else self.stream_bubbles.get(bubble_id)
+        if text_label is None or not text_label.winfo_exists():
+            return
+        text_label.configure(text=text)
+        self.chat_frame._parent_canvas.yview_moveto(1.0)
+
+    def _add_chat_message(self, role, text, screenshot=None, is_placeholder=False, bubble_id=None) -> str:
+        """向聊天窗口添加一条新消息，支持占位符与流式气泡。"""
         align = "w" if role == "ai" else "e"
         avatar = self.ai_avatar if role == "ai" else self.user_avatar
         bg_color = ("#3F3F3F", "#2B2B2B") if role == "ai" else ("#2B4B29", "#1D351C")
@@ -436,6 +554,8 @@ class MultimediaAssistantApp(ctk.CTk):
             placeholder_id = f"ph_{self.message_id_counter}"
             self.placeholder_map[placeholder_id] = (message_frame, text_label, None)
             message_frame.configure(fg_color=("#EAEAEA", "#333333"))
+        if bubble_id:
+            self.stream_bubbles[bubble_id] = text_label
 
         self.chat_row_counter += 1
         self.after(100, self.chat_frame._parent_canvas.yview_moveto, 1.0)
@@ -452,12 +572,21 @@ class MultimediaAssistantApp(ctk.CTk):
     def on_closing(self):
         """处理窗口关闭事件，安全地停止所有后台线程。"""
         print("正在关闭应用...")
-        self.processing_running = False
+        self.utterance_coalescer.stop()
+        self.scheduler.stop()
         self.webcam_handler.stop()
         self.voice_detector.stop_monitoring()
         self.audio_player.stop()
-        # 发送一个虚拟消息来解锁队列的 .get() 阻塞
-        self.message_queue.put((99, 0, {"type": "shutdown", "content": ""}))
+        self.audio_transcriber.stop()
+        audio_manager.shutdown()
+        runtime.stop()
+        observation_store.close()
+        self.log_writer.stop()
+        print(f"网络请求统计（重试/失败/熔断拒绝）: {transport_stats.snapshot()}")
+        print(f"云端服务用量与限流统计: {governor.snapshot()}")
+        print(f"预生成回复统计: {self.speculator.get_stats()}")
+        print(f"语音片段合并统计: {self.utterance_coalescer.get_stats()}")
+        print(f"检索索引统计: {memory_index.get_stats()}")
         self.destroy()
 
     def _schedule_daily_summary(self):
@@ -484,34 +613,22 @@ class MultimediaAssistantApp(ctk.CTk):
 
 
     #新增处理日志！
-    def _handle_daily_summary_message(self):
-            """[后台线程] 读取当天的日志，请求AI总结，并播报结果。"""
-            today_str = datetime.now().strftime('%Y-%m-%d')
-            log_file_path = f'observation_log_{today_str}.jsonl'
-
-            observations_text = ""
+    def _handle_daily_summary_message(self, content: dict, job: Job):
+            """[后台线程] 先按小时并发生成摘要（有缓存），再合成一天的总结并播报。"""
             try:
-                with open(log_file_path, 'r', encoding='utf-8') as f:
-                    # 为了不让prompt过长，我们只选择性地读取一部分记录
-                    lines = f.readlines()
-                    # 这里可以加入更智能的采样逻辑，比如每隔N条取一条
-                    for line in lines[-100:]: # 最多读取最近的100条记录
-                        obs = json.loads(line)
-                        # 格式化成易于AI阅读的文本
-                        ts = datetime.fromisoformat(obs['timestamp']).strftime('%H:%M')
-                        observations_text += f"- 时间 {ts}: 行为是'{obs['behavior_desc']}', 情绪看起来是'{obs['emotion']}'.\n"
-            except FileNotFoundError:
-                print("找不到今天的观察日志，无法生成总结。")
-                self.after(0, self.add_ai_message, "帆哥，我今天好像没有观察到你的记录，没法做总结哦。")
-                return
+                # map：覆盖全天的每个小时，而不只是最后100条记录
+                hour_summaries = daily_summarizer.summarize_hours(job=job)
+            except JobCancelled:
+                raise
             except Exception as e:
-                print(f"读取日志文件时出错: {e}")
+                print(f"生成小时摘要时出错: {e}")
                 return
 
-            if not observations_text:
+            if not hour_summaries:
                 print("今天的观察日志是空的。")
                 self.after(0, self.add_ai_message, "帆哥，我翻了下记录，今天好像是空白的，好好休息！")
                 return
+            hours_text = "\n".join(f"- {hour}: {summary}" for hour, summary in hour_summaries)
 
             # --- 构建最终的Prompt ---
             summary_prompt = (
@@ -519,8 +636,10 @@ class MultimediaAssistantApp(ctk.CTk):
                 "为他生成一份温暖、口语化、像朋友聊天一样的每日总结。\n"
                 "不要像个机器人一样列数据！你要有洞察力，比如发现他什么时候最累，什么时候效率高，"
                 "并给出一些真诚的建议或鼓励。总结要简短，但要充满人情味。\n\n"
-                "这是今天的记录：\n"
-                f"{observations_text}\n\n"
+                "这是今天的整体统计：\n"
+                f"{format_rollup(rollup_engine.today())}\n\n"
+                "这是今天每个小时的概况：\n"
+                f"{hours_text}\n\n"
                 "好了，请开始你的总结吧："
             )
             
@@ -529,19 +648,14 @@ class MultimediaAssistantApp(ctk.CTk):
             # 使用独立的上下文进行总结
             summary_context = [self.system_message, {"role": "user", "content": summary_prompt}]
             try:
-                response = deepseek_client.chat.completions.create(
-                    model="deepseek-chat", messages=summary_context
-                )
-                summary_reply = response.choices[0].message.content
+                # 流式显示并逐句播报，最高优先级
+                summary_reply = self._stream_deepseek_reply(job, summary_context, tts_priority=0)
                 
                 # 记录到主聊天历史
-                self.chat_context.append({"role": "user", "content": "[AI 生成的每日总结]"})
-                self.chat_context.append({"role": "assistant", "content": summary_reply})
-
-                # 在主线程中显示和播报
-                self.after(0, self.add_ai_message, summary_reply)
-                self.audio_player.play_text(summary_reply, priority=0) # 最高优先级播报
+                self.conversation.commit_turn("[AI 生成的每日总结]", summary_reply)
                 
+            except JobCancelled:
+                raise
             except Exception as e:
                 print(f"生成每日总结时出错: {e}")
 
@@ -572,8 +686,15 @@ class MultimediaAssistantApp(ctk.CTk):
 
 
 
-def main():
-    """应用的入口函数。"""
+def main(launch_time: float = None):
+    """
+    应用的入口函数。
+    launch_time 为启动脚本记录的 time.perf_counter()，用于统计从启动到窗口显示的耗时。
+    """
+    if launch_time is None:
+        launch_time = time.perf_counter()
     app = MultimediaAssistantApp()
     app.protocol("WM_DELETE_WINDOW", app.on_closing)
+    # after_idle 会在主循环第一次空闲（窗口已绘制）时执行
+    app.after_idle(lambda: print(f"启动到窗口显示耗时 {time.perf_counter() - launch_time:.2f}s。"))
     app.mainloop()
\ No newline at end of file
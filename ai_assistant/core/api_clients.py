@@ -2,24 +2,26 @@
 
 
 # 你以为的过程: 手动建立HTTP连接 -> 设置请求头(Header) -> 把API Key放进去 -> 把图片URL和Prompt打包成JSON格式 -> 发送请求 -> 等待服务器响应 -> 解析返回的JSON数据 -> 处理可能出现的网络错误...
-# 实际的过程: completion = qwen_client.chat.completions.create(...)
+# 实际的过程: completion = await async_qwen_client.chat.completions.create(...)
 
 #SDK大哥：
-# qwen_client.chat.completions.create(...) 这一步又做了什么？
+# async_qwen_client.chat.completions.create(...) 这一步又做了什么？
 # 当你调用这个.create()方法时，SDK在“幕后”为你做了所有的事情：
 # 它根据你传入的model和messages参数，自动构建一个符合API规范的HTTP POST请求。
 # 它自动把你的api_key添加到请求头里进行身份验证。
 # 它通过底层的网络库（如requests或httpx）把这个请求发送到你配置的base_url。
-# 它同步等待服务器处理并返回结果。
+# 它在事件循环中异步等待服务器处理并返回结果（等待期间不占用任何线程）。
 # 收到服务器返回的JSON数据后，它会将其解析成一个方便你使用的Python对象（所以你可以用.choices[0].message.content来访问）。
 # 如果网络出错了或者API返回了错误码，它还会抛出异常，方便你捕获。
 
 import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 import httpx
-from openai import OpenAI
+from openai import AsyncOpenAI
 import oss2
 import dashscope
-from funasr import AutoModel
+from dashscope.audio.tts_v2 import SpeechSynthesizer
 
 # --- 关键修正：在程序启动时，从根源上禁用系统代理 ---
 # 这几行代码会清除掉所有可能影响网络请求的代理环境变量。
@@ -32,21 +34,28 @@ os.environ['ALL_PROXY'] = ''
 # 从我们自己的配置模块导入所有配置信息
 from ai_assistant.utils import config
 
+from ai_assistant.core.http_transport import build_async_http_client, call_with_retry, endpoint_timeouts
+
 # --- OpenAI-Compatible API Clients ---
-# 现在，我们不再需要任何复杂的http_client参数，
-# 因为代理问题已经在上面被彻底解决了。
-# 我们恢复使用最标准、最干净的初始化方式。
+# 所有云端调用都运行在 core/async_runtime.py 的后台事件循环上，
+# 因此这里使用异步客户端，只能在该事件循环中 await 调用。
+# 连接池、HTTP/2 和超时由 http_transport 统一配置；SDK 自带的重试关闭 (max_retries=0)，
+# 重试与熔断统一交给 call_with_retry，避免两层重试叠加。
 
 # DeepSeek Client (用于语言模型对话)
-deepseek_client = OpenAI(
+async_deepseek_client = AsyncOpenAI(
     api_key=config.DEEPSEEK_API_KEY,
     base_url=config.DEEPSEEK_BASE_URL,
+    http_client=build_async_http_client("deepseek"),
+    max_retries=0,
 )
 
 # Qwen-VL Client (用于视觉语言模型分析图像)
-qwen_client = OpenAI(
+async_qwen_client = AsyncOpenAI(
     api_key=config.QWEN_API_KEY,
     base_url=config.QWEN_BASE_URL,
+    http_client=build_async_http_client("qwen"),
+    max_retries=0,
 )
 
 # --- Alibaba Cloud Services ---
@@ -57,27 +66,57 @@ dashscope.api_key = config.QWEN_API_KEY
 # OSS (对象存储服务)
 # 修正：oss2.Bucket的第一个参数应该是auth对象
 auth = oss2.Auth(config.OSS_ACCESS_KEY_ID, config.OSS_ACCESS_KEY_SECRET)
-oss_bucket = oss2.Bucket(auth, config.OSS_ENDPOINT, config.OSS_BUCKET)
-
-
-# --- Local AI Models ---
-
-# ASR (自动语音识别) Model from FunASR
-asr_model = None
-try:
-    # 确保FunASR也不会受到代理影响
-    os.environ['NO_PROXY'] = '*'
-    asr_model = AutoModel(
-        model=config.ASR_MODEL_DIR,
-        trust_remote_code=True,
-        vad_model="fsmn-vad",
-        vad_kwargs={"max_single_segment_time": 30000},
-        device="cuda:0", # 如果你没有NVIDIA显卡，请改为 "cpu"
-    )
-    print("ASR模型加载成功。")
-except Exception as e:
-    print(f"警告：ASR模型加载失败，语音识别功能将不可用。错误: {e}")
-    asr_model = None
-finally:
-    # 恢复环境变量，避免影响其他可能的进程
-    os.environ.pop('NO_PROXY', None)
\ No newline at end of file
+# 复用同一个带连接池的 Session，并设置连接超时
+oss_bucket = oss2.Bucket(
+    auth, config.OSS_ENDPOINT, config.OSS_BUCKET,
+    session=oss2.Session(pool_size=config.HTTP_MAX_KEEPALIVE_CONNECTIONS),
+    connect_timeout=endpoint_timeouts("oss")["connect"],
+)
+
+
+# --- 异步封装 ---
+# oss2 和 dashscope 的TTS只有同步接口，这里在线程中执行并包装成协程，
+# 调用方可以与其他请求一起 gather 并发执行，也可以被取消（取消后不再等待结果）。
+# 两者都是幂等的（同一个 object_key 重复上传结果相同），因此失败时可以安全重试。
+
+async def oss_put_object(object_key: str, data):
+    """异步上传一个对象到OSS，返回 oss2 的 PutObjectResult。"""
+    def _call():
+        if hasattr(data, "seek"):
+            data.seek(0)  # 重试时从头重新读取
+        return oss_bucket.put_object(object_key, data)
+    return await call_with_retry("oss", lambda: asyncio.to_thread(_call))
+
+
+# dashscope 的TTS调用无法在超时后中止，使用独立的小线程池，
+# 卡住的调用最多占满这几个线程，不会挤占事件循环默认线程池（OSS上传、数据库查询等）。
+_tts_executor = ThreadPoolExecutor(max_workers=config.TTS_MAX_WORKERS, thread_name_prefix="tts")
+
+
+async def synthesize_speech(text: str) -> bytes:
+    """
+    异步调用 dashscope TTS，返回mp3音频字节。
+    超时后上一次调用仍在线程中执行时，重试不会再发起新的调用，而是继续等待这一次的结果。
+    """
+    def _call():
+        synthesizer = SpeechSynthesizer(model=config.TTS_MODEL, voice=config.TTS_VOICE)
+        return synthesizer.call(text)
+    # dashscope SDK 没有可配置的读超时，这里在外层加一个总时限
+    timeout = endpoint_timeouts("tts")["read"]
+    loop = asyncio.get_running_loop()
+    running = None  # 仍在执行的调用（可能已经超时过一次）
+
+    async def attempt():
+        nonlocal running
+        if running is None or running.done():
+            running = loop.run_in_executor(_tts_executor, _call)
+            # 超时后无人等待的调用出错时，取走异常，避免 "exception was never retrieved"
+            running.add_done_callback(lambda f: f.cancelled() or f.exception())
+        # shield：超时只放弃本次等待，不影响线程中仍在执行的调用
+        return await asyncio.wait_for(asyncio.shield(running), timeout)
+
+    return await call_with_retry("tts", attempt)
+
+
+# 本地ASR模型不在这里加载：导入本模块不应阻塞界面启动。
+# 见 ai_assistant/core/asr_engine.py，模型会在界面显示后于后台加载并预热。
@@ -0,0 +1,100 @@
+# ai_assistant/core/asr_benchmark.py
+
+import os
+import re
+import time
+import wave
+
+from ai_assistant.core.asr_engine import ASREngine, pcm16_to_float32
+from ai_assistant.utils import config
+from ai_assistant.utils.helpers import extract_language_emotion_content
+
+
+def load_fixtures(fixture_dir: str) -> list:
+    """
+    读取对比测试用的音频与参考文本。
+    返回 [(文件名, float32音频, 时长秒数, 参考文本), ...]。
+    """
+    transcripts_path = os.path.join(fixture_dir, "transcripts.txt")
+    fixtures = []
+    with open(transcripts_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if not line.strip() or '\t' not in line:
+                continue
+            name, reference = line.split('\t', 1)
+            with wave.open(os.path.join(fixture_dir, name), 'rb') as wf:
+                if wf.getframerate() != config.AUDIO_RATE or wf.getsampwidth() != 2 or wf.getnchannels() != 1:
+                    raise ValueError(f"{name} 必须是 {config.AUDIO_RATE}Hz、16位、单声道的WAV文件")
+                audio = pcm16_to_float32(wf.readframes(wf.getnframes()))
+            fixtures.append((name, audio, len(audio) / config.AUDIO_RATE, reference))
+    return fixtures
+
+
+def tokenize_for_wer(text: str) -> list:
+    """中文按字切分、英文和数字按词切分，并去掉标点。中文场景下即为字错误率(CER)。"""
+    return re.findall(r'[一-鿿]|[A-Za-z0-9\']+', text.lower())
+
+
+def edit_distance(ref: list, hyp: list) -> int:
+    """计算两个token序列的Levenshtein编辑距离。"""
+    prev = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        cur = [i] + [0] * len(hyp)
+        for j, h in enumerate(hyp, 1):
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (r != h))
+        prev = cur
+    return prev[-1]
+
+
+def benchmark_backend(backend: str, fixtures: list, num_threads: int = None) -> dict:
+    """加载指定后端并逐条识别，返回 RTF（推理耗时/音频时长）与 WER。"""
+    engine = ASREngine(backend=backend, num_threads=num_threads)
+    engine._load()
+    if engine.model is None:
+        return {"backend": backend, "error": str(engine.load_error)}
+
+    total_audio, total_infer, total_errors, total_tokens = 0.0, 0.0, 0, 0
+    for name, audio, duration, reference in fixtures:
+        started = time.perf_counter()
+        raw_text = engine.generate(audio)
+        total_infer += time.perf_counter() - started
+        total_audio += duration
+        hypothesis = extract_language_emotion_content(raw_text) if raw_text else ""
+        ref_tokens = tokenize_for_wer(reference)
+        total_errors += edit_distance(ref_tokens, tokenize_for_wer(hypothesis))
+        total_tokens += len(ref_tokens)
+
+    return {
+        "backend": backend,
+        "threads": engine.num_threads,
+        "load_s": engine.load_seconds,
+        "rtf": total_infer / total_audio if total_audio else float('nan'),
+        "wer": total_errors / total_tokens if total_tokens else float('nan'),
+    }
+
+
+def main(argv=None):
+    """命令行入口：对比各ASR后端在固定音频集上的RTF与WER。"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="对比ASR后端的实时率(RTF)与错误率(WER)")
+    parser.add_argument("--dir", default=config.ASR_BENCHMARK_DIR, help="测试音频目录")
+    parser.add_argument("--backends", default="torch,onnx", help="逗号分隔的后端列表")
+    parser.add_argument("--threads", type=int, default=None, help="CPU推理线程数")
+    args = parser.parse_args(argv)
+
+    fixtures = load_fixtures(args.dir)
+    if not fixtures:
+        print(f"在 {args.dir} 中没有找到测试音频。")
+        return
+    total = sum(f[2] for f in fixtures)
+    print(f"共 {len(fixtures)} 条测试音频，总时长 {total:.1f}s。\n")
+
+    print(f"{'后端':<8}{'线程':>6}{'加载(s)':>10}{'RTF':>10}{'WER':>10}")
+    for backend in args.backends.split(','):
+        r = benchmark_backend(backend.strip(), fixtures, args.threads)
+        if "error" in r:
+            print(f"{r['backend']:<8} 加载失败: {r['error']}")
+            continue
+        print(f"{r['backend']:<8}{r['threads']:>6}{r['load_s']:>10.1f}{r['rtf']:>10.3f}{r['wer']:>10.2%}")
@@ -0,0 +1,187 @@
+# ai_assistant/core/asr_engine.py
+
+import os
+import threading
+import time
+import numpy as np
+
+from ai_assistant.utils import config
+from ai_assistant.utils.metrics import RollingStats
+
+
+def select_asr_device() -> str:
+    """
+    根据配置选择ASR推理设备。
+    config.ASR_DEVICE 为 "auto" 时：有可用的CUDA显卡则用 "cuda:0"，否则退回 "cpu"。
+    """
+    if config.ASR_DEVICE != "auto":
+        return config.ASR_DEVICE
+    try:
+        import torch
+        if torch.cuda.is_available():
+            return "cuda:0"
+    except Exception as e:
+        print(f"检测CUDA时出错，将使用CPU: {e}")
+    return "cpu"
+
+
+def resolve_num_threads() -> int:
+    """返回CPU推理线程数：config.ASR_NUM_THREADS 为 None 时取物理核心数的近似值（逻辑核数的一半）。"""
+    if config.ASR_NUM_THREADS:
+        return int(config.ASR_NUM_THREADS)
+    return max(1, (os.cpu_count() or 2) // 2)
+
+
+def pcm16_to_float32(pcm: bytes) -> np.ndarray:
+    """将16位PCM字节转换为FunASR需要的 [-1, 1] 区间 float32 数组。"""
+    return np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768.0
+
+
+def make_warmup_clip(seconds: float = 1.0) -> np.ndarray:
+    """生成一段合成的预热音频（低幅正弦波加噪声，16kHz float32）。"""
+    n = int(config.AUDIO_RATE * seconds)
+    t = np.arange(n, dtype=np.float32) / config.AUDIO_RATE
+    rng = np.random.default_rng(0)
+    clip = 0.05 * np.sin(2 * np.pi * 220.0 * t) + 0.01 * rng.standard_normal(n)
+    return clip.astype(np.float32)
+
+
+class ASREngine:
+    """
+    本地语音识别引擎（SenseVoice）。
+    模型不再在导入时同步加载，而是在界面显示后由后台线程加载，
+    加载完成后用一段合成音频做一次预热推理，吸收首次调用的JIT编译和显存/内存分配开销。
+    调用方通过 wait_ready() 等待就绪信号，而不是检查全局变量是否为 None。
+
+    支持两种后端 (config.ASR_BACKEND)：
+      "torch" —— FunASR AutoModel（fp32，附带 fsmn-vad 断句），有显卡时自动使用GPU；
+      "onnx"  —— 同一模型的 ONNX int8 量化导出，用 onnxruntime 在CPU上推理，
+                 适合没有显卡的机器。VAD已负责切分语句，这里不再需要 fsmn-vad。
+    """
+
+    def __init__(self, backend: str = None, num_threads: int = None):
+        self.backend = backend or config.ASR_BACKEND
+        self.num_threads = num_threads or resolve_num_threads()
+        self.model = None
+        self.device = None
+        self.ready = threading.Event()   # 加载结束（无论成功与否）时置位
+        self.load_error = None
+        self.load_seconds = 0.0
+        self.warmup_seconds = 0.0
+        self._load_thread = None
+        self._generate_lock = threading.Lock()  # FunASR模型不保证线程安全
+        self.latency_stats = RollingStats()
+        self.first_call_seconds = None
+
+    def load_async(self):
+        """[主线程调用] 在后台线程中加载模型，立即返回。"""
+        if self._load_thread is not None:
+            return
+        self._load_thread = threading.Thread(target=self._load, daemon=True)
+        self._load_thread.start()
+
+    def _load(self):
+        """[加载线程] 构建模型并预热，结束后置位 ready。"""
+        started = time.perf_counter()
+        try:
+            # 确保FunASR也不会受到代理影响
+            os.environ['NO_PROXY'] = '*'
+            try:
+                if self.backend == "onnx":
+                    self.model = self._build_onnx_model()
+                else:
+                    self.model = self._build_torch_model()
+            finally:
+                # 恢复环境变量，避免影响其他可能的进程
+                os.environ.pop('NO_PROXY', None)
+            self.load_seconds = time.perf_counter() - started
+            print(f"ASR模型加载成功 (后端: {self.backend}，设备: {self.device}，"
+                  f"线程数: {self.num_threads}，耗时 {self.load_seconds:.1f}s)。")
+            self._warm_up()
+        except Exception as e:
+            print(f"警告：ASR模型加载失败，语音识别功能将不可用。错误: {e}")
+            self.model = None
+            self.load_error = e
+        finally:
+            self.ready.set()
+
+    def _build_torch_model(self):
+        from funasr import AutoModel
+
+        self.device = select_asr_device()
+        if self.device == "cpu":
+            import torch
+            torch.set_num_threads(self.num_threads)
+        return AutoModel(
+            model=config.ASR_MODEL_DIR,
+            trust_remote_code=True,
+            vad_model="fsmn-vad",
+            vad_kwargs={"max_single_segment_time": 30000},
+            device=self.device,
+        )
+
+    def _build_onnx_model(self):
+        # funasr_onnx 首次使用时会把模型导出为 ONNX 并生成 int8 量化版本 (model_quant.onnx)
+        from funasr_onnx import SenseVoiceSmall
+
+        self.device = "cpu"
+        return SenseVoiceSmall(
+            config.ASR_MODEL_DIR,
+            batch_size=1,
+            quantize=config.ASR_ONNX_QUANTIZE,
+            intra_op_num_threads=self.num_threads,
+        )
+
+    def _infer(self, audio) -> str:
+        """[持有推理锁时调用] 执行一次后端推理，返回带标签的原始文本。"""
+        if self.backend == "onnx":
+            res = self.model(audio, language="auto", textnorm="withitn")
+            return res[0] if res else ""
+        res = self.model.generate(input=audio, cache={})
+        if res and "text" in res[0]:
+            return res[0]["text"]
+        return ""
+
+    def _warm_up(self):
+        """[加载线程] 用合成音频做一次推理，使第一次真实转录不再承担冷启动开销。"""
+        started = time.perf_counter()
+        try:
+            with self._generate_lock:
+                self._infer(make_warmup_clip())
+            self.warmup_seconds = time.perf_counter() - started
+            print(f"ASR模型预热完成，耗时 {self.warmup_seconds:.2f}s。")
+        except Exception as e:
+            # 预热失败不影响正常使用，只是首次调用会慢一些
+            print(f"ASR模型预热失败: {e}")
+
+    def wait_ready(self, timeout=None) -> bool:
+        """等待模型加载结束。返回模型是否可用。"""
+        self.ready.wait(timeout)
+        return self.model is not None
+
+    def generate(self, audio) -> str:
+        """
+        对音频（文件路径或16kHz float32数组）做识别，返回带标签的原始文本。
+        未识别到内容时返回空字符串。
+        """
+        started = time.perf_counter()
+        with self._generate_lock:
+            text = self._infer(audio)
+        elapsed = time.perf_counter() - started
+        self.latency_stats.add(elapsed)
+        if self.first_call_seconds is None:
+            self.first_call_seconds = elapsed
+            print(f"首次转录耗时 {elapsed * 1000:.0f}ms。")
+        return text
+
+    def transcribe_pcm(self, pcm: bytes) -> str:
+        """对16位单声道PCM做识别，接口与 ASRServerClient 一致。"""
+        return self.generate(pcm16_to_float32(pcm))
+
+    def stop(self):
+        """进程内引擎无需清理，保留此方法以便与 ASRServerClient 互换使用。"""
+        pass
+
+
+# 进程级单例，由主应用在界面显示后调用 load_async()
+asr_engine = ASREngine()
@@ -0,0 +1,228 @@
+# ai_assistant/core/asr_server.py
+
+import itertools
+import multiprocessing as mp
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+
+from ai_assistant.core.asr_engine import pcm16_to_float32
+from ai_assistant.utils import config
+from ai_assistant.utils.metrics import RollingStats
+
+
+def _asr_worker_main(request_q, result_q):
+    """
+    [ASR子进程] 加载模型后循环处理请求。
+    请求格式:
+      ("transcribe", job_id, shm_name, nbytes) —— 音频PCM放在共享内存中
+      ("ping", ping_id)
+      ("stop",)
+    """
+    # 在子进程中导入，主进程不需要加载 torch/funasr
+    from ai_assistant.core.asr_engine import asr_engine
+
+    asr_engine._load()
+    result_q.put(("ready", asr_engine.model is not None, str(asr_engine.load_error or "")))
+
+    while True:
+        msg = request_q.get()
+        kind = msg[0]
+        if kind == "stop":
+            break
+        if kind == "ping":
+            result_q.put(("pong", msg[1]))
+            continue
+        if kind == "transcribe":
+            _, job_id, shm_name, nbytes = msg
+            try:
+                shm = shared_memory.SharedMemory(name=shm_name)
+                try:
+                    audio = pcm16_to_float32(bytes(shm.buf[:nbytes]))
+                finally:
+                    shm.close()
+                started = time.perf_counter()
+                text = asr_engine.generate(audio) if asr_engine.model is not None else ""
+                result_q.put(("result", job_id, text, time.perf_counter() - started))
+            except Exception as e:
+                result_q.put(("error", job_id, str(e)))
+
+
+class ASRServerClient:
+    """
+    进程外ASR推理服务的客户端。
+    FunASR推理是CPU密集的Python/torch计算，与Tk界面、OpenCV采集循环在同一进程时会争抢GIL，
+    导致预览和界面卡顿。这里把模型放到独立的子进程中：
+    音频PCM通过 multiprocessing.shared_memory 传递，结果通过队列返回；
+    后台健康检查线程定期 ping 子进程，崩溃或无响应时自动重启。
+    对外提供与 ASREngine 相同的 load_async / wait_ready / ready 接口。
+    """
+
+    def __init__(self):
+        self._ctx = mp.get_context("spawn")  # 各平台行为一致，且不复制Tk等父进程状态
+        self.process = None
+        self.request_q = None
+        self.result_q = None
+        self.ready = threading.Event()
+        self.available = False
+        self.running = False
+        self._pending = {}              # job_id -> Future
+        self._pending_lock = threading.Lock()
+        self._job_ids = itertools.count(1)
+        self._pongs = {}                # ping_id -> threading.Event
+        self._listener_thread = None
+        self._health_thread = None
+        self.restarts = 0
+        self.latency_stats = RollingStats()  # 主进程视角的往返耗时
+
+    def load_async(self):
+        """[主线程调用] 启动子进程与后台线程，立即返回。"""
+        if self.running:
+            return
+        self.running = True
+        self._spawn()
+        self._health_thread = threading.Thread(target=self._health_loop, daemon=True)
+        self._health_thread.start()
+
+    def _spawn(self):
+        self.ready.clear()
+        self.available = False
+        self.request_q = self._ctx.Queue()
+        self.result_q = self._ctx.Queue()
+        self.process = self._ctx.Process(
+            target=_asr_worker_main, args=(self.request_q, self.result_q),
+            name="asr-server", daemon=True
+        )
+        self.process.start()
+        self._listener_thread = threading.Thread(
+            target=self._listen_results, args=(self.result_q,), daemon=True)
+        self._listener_thread.start()
+        print(f"ASR推理子进程已启动 (pid={self.process.pid})。")
+
+    def _listen_results(self, result_q):
+        """[监听线程] 接收子进程的返回并完成对应的 Future。"""
+        while self.running:
+            try:
+                msg = result_q.get(timeout=1.0)
+            except queue.Empty:
+                if result_q is not self.result_q:
+                    return  # 子进程已被替换，旧的监听线程退出
+                continue
+            except (EOFError, OSError):
+                return
+            kind = msg[0]
+            if kind == "ready":
+                self.available = msg[1]
+                if not msg[1]:
+                    print(f"ASR子进程模型加载失败: {msg[2]}")
+                self.ready.set()
+            elif kind == "pong":
+                event = self._pongs.pop(msg[1], None)
+                if event:
+                    event.set()
+            elif kind in ("result", "error"):
+                with self._pending_lock:
+                    future = self._pending.pop(msg[1], None)
+                if future is None:
+                    continue
+                if kind == "result":
+                    future.set_result(msg[2])
+                else:
+                    future.set_exception(RuntimeError(msg[2]))
+
+    def _health_loop(self):
+        """[健康检查线程] 检查子进程存活；空闲时 ping，超时未响应则重启。"""
+        while self.running:
+            time.sleep(config.ASR_HEALTH_CHECK_INTERVAL_SECONDS)
+            if not self.running:
+                break
+            if not self.process.is_alive():
+                self._restart(f"ASR子进程已退出 (exitcode={self.process.exitcode})")
+                continue
+            # 模型加载期间或有任务在处理时子进程是忙碌的，不做 ping
+            with self._pending_lock:
+                busy = bool(self._pending)
+            if not self.ready.is_set() or busy:
+                continue
+            if not self._ping(config.ASR_PING_TIMEOUT_SECONDS):
+                self._restart("ASR子进程无响应")
+
+    def _ping(self, timeout: float) -> bool:
+        ping_id = next(self._job_ids)
+        event = threading.Event()
+        self._pongs[ping_id] = event
+        try:
+            self.request_q.put(("ping", ping_id))
+        except Exception:
+            return False
+        ok = event.wait(timeout)
+        self._pongs.pop(ping_id, None)
+        return ok
+
+    def _restart(self, reason: str):
+        """结束旧进程，让所有进行中的任务失败，然后启动新进程。"""
+        print(f"{reason}，正在重启ASR推理服务...")
+        self.restarts += 1
+        self._fail_pending(RuntimeError(reason))
+        try:
+            if self.process.is_alive():
+                self.process.kill()
+            self.process.join(timeout=2.0)
+        except Exception as e:
+            print(f"结束ASR子进程时出错: {e}")
+        self._spawn()
+
+    def _fail_pending(self, exc: Exception):
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            future.set_exception(exc)
+
+    def wait_ready(self, timeout=None) -> bool:
+        """等待子进程完成模型加载。返回模型是否可用。"""
+        self.ready.wait(timeout)
+        return self.available
+
+    def transcribe_pcm(self, pcm: bytes) -> str:
+        """
+        [调用方线程] 将16位PCM通过共享内存交给子进程识别，阻塞等待结果。
+        等待期间本线程释放GIL，不影响界面和采集循环。
+        """
+        started = time.perf_counter()
+        job_id = next(self._job_ids)
+        future = Future()
+        shm = shared_memory.SharedMemory(create=True, size=max(1, len(pcm)))
+        try:
+            shm.buf[:len(pcm)] = pcm
+            with self._pending_lock:
+                self._pending[job_id] = future
+            self.request_q.put(("transcribe", job_id, shm.name, len(pcm)))
+            text = future.result(timeout=config.ASR_TRANSCRIBE_TIMEOUT_SECONDS)
+            self.latency_stats.add(time.perf_counter() - started)
+            return text
+        finally:
+            with self._pending_lock:
+                self._pending.pop(job_id, None)
+            shm.close()
+            shm.unlink()
+
+    def stop(self):
+        """[应用关闭时调用] 通知子进程退出并回收资源。"""
+        if not self.running:
+            return
+        self.running = False
+        self._fail_pending(RuntimeError("ASR推理服务已停止"))
+        try:
+            self.request_q.put(("stop",))
+            self.process.join(timeout=2.0)
+            if self.process.is_alive():
+                self.process.kill()
+        except Exception as e:
+            print(f"停止ASR子进程时出错: {e}")
+        print(f"ASR推理服务已停止 (重启次数: {self.restarts})。")
+
+
+# 进程级单例，由 AudioTranscriber 在 config.ASR_OUT_OF_PROCESS 为 True 时使用
+asr_server = ASRServerClient()
@@ -0,0 +1,85 @@
+# ai_assistant/core/async_runtime.py
+
+import asyncio
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+
+class AsyncRuntime:
+    """
+    在一个后台线程上运行的 asyncio 事件循环，所有云端调用（Qwen-VL、DeepSeek、OSS、TTS）都在这里执行。
+    以前每个远程调用各自占用一个阻塞的守护线程；现在几十个并发请求只是几十个协程，
+    并且可以通过取消 Future 来中止请求、用 asyncio.gather 做并发扇出。
+
+    对外提供两种接口：
+      - submit(coro)：线程安全，可以从任何线程（Tk主线程、调度通道、音频线程）调用，
+        返回 concurrent.futures.Future，对其调用 cancel() 会取消对应的协程；
+      - run(coro, timeout)：submit 后阻塞等待结果，方便同步代码直接使用。
+    在事件循环内部的代码则直接 await 这些协程。
+    """
+
+    def __init__(self):
+        self.loop = None
+        self.thread = None
+        self._lock = threading.Lock()
+        self._started = threading.Event()
+
+    def start(self):
+        """启动事件循环线程（重复调用无副作用）。submit() 首次调用时也会自动启动。"""
+        with self._lock:
+            if self.thread is not None and self.thread.is_alive():
+                return
+            self._started.clear()
+            self.thread = threading.Thread(target=self._run_loop, name="async-runtime", daemon=True)
+            self.thread.start()
+        self._started.wait()
+
+    def _run_loop(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self._started.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+
+    def submit(self, coro) -> Future:
+        """[任意线程] 把协程交给事件循环执行，返回可取消的 concurrent.futures.Future。"""
+        if self.loop is None or not self.loop.is_running():
+            self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout: float = None):
+        """[非事件循环线程] 执行协程并阻塞等待结果；超时后会取消协程再抛出 TimeoutError。"""
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise
+
+    def in_loop_thread(self) -> bool:
+        return threading.current_thread() is self.thread
+
+    def stop(self):
+        """取消所有未完成的协程并停止事件循环。"""
+        if self.loop is None or not self.loop.is_running():
+            return
+
+        async def _shutdown():
+            tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+            for t in tasks:
+                t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        try:
+            asyncio.run_coroutine_threadsafe(_shutdown(), self.loop).result(timeout=2.0)
+        except Exception as e:
+            print(f"关闭异步任务时出错: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=2.0)
+        print("异步网络运行时已停止。")
+
+
+# 进程级单例：所有模块共用同一个事件循环
+runtime = AsyncRuntime()
@@ -0,0 +1,205 @@
+# ai_assistant/core/audio_devices.py
+
+import threading
+import time
+import pyaudio
+
+from ai_assistant.utils import config
+
+
+# PortAudio 错误码
+PA_OUTPUT_UNDERFLOWED = -9980
+
+
+class AudioDeviceManager:
+    """
+    进程级唯一的音频设备管理器。
+    每次创建 pyaudio.PyAudio() 都会重新枚举主机上的全部音频设备，耗时几十到几百毫秒。
+    这里只在启动时创建一次 PyAudio 实例，并维护长期打开的输入/输出流，
+    VAD 和 TTS 播放等组件借用这些流，而不是各自创建和销毁。
+    当设备被拔出或出现不可恢复的IO错误时，会自动重建 PyAudio 实例并重新打开流。
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._output_lock = threading.Lock()   # 输出流写入期间持有
+        self._input_lock = threading.Lock()    # 输入流读取期间持有
+        self._next_recovery_at = 0.0           # 下一次允许尝试恢复设备的时间 (monotonic)
+        self._pa = None
+        self._input_stream = None
+        self._output_stream = None
+        self._output_params = None
+        self.ready = threading.Event()
+        self.sample_width = pyaudio.get_sample_size(pyaudio.paInt16)
+
+        # --- 计数器 ---
+        self.setup_seconds = 0.0
+        self.input_overflows = 0
+        self.output_underflows = 0
+        self.recoveries = 0
+
+    def start(self):
+        """[启动时调用] 创建 PyAudio 实例并打开输入流，只执行一次。"""
+        with self._lock:
+            if self.ready.is_set():
+                return
+            started = time.perf_counter()
+            try:
+                self._pa = pyaudio.PyAudio()
+                self._open_input_stream()
+            except Exception as e:
+                print(f"初始化音频设备失败: {e}")
+            self.setup_seconds = time.perf_counter() - started
+            print(f"音频设备管理器已就绪，初始化耗时 {self.setup_seconds * 1000:.0f}ms。")
+            self.ready.set()
+
+    def _open_input_stream(self):
+        self._input_stream = self._pa.open(
+            format=pyaudio.paInt16, channels=config.AUDIO_CHANNELS,
+            rate=config.AUDIO_RATE, input=True,
+            frames_per_buffer=config.AUDIO_CHUNK
+        )
+
+    def read_input(self, frames: int):
+        """
+        从共享输入流读取音频块。
+        读取前若缓冲区积压已达 AUDIO_INPUT_OVERFLOW_CHUNKS 个块，说明读取跟不上、
+        缓冲区即将（或已经）溢出，只计数；读取本身不因溢出抛异常，已采集的音频照常返回给 VAD/ASR。
+        其他IO错误视为设备变化，尝试重建设备后返回 None。
+        输入流不可用（恢复失败、等待下次重试）时按一个块的时长等待后返回 None，避免调用方空转。
+        """
+        error = None
+        with self._input_lock:
+            stream = self._input_stream
+            if stream is not None:
+                try:
+                    if stream.get_read_available() >= frames * config.AUDIO_INPUT_OVERFLOW_CHUNKS:
+                        self.input_overflows += 1
+                    return stream.read(frames, exception_on_overflow=False)
+                except IOError as e:
+                    error = f"音频输入IO错误: {e}"
+        # 恢复时需要重新获取输入锁，因此在释放之后进行
+        if not self._recover(error or "输入流不可用"):
+            time.sleep(frames / config.AUDIO_RATE)
+        return None
+
+    def drain_input(self):
+        """丢弃输入缓冲区中积压的数据（例如TTS播放期间录入的自己的声音）。"""
+        with self._input_lock:
+            stream = self._input_stream
+            if stream is None:
+                return
+            try:
+                available = stream.get_read_available()
+                if available > 0:
+                    stream.read(available, exception_on_overflow=False)
+            except IOError:
+                pass
+
+    def write_output(self, data: bytes, sample_width: int, channels: int, rate: int):
+        """
+        将PCM数据写入共享输出流。参数与当前流不同时才重新打开。
+        输出下溢只计数，其他IO错误触发设备恢复并向上抛出。
+        """
+        with self._output_lock:
+            stream = self._get_output_stream(sample_width, channels, rate)
+            try:
+                stream.write(data, exception_on_underflow=True)
+                return
+            except IOError as e:
+                if getattr(e, "errno", None) == PA_OUTPUT_UNDERFLOWED:
+                    self.output_underflows += 1
+                    return
+                error = e
+        # 恢复时需要重新获取输出锁，因此在释放之后进行
+        self._recover(f"音频输出IO错误: {error}")
+        raise error
+
+    def _get_output_stream(self, sample_width: int, channels: int, rate: int):
+        params = (sample_width, channels, rate)
+        with self._lock:
+            if self._output_stream is not None and self._output_params == params:
+                return self._output_stream
+            if self._pa is None:
+                raise IOError("音频设备未初始化")
+            self._close_output_stream()
+            self._output_stream = self._pa.open(
+                format=self._pa.get_format_from_width(sample_width),
+                channels=channels, rate=rate, output=True
+            )
+            self._output_params = params
+            return self._output_stream
+
+    def _recover(self, reason: str) -> bool:
+        """
+        重建 PyAudio 实例（重新枚举设备）并重新打开输入流，用于设备热插拔。
+        按“输出锁 -> 输入锁 -> 状态锁”的顺序加锁（与读写路径一致），
+        确保关闭流时没有线程正在读写它；退避等待在锁外进行。
+        两次尝试至少间隔 AUDIO_RECOVERY_BACKOFF_SECONDS，未到时间直接返回 False。
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now < self._next_recovery_at:
+                return False
+            self._next_recovery_at = now + config.AUDIO_RECOVERY_BACKOFF_SECONDS
+            self.recoveries += 1
+        print(f"{reason}，正在重新初始化音频设备...")
+        with self._output_lock, self._input_lock, self._lock:
+            self._close_all()
+        time.sleep(config.AUDIO_RECOVERY_BACKOFF_SECONDS)
+        with self._output_lock, self._input_lock, self._lock:
+            try:
+                self._pa = pyaudio.PyAudio()
+                self._open_input_stream()
+                print("音频设备已恢复。")
+            except Exception as e:
+                print(f"音频设备恢复失败，{config.AUDIO_RECOVERY_BACKOFF_SECONDS:.0f} 秒后重试: {e}")
+            self._next_recovery_at = time.monotonic() + config.AUDIO_RECOVERY_BACKOFF_SECONDS
+        return True
+
+    def _close_output_stream(self):
+        try:
+            if self._output_stream:
+                self._output_stream.stop_stream()
+                self._output_stream.close()
+        except Exception as e:
+            print(f"关闭音频输出流时出错: {e}")
+        finally:
+            self._output_stream, self._output_params = None, None
+
+    def _close_all(self):
+        try:
+            if self._input_stream:
+                self._input_stream.stop_stream()
+                self._input_stream.close()
+        except Exception as e:
+            print(f"关闭音频输入流时出错: {e}")
+        finally:
+            self._input_stream = None
+        self._close_output_stream()
+        try:
+            if self._pa:
+                self._pa.terminate()
+        except Exception as e:
+            print(f"释放PyAudio实例时出错: {e}")
+        finally:
+            self._pa = None
+
+    def get_stats(self) -> dict:
+        return {
+            "setup_ms": round(self.setup_seconds * 1000),
+            "input_overflows": self.input_overflows,
+            "output_underflows": self.output_underflows,
+            "recoveries": self.recoveries,
+        }
+
+    def shutdown(self):
+        """[应用关闭时调用] 关闭所有流并释放 PyAudio。"""
+        with self._output_lock, self._input_lock, self._lock:
+            self._close_all()
+            self.ready.clear()
+        print(f"音频设备管理器已关闭。统计: {self.get_stats()}")
+
+
+# 进程级单例，所有音频组件共享
+audio_manager = AudioDeviceManager()
@@ -1,20 +1,21 @@
 # ai_assistant/core/audio_processing.py
 
-import pyaudio
-import wave
 import threading
-import queue
 import time
-import os
+import io
 import numpy as np
 from pydub import AudioSegment
-from pydub.playback import play
-from dashscope.audio.tts_v2 import SpeechSynthesizer
 
 # 从我们自己的包里导入模块
 from ai_assistant.utils import config
 from ai_assistant.utils.helpers import extract_language_emotion_content
-from ai_assistant.core.api_clients import asr_model
+from ai_assistant.utils.metrics import RollingStats, CounterGroup, format_stats, turn_metrics
+from ai_assistant.core.asr_engine import asr_engine
+from ai_assistant.core.asr_server import asr_server
+from ai_assistant.core.audio_devices import audio_manager
+from ai_assistant.core.api_clients import synthesize_speech
+from ai_assistant.core.async_runtime import runtime
+from ai_assistant.core.governor import governor
 
 
 # 如何替换TTS服务？(比如换成微软Azure)
@@ -24,174 +25,280 @@ from ai_assistant.core.api_clients import asr_model
 
 
 
+class TTSItem:
+    """TTS调度器中的一个待播报条目。"""
+    def __init__(self, text: str, priority: int, seq: int, ttl: float, turn_id=None):
+        self.text = text
+        self.priority = priority   # 数值越小越重要，0为最高
+        self.seq = seq             # 同优先级下按到达顺序播放
+        self.turn_id = turn_id or f"tts_{seq}"  # 同一回合的多个句子共享回合ID
+        self.enqueued_at = time.time()
+        self.deadline = self.enqueued_at + ttl
+        self.audio = None          # 合成并解码后的 AudioSegment，预取后填充
+
+    def expired(self, now=None) -> bool:
+        return (now or time.time()) > self.deadline
+
+    def sort_key(self):
+        return (self.priority, self.seq)
+
+
 class AudioPlayer:
     """
     处理文本转语音（TTS）和音频播放的类。
-    使用带优先级的队列来管理播放请求，确保重要回复（如用户提问）能插队。
+    采用条件变量驱动的调度器：每个条目有优先级和截止时间(TTL)，
+    更高优先级的新条目会抢占正在播放的低优先级音频；
+    在当前音频播放期间会预先合成下一条，使连续播报之间没有空档。
     """
     def __init__(self, app):
         self.app = app
-        self.playing = False
-        self.play_thread = None
+        self.cond = threading.Condition()
+        self.pending = []          # 按 (priority, seq) 排序的待合成条目
+        self.ready = None          # 已合成、等待播放的条目（预取槽，容量为1）
+        self.synthesizing = None   # 正在合成的条目
+        self.current = None        # 正在播放的条目
         self.skip_requested = False
-        self.tts_queue = queue.PriorityQueue()
-        self.tts_thread = None
         self.tts_running = False
-        self.max_queue_size = 2 # 允许缓存少量消息
+        self.synth_thread = None
+        self.play_thread = None
+        self.seq_counter = 0
+        self.max_queue_size = config.TTS_MAX_PENDING
 
-    def start_tts_thread(self):
-        """启动后台TTS处理线程。"""
-        if not self.tts_running:
-            self.tts_running = True
-            self.tts_thread = threading.Thread(target=self._process_tts_queue)
-            self.tts_thread.daemon = True
-            self.tts_thread.start()
-            print("TTS处理线程已启动。")
-
-    def _process_tts_queue(self):
-        """[后台线程] 持续从队列中获取任务并处理。"""
-        while self.tts_running:
-            try:
-                # 仅在当前没有音频播放时才获取新任务
-                if not self.tts_queue.empty() and not self.playing:
-                    priority, timestamp, text = self.tts_queue.get()
-                    
-                    # 忽略过时的低优先级消息 (例如超过15秒的图像分析反馈)
-                    if priority > 1 and (time.time() - timestamp) > 15:
-                        self.tts_queue.task_done()
-                        continue
-                    
-                    self._synthesize_and_play(text)
-                    self.tts_queue.task_done()
-                time.sleep(0.1)
-            except Exception as e:
-                print(f"处理TTS队列时出错: {e}")
+        # --- 调度指标 ---
+        self.queue_wait_stats = RollingStats()   # 入队到开始播放的等待时间
+        self.playback_gap_stats = RollingStats() # 连续播报之间的空档
+        self.drop_counts = CounterGroup()        # 按原因统计丢弃数
+        self.last_playback_end = 0
 
-    def play_text(self, text: str, priority=2):
-        """将文本添加到播放队列。priority=1为最高优先级。"""
+    def start_tts_thread(self):
+        """启动后台合成线程与播放线程。"""
+        if self.tts_running:
+            return
+        self.tts_running = True
+        self.synth_thread = threading.Thread(target=self._synthesis_worker, daemon=True)
+        self.play_thread = threading.Thread(target=self._playback_worker, daemon=True)
+        self.synth_thread.start()
+        self.play_thread.start()
+        print("TTS调度线程已启动。")
+
+    def play_text(self, text: str, priority=2, ttl=None, turn_id=None, audio=None):
+        """
+        将文本加入播报调度。priority越小越重要（0为最高）。
+        ttl 为可选的截止时长（秒），超过后尚未播放的条目会被丢弃。
+        turn_id 用于流式回复：同一回合的句子按顺序播放，不会因队列溢出而互相挤掉。
+        audio 为可选的、已经合成好的 AudioSegment（例如预生成的回复），传入后跳过合成直接排队播放。
+        """
         if not text or not text.strip():
             return
-        # 如果是高优先级请求或队列已满，清理旧任务
-        if priority == 1 or self.tts_queue.qsize() >= self.max_queue_size:
-            self._clean_queue(priority)
-        
-        if not self.tts_running or not self.tts_thread or not self.tts_thread.is_alive():
+        if ttl is None:
+            ttl = config.TTS_TTL_SECONDS.get(priority, config.TTS_TTL_SECONDS[2])
+
+        with self.cond:
+            self.seq_counter += 1
+            item = TTSItem(text, priority, self.seq_counter, ttl, turn_id)
+            item.audio = audio
+
+            # 已预取但更不重要的条目先退回队列，与新条目重新竞争（也会被下面的清理一并丢弃）
+            if self.ready and self.ready.priority > priority:
+                self.pending.append(self.ready)
+                self.ready = None
+
+            # 高优先级条目会清理掉尚未播放的、不如它重要的条目
+            if priority <= 1:
+                self._drop_pending(lambda it: it.priority > priority, "superseded")
+
+            self.pending.append(item)
+            self.pending.sort(key=TTSItem.sort_key)
+
+            # 队列溢出时丢弃其他回合中最不重要且最旧的条目
+            while len(self.pending) > self.max_queue_size:
+                others = [it for it in self.pending if it.turn_id != item.turn_id]
+                if not others:
+                    break
+                victim = max(others, key=lambda it: (it.priority, -it.seq))
+                self.pending.remove(victim)
+                self.drop_counts.incr("overflow")
+
+            # 抢占正在播放的低优先级音频
+            if self.current and self.current.priority > priority:
+                print(f"高优先级播报到达，抢占当前音频 (优先级 {self.current.priority} -> {priority})。")
+                self.drop_counts.incr("preempted")
+                self.skip_requested = True
+
+            self.cond.notify_all()
+
+        if not self.tts_running:
             self.start_tts_thread()
-            
-        self.tts_queue.put((priority, time.time(), text))
 
-    def _clean_queue(self, new_priority: int):
-        """根据新消息的优先级清理队列。"""
-        if self.tts_queue.empty():
-            return
-        # 最高优先级消息会清空整个队列
-        if new_priority == 1:
-            while not self.tts_queue.empty():
-                try:
-                    self.tts_queue.get_nowait()
-                    self.tts_queue.task_done()
-                except queue.Empty:
-                    pass
-        # 普通消息只会移除最旧的一个以腾出空间
-        else:
-             while self.tts_queue.qsize() >= self.max_queue_size:
-                try:
-                    self.tts_queue.get_nowait()
-                    self.tts_queue.task_done()
-                except queue.Empty:
+    def _drop_pending(self, predicate, reason: str):
+        """[持有锁时调用] 丢弃满足条件的待播条目并计数。"""
+        kept = []
+        for it in self.pending:
+            if predicate(it):
+                self.drop_counts.incr(reason)
+            else:
+                kept.append(it)
+        self.pending = kept
+
+    def _refresh_busy_flag(self):
+        """[持有锁时调用] 合成或播放期间暂停VAD，避免录入自己的声音。"""
+        self.app.is_playing_audio = bool(self.current or self.ready or self.synthesizing)
+
+    def _synthesis_worker(self):
+        """[合成线程] 取出最重要的待播条目并提前合成，填充预取槽。"""
+        while self.tts_running:
+            with self.cond:
+                while self.tts_running and (self.ready is not None or not self.pending):
+                    self.cond.wait()
+                if not self.tts_running:
                     break
+                item = self.pending.pop(0)
+                if item.expired():
+                    self.drop_counts.incr("expired")
+                    continue
+                self.synthesizing = item
+                self._refresh_busy_flag()
+
+            if item.audio is None:
+                if not governor.admit("tts", item.priority, cost=len(item.text)):
+                    with self.cond:
+                        self.synthesizing = None
+                        self.drop_counts.incr("throttled")
+                        self._refresh_busy_flag()
+                    continue
+                if not self.current:
+                    self.app.update_status("正在合成语音...")
+                item.audio = self._synthesize(item.text)
+                if item.audio is not None:
+                    governor.record("tts", len(item.text))
+
+            with self.cond:
+                self.synthesizing = None
+                if item.audio is None:
+                    self.drop_counts.incr("synth_error")
+                elif self.pending and self.pending[0].sort_key() < item.sort_key():
+                    # 合成期间来了更重要的条目，本条目带着音频退回队列
+                    self.pending.append(item)
+                    self.pending.sort(key=TTSItem.sort_key)
+                else:
+                    self.ready = item
+                self._refresh_busy_flag()
+                self.cond.notify_all()
 
-    def _synthesize_and_play(self, text: str):
-        """[TTS线程调用] 合成语音并调用内部播放器。"""
-        self.app.update_status("正在合成语音...")
-        # 标记正在播放，这会暂停VAD的语音检测
-        self.app.is_playing_audio = True
+    def _synthesize(self, text: str):
+        """[合成线程] 通过异步运行时调用TTS并解码为 AudioSegment，失败时返回 None。"""
         try:
-            synthesizer = SpeechSynthesizer(model=config.TTS_MODEL, voice=config.TTS_VOICE)
-            audio = synthesizer.call(text)
-            
-            if not audio:
-                raise ValueError("TTS API返回了空音频数据")
-            
-            output_file = f'output_{int(time.time())}.mp3'
-            with open(output_file, 'wb') as f:
-                f.write(audio)
-            
-            self._play_audio_file_internal(output_file)
+            return self.decode_audio(runtime.run(synthesize_speech(text)))
         except Exception as e:
             print(f"TTS错误: {e}")
-            self.app.is_playing_audio = False # 合成失败，恢复VAD
-
-    def _play_audio_file_internal(self, file_path: str):
-        """准备并启动一个新线程来播放音频文件。"""
-        if self.playing:
-            self.skip_current() # 确保旧的播放任务被请求停止
-            if self.play_thread and self.play_thread.is_alive():
-                self.play_thread.join(timeout=1.0)
-        
-        self.skip_requested = False
-        self.playing = True
-        self.app.is_playing_audio = True
-        
-        self.play_thread = threading.Thread(target=self._play_audio_worker, args=(file_path,))
-        self.play_thread.daemon = True
-        self.play_thread.start()
+            return None
 
-    def _play_audio_worker(self, file_path: str):
-        """[播放线程] 实际执行音频播放的线程，已修正为非阻塞。"""
-        self.app.update_status("正在播放语音...")
-        player_process = None
-        try:
-            if not os.path.exists(file_path) or os.path.getsize(file_path) == 0:
-                raise FileNotFoundError(f"音频文件无效或为空: {file_path}")
-
-            sound = AudioSegment.from_file(file_path, format="mp3")
+    @staticmethod
+    def decode_audio(audio: bytes) -> AudioSegment:
+        """把TTS返回的mp3字节解码为 AudioSegment。"""
+        if not audio:
+            raise ValueError("TTS API返回了空音频数据")
+        return AudioSegment.from_file(io.BytesIO(audio), format="mp3")
 
-            # --- 关键修正：将阻塞的play()放入子线程 ---
-            player_process = threading.Thread(target=play, args=(sound,), daemon=True)
-            player_process.start()
-
-            # 循环检查播放是否结束或是否被请求跳过
-            while player_process.is_alive() and not self.skip_requested:
-                time.sleep(0.1)
-            
-            if self.skip_requested:
-                print("音频播放已被跳过。")
-            else:
-                print("音频播放自然结束。")
-            # 注意：pydub的play没有直接的.stop()方法，我们通过不再等待线程来“跳过”。
-            # --- 修正结束 ---
-
-        except Exception as e:
-            print(f"音频播放错误: {e}")
-            self.app.update_status("音频播放失败")
-        finally:
-            self.playing = False
-            self.app.is_playing_audio = False
-            self.skip_requested = False # 重置跳过状态
-            self.app.update_status("就绪")
+    def _playback_worker(self):
+        """[播放线程] 播放预取槽中的条目，并记录等待时间与播报空档。"""
+        while self.tts_running:
+            with self.cond:
+                while self.tts_running and self.ready is None:
+                    self.cond.wait()
+                if not self.tts_running:
+                    break
+                item, self.ready = self.ready, None
+                if item.expired():
+                    self.drop_counts.incr("expired")
+                    self._refresh_busy_flag()
+                    self.cond.notify_all()
+                    continue
+                self.current = item
+                self.skip_requested = False
+                self._refresh_busy_flag()
+                # 唤醒合成线程，在播放当前条目的同时预取下一条
+                self.cond.notify_all()
+
+            started = time.time()
+            self.queue_wait_stats.add(started - item.enqueued_at)
+            turn_metrics.mark(item.turn_id, "first_audio")
+            if self.last_playback_end and item.enqueued_at < self.last_playback_end:
+                self.playback_gap_stats.add(started - self.last_playback_end)
+
+            self.app.update_status("正在播放语音...")
             try:
-                # 播放结束后清理临时文件
-                if os.path.exists(file_path) and file_path.startswith('output_'):
-                    os.remove(file_path)
+                completed = self._play_segment(item.audio)
+                print("音频播放自然结束。" if completed else "音频播放已被跳过。")
             except Exception as e:
-                print(f"删除临时音频文件出错: {e}")
+                print(f"音频播放错误: {e}")
+                self.drop_counts.incr("playback_error")
+                self.app.update_status("音频播放失败")
+            finally:
+                with self.cond:
+                    self.current = None
+                    self.skip_requested = False
+                    self.last_playback_end = time.time()
+                    self._refresh_busy_flag()
+                    idle = not self.app.is_playing_audio
+                if idle:
+                    self.app.update_status("就绪")
+
+    def _play_segment(self, sound) -> bool:
+        """
+        [播放线程] 以小块写入共享输出流播放音频，每块之间检查跳过请求，
+        因此抢占可以在约50毫秒内真正停止声音。返回是否完整播放。
+        """
+        raw = sound.raw_data
+        chunk_bytes = max(1, int(sound.frame_rate * 0.05)) * sound.frame_width
+        for offset in range(0, len(raw), chunk_bytes):
+            if self.skip_requested or not self.tts_running:
+                return False
+            audio_manager.write_output(raw[offset:offset + chunk_bytes],
+                                       sound.sample_width, sound.channels, sound.frame_rate)
+        return True
+
+    def cancel_turn(self, turn_id: str):
+        """撤回某个回合尚未播放的全部句子；如果正在播放该回合，则立即停止。"""
+        with self.cond:
+            self._drop_pending(lambda it: it.turn_id == turn_id, "cancelled")
+            if self.ready and self.ready.turn_id == turn_id:
+                self.ready = None
+                self.drop_counts.incr("cancelled")
+            if self.current and self.current.turn_id == turn_id:
+                self.skip_requested = True
+            self._refresh_busy_flag()
+            self.cond.notify_all()
 
     def skip_current(self):
         """请求跳过当前正在播放的音频。"""
-        if self.playing:
+        if self.current:
             print("已请求跳过当前音频。")
             self.skip_requested = True
 
+    def get_stats(self) -> dict:
+        """返回调度器的等待时间、播报空档与丢弃统计。"""
+        return {
+            "queue_wait": self.queue_wait_stats.snapshot(),
+            "playback_gap": self.playback_gap_stats.snapshot(),
+            "drops": self.drop_counts.snapshot(),
+        }
+
     def stop(self):
         """停止所有音频活动。"""
-        self.tts_running = False
-        self.skip_current()
-        self._clean_queue(new_priority=1) # 清空队列
-        if self.tts_thread and self.tts_thread.is_alive():
-            self.tts_thread.join(timeout=1.0)
-        if self.play_thread and self.play_thread.is_alive():
-            self.play_thread.join(timeout=1.0)
+        with self.cond:
+            self.tts_running = False
+            self.skip_requested = True
+            self.pending = []
+            self.ready = None
+            self.cond.notify_all()
+        for t in (self.synth_thread, self.play_thread):
+            if t and t.is_alive():
+                t.join(timeout=1.0)
+        stats = self.get_stats()
+        print(format_stats("TTS排队等待", stats["queue_wait"]))
+        print(format_stats("TTS播报空档", stats["playback_gap"]))
+        print(f"TTS丢弃统计: {stats['drops'] or '无'}")
         print("AudioPlayer 已成功停止。")
 
 
@@ -213,10 +320,6 @@ class VoiceActivityDetector:
         self.silence_start_time = 0
         self.speech_frames = []
         
-        # PyAudio对象
-        self.audio = None
-        self.stream = None
-        
         # 校准参数
         self.is_calibrating = True
         self.calibration_duration = 2.0 # 2秒校准时间
@@ -233,50 +336,40 @@ class VoiceActivityDetector:
         self.running = False
         if self.listening_thread and self.listening_thread.is_alive():
             self.listening_thread.join(timeout=1.0)
-        self._close_stream()
         print("语音活动检测已停止。")
 
-    def _close_stream(self):
-        """安全地关闭PyAudio流和实例。"""
-        try:
-            if self.stream:
-                self.stream.stop_stream()
-                self.stream.close()
-            if self.audio:
-                self.audio.terminate()
-        except Exception as e:
-            print(f"关闭音频流时出错: {e}")
-        finally:
-            self.stream, self.audio = None, None
-
     def _calculate_energy(self, audio_data: bytes) -> float:
         """计算音频块的能量（均方根）。"""
         data = np.frombuffer(audio_data, dtype=np.int16)
         return np.sqrt(np.mean(np.square(data.astype(np.float64)))) if data.size > 0 else 0
 
     def _monitor_audio_loop(self):
-        """[后台线程] VAD的主循环。"""
+        """[后台线程] VAD的主循环。借用音频设备管理器的共享输入流。"""
+        # 设备在应用启动时已由 audio_manager 初始化，这里只等待其就绪
+        audio_manager.ready.wait()
         try:
-            self.audio = pyaudio.PyAudio()
-            self.stream = self.audio.open(
-                format=pyaudio.paInt16, channels=config.AUDIO_CHANNELS,
-                rate=config.AUDIO_RATE, input=True,
-                frames_per_buffer=config.AUDIO_CHUNK
-            )
             self._calibrate_microphone()
         except Exception as e:
-            print(f"初始化PyAudio失败: {e}")
+            print(f"麦克风校准失败: {e}")
             self.app.update_status("错误: 麦克风初始化失败")
             return
 
+        was_paused = False
         while self.running:
             try:
                 # 如果系统正在播放音频，则暂停检测
                 if self.app.is_playing_audio:
+                    was_paused = True
                     time.sleep(0.1)
                     continue
+                if was_paused:
+                    # 丢弃暂停期间积压的音频（其中可能含有TTS播放的声音）
+                    audio_manager.drain_input()
+                    was_paused = False
 
-                audio_data = self.stream.read(config.AUDIO_CHUNK, exception_on_overflow=False)
+                audio_data = audio_manager.read_input(config.AUDIO_CHUNK)
+                if audio_data is None:
+                    continue
                 energy = self._calculate_energy(audio_data)
 
                 is_speech = energy > self.energy_threshold
@@ -297,17 +390,9 @@ class VoiceActivityDetector:
                     if (time.time() - self.silence_start_time) > self.silence_duration_threshold:
                         self._process_detected_speech()
 
-            except IOError as e:
-                # 忽略输入溢出错误，但打印提示
-                if e.errno == -9981:
-                    print("警告: 音频输入溢出，忽略一帧。")
-                else:
-                    print(f"音频监测IO错误: {e}")
-                    time.sleep(0.5)
             except Exception as e:
                 print(f"音频监测循环未知错误: {e}")
                 time.sleep(0.5)
-        self._close_stream()
 
     def _calibrate_microphone(self):
         """在开始时测量环境噪音以设定动态阈值。"""
@@ -315,11 +400,9 @@ class VoiceActivityDetector:
         noise_levels = []
         start_time = time.time()
         while time.time() - start_time < self.calibration_duration:
-            try:
-                audio_data = self.stream.read(config.AUDIO_CHUNK)
+            audio_data = audio_manager.read_input(config.AUDIO_CHUNK)
+            if audio_data is not None: # 忽略校准期间的溢出
                 noise_levels.append(self._calculate_energy(audio_data))
-            except IOError: # 忽略校准期间的溢出
-                pass
         
         if noise_levels:
             avg_noise = np.mean(noise_levels)
@@ -336,9 +419,9 @@ class VoiceActivityDetector:
         """处理检测到的一段完整语音。"""
         speech_duration = time.time() - self.speech_start_time
         if speech_duration >= self.min_speech_duration and self.speech_frames:
-            frames_copy = self.speech_frames.copy()
-            # 在新线程中保存和转录，以防阻塞VAD循环
-            threading.Thread(target=self._save_and_request_transcription, args=(frames_copy,), daemon=True).start()
+            pcm = b''.join(self.speech_frames)
+            # 在新线程中请求转录，以防阻塞VAD循环
+            threading.Thread(target=self.app.transcribe_audio, args=(pcm,), daemon=True).start()
 
         # 重置状态，准备下一次检测
         self.is_speaking = False
@@ -346,56 +429,47 @@ class VoiceActivityDetector:
         self.speech_frames = []
         if not self.app.is_playing_audio: self.app.update_status("就绪")
 
-    def _save_and_request_transcription(self, frames: list):
-        """将音频帧保存到WAV文件，并回调主应用来处理转录。"""
-        temp_filename = f"speech_{int(time.time())}.wav"
-        
-        try:
-            with wave.open(temp_filename, 'wb') as wf:
-                wf.setnchannels(config.AUDIO_CHANNELS)
-                # pyaudio.get_sample_size() 需要一个PyAudio实例
-                pa = pyaudio.PyAudio()
-                wf.setsampwidth(pa.get_sample_size(pyaudio.paInt16))
-                pa.terminate()
-                wf.setframerate(config.AUDIO_RATE)
-                wf.writeframes(b''.join(frames))
-            
-            # 回调主应用，让它决定如何处理这个音频文件
-            self.app.transcribe_audio(temp_filename)
-        except Exception as e:
-            print(f"保存WAV文件时出错: {e}")
-
 class AudioTranscriber:
     """
-处理音频文件转录的专用类。
-ASR (语音转文字): asr_model = AutoModel(...)
-这是本地模型。funasr这个库非常强大。当你执行这行代码时，它做了：
+处理语音转录的专用类。
+ASR (语音转文字): asr_engine (见 core/asr_engine.py)
+这是本地模型。funasr这个库非常强大。加载时它做了：
 加载模型文件: 它会去你指定的config.ASR_MODEL_DIR目录下，找到所有巨大的模型文件（通常几百MB甚至更大）。
-构建神经网络: 它在内存（或GPU显存，因为你设置了device="cuda:0"）中构建起一个复杂的深度学习模型结构。
+构建神经网络: 它在内存（或GPU显存，有显卡时自动选择 "cuda:0"）中构建起一个复杂的深度学习模型结构。
 初始化组件: 它还加载了辅助模型，比如用于断句的VAD模型(fsmn-vad)。
-所以，这行代码的背后是大量的本地计算和资源加载。一旦加载完成，asr_model就是一个功能完备的本地语音识别引擎，
-调用它的.generate()方法就可以直接处理音频文件，完全不需要网络。
+这些加载工作在界面显示后于后台完成，本类只需等待引擎的就绪信号，
+然后把录到的PCM交给它识别，完全不需要网络。
+默认 (config.ASR_OUT_OF_PROCESS) 模型运行在独立的子进程中 (core/asr_server.py)，
+避免推理与界面、摄像头循环争抢GIL。
     """
 
     def __init__(self, app):
         self.app = app
+        self.engine = asr_server if config.ASR_OUT_OF_PROCESS else asr_engine
+
+    def start(self):
+        """[主线程调用] 在后台启动ASR引擎（加载模型或启动推理子进程）。"""
+        self.engine.load_async()
+
+    def stop(self):
+        self.engine.stop()
 
-    def transcribe(self, audio_file: str, high_priority: bool):
-        """将指定的音频文件发送给ASR模型进行转录。"""
-        if not asr_model:
+    def transcribe(self, pcm: bytes, high_priority: bool):
+        """将一段16位PCM语音发送给ASR引擎进行转录。"""
+        if not self.engine.ready.is_set():
+            self.app.update_status("语音识别模型加载中，请稍候...")
+        if not self.engine.wait_ready(timeout=config.ASR_READY_TIMEOUT_SECONDS):
             self.app.update_status("错误: ASR模型未加载")
-            if os.path.exists(audio_file): os.remove(audio_file)
             return
         
         self.app.update_status("正在转录语音...")
         try:
-            if not os.path.exists(audio_file) or os.path.getsize(audio_file) == 0:
-                raise FileNotFoundError(f"音频文件无效: {audio_file}")
+            if not pcm:
+                raise ValueError("语音数据为空")
                 
-            res = asr_model.generate(input=audio_file, cache={})
+            raw_text = self.engine.transcribe_pcm(pcm)
             
-            if res and "text" in res[0]:
-                raw_text = res[0]["text"]
+            if raw_text:
                 extracted_text = extract_language_emotion_content(raw_text)
                 
                 if extracted_text and len(extracted_text.strip()) > 1:
@@ -408,11 +482,4 @@ ASR (语音转文字): asr_model = AutoModel(...)
 
         except Exception as e:
             print(f"转录时发生错误: {e}")
-            self.app.update_status("转录失败")
-        finally:
-            # 确保临时文件被删除
-            if os.path.exists(audio_file) and audio_file.startswith("speech_"):
-                try:
-                    os.remove(audio_file)
-                except Exception as e:
-                    print(f"删除临时语音文件时出错: {e}")
\ No newline at end of file
+            self.app.update_status("转录失败")
\ No newline at end of file
@@ -0,0 +1,110 @@
+# ai_assistant/core/coalescer.py
+
+import re
+import time
+
+from ai_assistant.utils import config
+from ai_assistant.utils.metrics import CounterGroup
+
+
+# 以这些标点结尾的片段通常是一句完整的话，可以用较短的合并窗口
+_COMPLETE_END_RE = re.compile(r'[。！？!?…~～]$')
+
+
+def coalesce_window_ms(text: str) -> int:
+    """
+    根据片段的内容决定要再等多久：
+    看起来说完了（句末标点）就只等一小会儿，说到一半（逗号结尾、没有标点或片段很短）就多等一会儿。
+    """
+    text = text.strip()
+    if _COMPLETE_END_RE.search(text) and len(text) >= config.VOICE_COALESCE_SHORT_FRAGMENT_CHARS:
+        return config.VOICE_COALESCE_MIN_WINDOW_MS
+    return config.VOICE_COALESCE_MAX_WINDOW_MS
+
+
+def merge_fragments(fragments: list) -> str:
+    """把多个语音片段拼成一句话；前一段没有标点结尾时补一个逗号。"""
+    merged = ""
+    for fragment in fragments:
+        fragment = fragment.strip()
+        if merged and not re.search(r'[，,。！？!?、；;…~～]$', merged):
+            merged += "，"
+        merged += fragment
+    return merged
+
+
+class UtteranceCoalescer:
+    """
+    语音片段合并器。说话时的停顿会让VAD把一个问题切成两三段，
+    如果每段都单独发给DeepSeek，不仅多花请求，后面的回答还会打断前面的回答。
+    - 每个片段到达后先等待一个自适应的合并窗口，窗口内到达的后续片段合并成同一轮；
+    - 窗口结束后才真正提交 voice_input 任务；
+    - 如果提交后、回答完成前又来了新片段，就取消正在进行的请求，把合并后的完整文本重新提交。
+    所有状态只在Tk主线程中修改（转录线程通过 app.after 转交）。
+    """
+
+    def __init__(self, app, dispatch, cancel):
+        """
+        Args:
+            app: 主应用实例，用于 after/after_cancel 定时。
+            dispatch: 函数 (text, priority) -> Job，提交一轮语音提问。
+            cancel: 函数 (job, reason)，取消一个已提交的任务。
+        """
+        self.app = app
+        self.dispatch = dispatch
+        self.cancel = cancel
+        self.fragments = []
+        self.priority = 1
+        self.timer_id = None
+        self.job = None
+        self.last_fragment_at = 0.0
+        self.counts = CounterGroup()
+
+    def add_fragment(self, text: str, priority: int):
+        """[任意线程] 收到一个转录片段。"""
+        self.app.after(0, self._on_fragment, text, priority)
+
+    def _on_fragment(self, text: str, priority: int):
+        """[主线程] 合并片段并（重新）开始计时。"""
+        now = time.time()
+        self.counts.incr("fragments")
+
+        if self.timer_id is not None:
+            # 还在合并窗口内：直接并入当前这一轮
+            self.app.after_cancel(self.timer_id)
+            self.timer_id = None
+            self.counts.incr("merged")
+        elif self._job_still_running() and now - self.last_fragment_at <= config.VOICE_COALESCE_RESUBMIT_SECONDS:
+            # 上一轮已经提交但还没答完：取消它，稍后带着合并后的文本重新提交
+            print(f"收到后续语音片段，取消进行中的回答 #{self.job.id} 并合并重新提交。")
+            self.cancel(self.job, "合并后续语音片段")
+            self.job = None
+            self.counts.incr("resubmitted")
+        else:
+            # 全新的一轮
+            self.fragments = []
+            self.job = None
+
+        self.fragments.append(text)
+        self.priority = min(priority, self.priority) if len(self.fragments) > 1 else priority
+        self.last_fragment_at = now
+        self.timer_id = self.app.after(coalesce_window_ms(text), self._flush)
+
+    def _job_still_running(self) -> bool:
+        return self.job is not None and not self.job.cancelled and not self.job.finished.is_set()
+
+    def _flush(self):
+        """[主线程] 合并窗口结束，提交这一轮的完整文本。"""
+        self.timer_id = None
+        if not self.fragments:
+            return
+        self.job = self.dispatch(merge_fragments(self.fragments), self.priority)
+        self.counts.incr("dispatched")
+
+    def stop(self):
+        if self.timer_id is not None:
+            self.app.after_cancel(self.timer_id)
+            self.timer_id = None
+
+    def get_stats(self) -> dict:
+        return self.counts.snapshot()
@@ -0,0 +1,183 @@
+# ai_assistant/core/conversation.py
+
+import re
+import threading
+
+from ai_assistant.core.api_clients import async_deepseek_client
+from ai_assistant.core.async_runtime import runtime
+from ai_assistant.core.http_transport import call_with_retry
+from ai_assistant.core.governor import governor
+from ai_assistant.utils import config
+from ai_assistant.utils.metrics import RollingStats, llm_usage
+
+
+_CJK_RE = re.compile(r'[　-〿㐀-鿿＀-￯]')
+
+# 每条消息的格式开销（角色标记等）的近似token数
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    本地估算文本的token数，无需调用任何API。
+    按DeepSeek官方给出的经验比例：1个中文字符约0.6个token，1个英文字符约0.3个token。
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    other = len(text) - cjk
+    return int(cjk * 0.6 + other * 0.3) + 1
+
+
+def estimate_message_tokens(messages: list) -> int:
+    return sum(estimate_tokens(m["content"]) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+
+class ConversationContext:
+    """
+    按token预算管理的对话上下文。
+    - 每次请求前按预算从最新的消息往回保留，超出预算的旧消息被移出；
+    - 被移出的消息不会直接丢弃，而是在异步运行时中折叠进一段简短的“前情摘要”，
+      摘要以系统消息的形式放在系统提示词之后，因此不会占用请求的关键路径；
+    - 记录每次请求的prompt token估算值。
+    所有读写都通过内部锁串行化，可以被多个后台线程安全调用。
+
+    为了提高DeepSeek上下文缓存的命中率，消息布局保持“前缀稳定”：
+    系统提示词、摘要和较早的消息在多次请求之间逐字节不变，只在末尾追加新内容。
+    超出预算时一次性移出到预算的一定比例 (CONTEXT_EVICT_TARGET_RATIO) 以下，
+    而不是每次只挤掉一条，这样前缀只在偶尔的移出时才变化。
+    观察记录等易变的背景信息只拼接在本次请求的最后一条消息中，不写入历史。
+    """
+
+    def __init__(self, system_message: dict, token_budget: int = None):
+        self.system_message = system_message
+        self.token_budget = token_budget or config.CONTEXT_TOKEN_BUDGET
+        self.turns = []          # 尚在窗口内的 user/assistant 消息
+        self.summary = ""        # 已移出消息的滚动摘要
+        self._evicted = []       # 等待折叠进摘要的消息
+        self._summarizing = False
+        self.lock = threading.RLock()
+        self.prompt_token_stats = RollingStats()
+
+    def append(self, role: str, content: str):
+        with self.lock:
+            self.turns.append({"role": role, "content": content})
+
+    def commit_turn(self, user_content: str, assistant_content: str):
+        """
+        在一次请求成功完成后，原子地写入这一轮的用户消息与助手回复。
+        多个通道并发请求时，每一轮的两条消息总是相邻，被取消的请求则什么也不写入。
+        """
+        with self.lock:
+            self.turns.append({"role": "user", "content": user_content})
+            self.turns.append({"role": "assistant", "content": assistant_content})
+
+    def _summary_message(self):
+        if not self.summary:
+            return None
+        return {"role": "system", "content": f"以下是你和溢涛更早之前对话的摘要，供参考：\n{self.summary}"}
+
+    def _head_and_cut(self, request_message: dict) -> tuple:
+        """
+        [持有锁时调用] 返回 (系统提示词+摘要, 需要移出的历史消息条数)。
+        超出预算时一次性移出到目标比例以下，之后多轮请求的前缀都保持不变。
+        """
+        head = [self.system_message]
+        summary_msg = self._summary_message()
+        if summary_msg:
+            head.append(summary_msg)
+        available = (self.token_budget - estimate_message_tokens(head)
+                     - estimate_message_tokens([request_message]))
+        total = estimate_message_tokens(self.turns)
+        cut = 0
+        if total > available and self.turns:
+            target = available * config.CONTEXT_EVICT_TARGET_RATIO
+            while cut < len(self.turns) and (total > target or self.turns[cut]["role"] != "user"):
+                total -= estimate_tokens(self.turns[cut]["content"]) + MESSAGE_OVERHEAD_TOKENS
+                cut += 1
+        return head, cut
+
+    def build_messages(self, user_content: str, request_content: str = None) -> list:
+        """
+        组装本次请求的消息列表（历史 + 本轮用户消息），保证估算的token数不超过预算。
+        超出预算的旧消息会被移出并排队等待后台摘要。本方法不修改历史中的本轮消息，
+        请求成功后由调用方通过 commit_turn() 写入。
+
+        Args:
+            user_content (str): 本轮要保存到历史中的用户消息。
+            request_content (str): 可选。仅用于本次请求的用户消息内容，
+                通常是“用户原话 + 易变的观察背景”，历史中仍只保存 user_content。
+        """
+        request_message = {"role": "user", "content": request_content or user_content}
+        with self.lock:
+            head, cut = self._head_and_cut(request_message)
+            if cut:
+                self._evicted.extend(self.turns[:cut])
+                self.turns = self.turns[cut:]
+                self._schedule_summary()
+
+            messages = head + self.turns + [request_message]
+            prompt_tokens = estimate_message_tokens(messages)
+        self.prompt_token_stats.add(prompt_tokens)
+        print(f"本次请求prompt约 {prompt_tokens} tokens (预算 {self.token_budget}，历史消息 {len(messages) - len(head) - 1} 条)。")
+        return messages
+
+    def peek_messages(self, user_content: str) -> list:
+        """
+        只读地组装消息列表，布局与 build_messages() 相同（因此同样能命中上下文缓存），
+        但不移出历史、不触发摘要、不计入prompt统计。用于不一定会用到的请求，例如预生成回复。
+        """
+        request_message = {"role": "user", "content": user_content}
+        with self.lock:
+            head, cut = self._head_and_cut(request_message)
+            return head + self.turns[cut:] + [request_message]
+
+    def _schedule_summary(self):
+        """[持有锁时调用] 如有待折叠的消息且当前没有摘要任务，则在事件循环上启动摘要协程。"""
+        if self._summarizing or not self._evicted:
+            return
+        self._summarizing = True
+        runtime.submit(self._summarize_evicted())
+
+    async def _summarize_evicted(self):
+        """[事件循环] 把被移出的消息与旧摘要合并成新的简短摘要。"""
+        with self.lock:
+            batch, self._evicted = self._evicted, []
+            previous = self.summary
+        transcript = "\n".join(
+            f"{'溢涛' if m['role'] == 'user' else '婉晴'}: {m['content']}" for m in batch
+        )
+        prompt = (
+            f"请把下面的“已有摘要”和“新增对话”合并成一段新的摘要，不超过{config.CONTEXT_SUMMARY_MAX_CHARS}字。"
+            "保留溢涛提到的事实、情绪变化和未完成的话题，省略寒暄和重复内容，只输出摘要本身。\n\n"
+            f"已有摘要：\n{previous or '（无）'}\n\n新增对话：\n{transcript}"
+        )
+        succeeded = False
+        try:
+            # 摘要是后台任务，优先级最低；被限流时保留待折叠的消息，下次移出时再试
+            if not governor.admit("deepseek", priority=3, cost=estimate_tokens(prompt)):
+                with self.lock:
+                    self._evicted = batch + self._evicted
+                return
+            response = await call_with_retry("deepseek", lambda: async_deepseek_client.chat.completions.create(
+                model="deepseek-chat",
+                messages=[{"role": "user", "content": prompt}],
+                stream=False
+            ))
+            if response.usage:
+                llm_usage.record(response.usage)
+                governor.record("deepseek", response.usage.total_tokens)
+            new_summary = response.choices[0].message.content.strip()
+            with self.lock:
+                self.summary = new_summary
+            succeeded = True
+        except Exception as e:
+            print(f"生成对话摘要时出错，被移出的消息将在下次移出时重试: {e}")
+            with self.lock:
+                self._evicted = batch + self._evicted
+        finally:
+            with self.lock:
+                self._summarizing = False
+                # 摘要期间又有新的消息被移出，继续处理；失败时等下次移出再重试
+                if succeeded:
+                    self._schedule_summary()
@@ -0,0 +1,131 @@
+# ai_assistant/core/daily_summary.py
+
+import asyncio
+from concurrent.futures import CancelledError
+from datetime import datetime, timedelta
+
+from ai_assistant.core.api_clients import async_deepseek_client
+from ai_assistant.core.async_runtime import runtime
+from ai_assistant.core.conversation import estimate_tokens
+from ai_assistant.core.governor import governor, ThrottledError
+from ai_assistant.core.http_transport import call_with_retry
+from ai_assistant.core.observation_store import observation_store
+from ai_assistant.core.retrieval import memory_index
+from ai_assistant.core.rollups import rollup_engine, bucket_key, format_rollup
+from ai_assistant.core.scheduler import JobCancelled
+from ai_assistant.utils import config
+from ai_assistant.utils.metrics import llm_usage
+
+
+def compact_observations(observations: list) -> str:
+    """
+    把一小时内的观察压缩成几行：连续相同的 (行为, 情绪) 合并为一个时间段，
+    例如 "- 10:05-10:40 认真专注工作，平静（共60次）"。一小时通常只剩几行。
+    """
+    lines = []
+    run_start = run_end = None
+    run_key, run_count = None, 0
+    for obs in observations + [None]:
+        key = (obs["behavior_desc"], obs["emotion"]) if obs else None
+        if key != run_key and run_key is not None:
+            span = run_start.strftime('%H:%M')
+            if run_end != run_start:
+                span += f"-{run_end.strftime('%H:%M')}"
+            lines.append(f"- {span} {run_key[0]}，{run_key[1]}（共{run_count}次）")
+            run_count = 0
+        if obs is None:
+            break
+        if key != run_key:
+            run_start, run_key = obs["timestamp"], key
+        run_end = obs["timestamp"]
+        run_count += 1
+    return "\n".join(lines)
+
+
+class DailySummarizer:
+    """
+    分层（map-reduce）生成每日总结，覆盖一整天的观察，而不只是最后100条：
+    - map：按小时切分，每小时用“该小时的预聚合统计 + 压缩后的观察时间段”请求一段简短的小时摘要，
+      多个小时并发请求；
+    - reduce：把全天统计和各小时摘要交给调用方，合成最终的每日总结。
+    小时摘要缓存在数据库中，并记录生成时该小时的观察数；重新生成或晚些时候再生成时，
+    只有新的小时（或有新观察的当前小时）才会重新请求。
+    """
+
+    def __init__(self, store=None, rollups=None):
+        self.store = store or observation_store
+        self.rollups = rollups or rollup_engine
+
+    def summarize_hours(self, day: datetime = None, job=None) -> list:
+        """
+        [调度通道线程] 返回当天各小时的摘要 [(“HH:00”, 摘要), ...]。
+        传入 job 时，任务被取消会中止所有进行中的请求并抛出 JobCancelled。
+        """
+        future = runtime.submit(self._summarize_hours_async(day or datetime.now()))
+        if job is not None:
+            job.add_cancel_callback(future.cancel)
+        try:
+            return future.result()
+        except CancelledError:
+            raise JobCancelled(job.cancel_reason if job else "cancelled")
+
+    async def _summarize_hours_async(self, day: datetime) -> list:
+        midnight = day.replace(hour=0, minute=0, second=0, microsecond=0)
+        hour_stats = await asyncio.to_thread(self.rollups.range, "hour", midnight, midnight + timedelta(hours=23))
+        cached = await asyncio.to_thread(
+            self.store.load_summary_chunks, bucket_key("hour", midnight), bucket_key("hour", midnight + timedelta(hours=23))
+        )
+
+        limiter = asyncio.Semaphore(config.DAILY_SUMMARY_MAX_CONCURRENCY)
+        tasks = []
+        for bucket, stats in hour_stats.items():
+            if not stats["count"]:
+                continue
+            hit = cached.get(bucket)
+            if hit and hit[0] == stats["count"]:
+                tasks.append(self._cached(bucket, hit[1]))
+            else:
+                tasks.append(self._summarize_hour(bucket, stats, limiter))
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+
+        summaries = []
+        for result in results:
+            if isinstance(result, Exception):
+                print(f"生成小时摘要时出错，该小时将被跳过: {result}")
+            elif result:
+                summaries.append(result)
+        return sorted(summaries)
+
+    async def _cached(self, bucket: str, summary: str):
+        return (f"{bucket[-2:]}:00", summary)
+
+    async def _summarize_hour(self, bucket: str, stats: dict, limiter: asyncio.Semaphore):
+        """[事件循环] map 步骤：为一个小时生成摘要并写入缓存。"""
+        hour_start = datetime.strptime(bucket, "%Y-%m-%d %H")
+        observations = await asyncio.to_thread(self.store.query, hour_start, hour_start + timedelta(hours=1))
+        prompt = (
+            f"下面是溢涛在 {hour_start.strftime('%H:00')}-{hour_start.strftime('%H:59')} 这一小时的行为观察。"
+            f"请用不超过{config.DAILY_SUMMARY_CHUNK_MAX_CHARS}字客观概括这一小时：他主要在做什么、状态和情绪如何、有没有明显的变化。"
+            "只输出概括本身。\n\n"
+            f"统计：\n{format_rollup(stats)}\n\n"
+            f"时间段：\n{compact_observations(observations)}"
+        )
+        async with limiter:
+            if not governor.admit("deepseek", config.DAILY_SUMMARY_CHUNK_PRIORITY, cost=estimate_tokens(prompt)):
+                raise ThrottledError("小时摘要请求被限流")
+            response = await call_with_retry("deepseek", lambda: async_deepseek_client.chat.completions.create(
+                model="deepseek-chat",
+                messages=[{"role": "user", "content": prompt}],
+                stream=False
+            ))
+        if response.usage:
+            llm_usage.record(response.usage)
+            governor.record("deepseek", response.usage.total_tokens)
+        summary = response.choices[0].message.content.strip()
+        await asyncio.to_thread(self.store.save_summary_chunk, bucket, stats["count"], summary)
+        memory_index.add_hour_summary(hour_start, summary)
+        return (hour_start.strftime('%H:00'), summary)
+
+
+# 进程级单例
+daily_summarizer = DailySummarizer()
@@ -0,0 +1,135 @@
+# ai_assistant/core/governor.py
+
+import threading
+import time
+from datetime import date
+
+from ai_assistant.utils import config
+from ai_assistant.utils.metrics import CounterGroup
+
+
+class ThrottledError(Exception):
+    """请求被限流器拒绝时抛出。调用方应降级处理（跳过、稍后再试），而不是当作故障。"""
+    pass
+
+
+class TokenBucket:
+    """令牌桶：以固定速率补充令牌，最多积攒 burst 个，用来限制每分钟的请求次数。"""
+
+    def __init__(self, rate_per_minute: float, burst: int):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_take(self, floor: float = 0.0) -> bool:
+        """取走一个令牌；取走后剩余令牌不能低于 floor（为高优先级请求预留）。"""
+        self._refill()
+        if self.tokens - 1 < floor:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class ServiceGovernor:
+    """
+    单个云端服务的准入控制：每分钟请求速率 + 每日用量预算（token数或字符数）。
+    令牌桶和每日预算都有一部分 (GOVERNOR_RESERVE_RATIO) 只留给高优先级请求，
+    因此图像分析被限流时，用户的语音提问和关怀消息仍然可以通过。
+    """
+
+    def __init__(self, name: str, rate_per_minute: float, burst: int, daily_budget: int, unit: str):
+        self.name = name
+        self.unit = unit
+        self.daily_budget = daily_budget
+        self.bucket = TokenBucket(rate_per_minute, burst)
+        self.day = date.today()
+        self.spent_today = 0
+        self.counts = CounterGroup()
+        self._lock = threading.Lock()
+
+    def _roll_day(self):
+        today = date.today()
+        if today != self.day:
+            self.day = today
+            self.spent_today = 0
+
+    def admit(self, priority: int, cost: int = 0) -> bool:
+        """
+        判断一个请求能否发出。
+
+        Args:
+            priority (int): 请求优先级，数值越小越重要（与消息调度的约定一致）。
+            cost (int): 预估用量（token数或字符数），用于检查每日预算。
+        """
+        reserved = priority <= config.GOVERNOR_RESERVED_PRIORITY
+        reserve_ratio = 0.0 if reserved else config.GOVERNOR_RESERVE_RATIO
+        with self._lock:
+            self._roll_day()
+            budget = self.daily_budget * (1 - reserve_ratio)
+            if self.spent_today + cost > budget:
+                self.counts.incr("rejected_budget")
+                return False
+            if not self.bucket.try_take(floor=self.bucket.capacity * reserve_ratio):
+                self.counts.incr("rejected_rate")
+                return False
+        self.counts.incr("admitted")
+        return True
+
+    def record(self, amount: int):
+        """记录一次请求的实际用量。"""
+        if not amount:
+            return
+        with self._lock:
+            self._roll_day()
+            self.spent_today += amount
+        self.counts.incr(f"spent_{self.unit}", amount)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            self._roll_day()
+            data = {"spent_today": self.spent_today, "daily_budget": self.daily_budget, "unit": self.unit}
+        data.update(self.counts.snapshot())
+        return data
+
+
+class CostGovernor:
+    """
+    所有云端服务共用的限流与费用控制器。各调用点在请求前调用 admit()，
+    拿到响应后调用 record() 上报实际用量；被拒绝时抛出或返回 ThrottledError 由调用方降级。
+    """
+
+    def __init__(self, limits: dict = None):
+        limits = limits or config.GOVERNOR_LIMITS
+        self.services = {name: ServiceGovernor(name, **spec) for name, spec in limits.items()}
+
+    def admit(self, service: str, priority: int, cost: int = 0) -> bool:
+        governor = self.services.get(service)
+        if governor is None:
+            return True
+        admitted = governor.admit(priority, cost)
+        if not admitted:
+            print(f"[{service}] 请求被限流 (优先级 {priority})，本次降级跳过。")
+        return admitted
+
+    def require(self, service: str, priority: int, cost: int = 0):
+        """与 admit() 相同，但被拒绝时抛出 ThrottledError。"""
+        if not self.admit(service, priority, cost):
+            raise ThrottledError(f"{service} 请求被限流")
+
+    def record(self, service: str, amount: int):
+        governor = self.services.get(service)
+        if governor is not None:
+            governor.record(amount)
+
+    def snapshot(self) -> dict:
+        return {name: g.snapshot() for name, g in self.services.items()}
+
+
+# 进程级单例：webcam_handler、multimedia_assistant、audio_processing 共用
+governor = CostGovernor()
@@ -0,0 +1,279 @@
+# ai_assistant/core/http_transport.py
+
+import asyncio
+import random
+import threading
+import time
+
+import httpx
+import openai
+
+from ai_assistant.core.governor import governor
+from ai_assistant.utils import config
+from ai_assistant.utils.metrics import CounterGroup, RollingStats
+
+
+def _http2_available() -> bool:
+    """HTTP/2 需要可选依赖 h2 (pip install "httpx[http2]")，未安装时自动退回 HTTP/1.1。"""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def endpoint_timeouts(endpoint: str) -> dict:
+    """返回某个端点的超时配置（秒），未单独配置的项使用默认值。"""
+    timeouts = dict(config.HTTP_TIMEOUTS["default"])
+    timeouts.update(config.HTTP_TIMEOUTS.get(endpoint, {}))
+    return timeouts
+
+
+def build_async_http_client(endpoint: str) -> httpx.AsyncClient:
+    """
+    为某个云端服务创建一个复用连接的 httpx.AsyncClient：
+    - 连接池与 keep-alive，避免每次请求都重新做TCP/TLS握手；
+    - 可选 HTTP/2（同一连接上多路复用并发请求）；
+    - 按端点设置的 connect/read/write/pool 超时，卡住的请求不会无限期阻塞分析流程。
+    """
+    t = endpoint_timeouts(endpoint)
+    http2 = config.HTTP2_ENABLED and _http2_available()
+    return httpx.AsyncClient(
+        http2=http2,
+        timeout=httpx.Timeout(connect=t["connect"], read=t["read"], write=t["write"], pool=t["pool"]),
+        limits=httpx.Limits(
+            max_connections=config.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=config.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=config.HTTP_KEEPALIVE_EXPIRY_SECONDS,
+        ),
+        # 代理环境变量已在 api_clients 中清除，这里再显式关闭一次
+        trust_env=False,
+    )
+
+
+class CircuitOpenError(Exception):
+    """端点的熔断器处于打开状态时抛出，调用方应直接走失败分支而不是等待超时。"""
+    pass
+
+
+class CircuitBreaker:
+    """
+    简单的三态熔断器：
+    - closed：正常放行，连续失败达到阈值后转为 open；
+    - open：直接拒绝请求，冷却时间过后转为 half_open；
+    - half_open：只放行一个试探请求，成功则恢复 closed，失败则重新 open。
+    """
+
+    def __init__(self, name: str, failure_threshold: int = None, reset_timeout: float = None):
+        self.name = name
+        self.failure_threshold = failure_threshold or config.CIRCUIT_FAILURE_THRESHOLD
+        self.reset_timeout = reset_timeout or config.CIRCUIT_RESET_SECONDS
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open":
+                if time.time() - self.opened_at < self.reset_timeout:
+                    return False
+                self.state = "half_open"
+                self._probing = False
+            # half_open：只放行一个试探请求
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self.state != "closed":
+                print(f"[{self.name}] 熔断器恢复，端点已可用。")
+            self.state = "closed"
+            self.failures = 0
+            self._probing = False
+
+    def release_probe(self):
+        """试探请求被取消或因调用方错误（4xx）失败时调用：不改变熔断状态，只让出试探名额。"""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    print(f"[{self.name}] 连续失败 {self.failures} 次，熔断 {self.reset_timeout:.0f} 秒。")
+                self.state = "open"
+                self.opened_at = time.time()
+
+
+# 每个端点一个熔断器
+breakers = {name: CircuitBreaker(name) for name in ("deepseek", "qwen", "oss", "tts")}
+transport_stats = CounterGroup()
+
+
+def is_retryable(exc: Exception) -> bool:
+    """网络错误、超时、限流和5xx可以重试；参数错误、鉴权失败等4xx重试也没有意义。"""
+    if isinstance(exc, (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError)):
+        return True  # APITimeoutError 是 APIConnectionError 的子类
+    if isinstance(exc, (httpx.TransportError, asyncio.TimeoutError, ConnectionError)):
+        return True
+    status = getattr(exc, "status", None)  # oss2.exceptions.OssError
+    if isinstance(status, int) and (status >= 500 or status < 0):
+        return True  # oss2 的网络层错误 (RequestError) 状态码为 -2
+    return False
+
+
+def backoff_delay(attempt: int) -> float:
+    """带满抖动 (full jitter) 的指数退避：在 [0, min(上限, 基数 * 2^attempt)] 中随机取值。"""
+    cap = min(config.HTTP_RETRY_MAX_DELAY_SECONDS, config.HTTP_RETRY_BASE_DELAY_SECONDS * (2 ** attempt))
+    return random.uniform(0, cap)
+
+
+async def call_with_retry(endpoint: str, make_call, idempotent: bool = True):
+    """
+    [事件循环] 通过熔断器和重试策略执行一次云端调用。
+
+    Args:
+        endpoint (str): 端点名（deepseek/qwen/oss/tts），决定使用哪个熔断器。
+        make_call: 无参函数，每次调用返回一个新的协程（重试时需要重新发起请求）。
+        idempotent (bool): 只有幂等的调用才会重试；非幂等调用失败一次即抛出。
+    """
+    breaker = breakers[endpoint]
+    attempts = 1 + (config.HTTP_MAX_RETRIES if idempotent else 0)
+    for attempt in range(attempts):
+        if not breaker.allow():
+            transport_stats.incr(f"{endpoint}.rejected")
+            raise CircuitOpenError(f"{endpoint} 端点暂不可用（熔断中）")
+        try:
+            result = await make_call()
+        except asyncio.CancelledError:
+            # 被抢占或对冲取消的请求不代表端点的好坏，但必须让出半开状态的试探名额
+            breaker.release_probe()
+            raise
+        except Exception as e:
+            retryable = is_retryable(e)
+            # 只有端点本身的故障才计入熔断；4xx 之类的调用方错误不影响端点状态
+            if retryable:
+                breaker.record_failure()
+            else:
+                breaker.release_probe()
+            if not retryable or attempt == attempts - 1:
+                transport_stats.incr(f"{endpoint}.failed")
+                raise
+            delay = backoff_delay(attempt)
+            transport_stats.incr(f"{endpoint}.retried")
+            print(f"[{endpoint}] 请求失败 ({type(e).__name__}: {e})，{delay:.2f} 秒后第 {attempt + 1} 次重试。")
+            await asyncio.sleep(delay)
+        else:
+            breaker.record_success()
+            return result
+
+
+class HedgedRequester:
+    """
+    对冲请求 (request hedging)：如果请求在“历史延迟的第N分位数”内还没有返回，
+    就再发一个相同的请求，谁先成功就用谁，另一个立即取消。
+    - 对冲只在样本足够多之后才启用，且对冲比例不超过 max_ratio，额外开销有上限；
+    - 只适用于幂等且无副作用的调用（例如图像分析）；
+    - 指定 service 时，对冲请求同样要经过费用控制器 (governor) 准入，被取消的一方按预估用量计费。
+    """
+
+    def __init__(self, name: str, percentile: float = None, max_ratio: float = None,
+                 min_samples: int = None, min_delay: float = None):
+        self.name = name
+        self.percentile = percentile or config.VL_HEDGE_PERCENTILE
+        self.max_ratio = config.VL_HEDGE_MAX_RATIO if max_ratio is None else max_ratio
+        self.min_samples = min_samples or config.VL_HEDGE_MIN_SAMPLES
+        self.min_delay = config.VL_HEDGE_MIN_DELAY_SECONDS if min_delay is None else min_delay
+        self.latency_stats = RollingStats()  # 主请求的耗时（被取消时记为取消时已等待的时间）
+        self.counts = CounterGroup()
+
+    def hedge_delay(self):
+        """返回触发对冲的等待时间（秒）；样本不足时返回 None，表示不对冲。"""
+        if self.latency_stats.count < self.min_samples:
+            return None
+        return max(self.min_delay, self.latency_stats.percentile(self.percentile))
+
+    def _take_budget(self) -> bool:
+        requests = self.counts.get("requests")
+        hedged = self.counts.get("hedged")
+        return hedged + 1 <= requests * self.max_ratio
+
+    async def run(self, make_call, service: str = None, priority: int = 2, cost: int = 0):
+        """
+        [事件循环] 执行一次可能被对冲的调用。
+
+        Args:
+            make_call: 无参函数，每次调用返回一个新的协程。
+            service (str): 可选。费用控制器中的服务名；对冲请求发出前需要准入。
+                胜出一方的实际用量由调用方记录，被取消的一方在这里按 cost 记入用量。
+            priority (int): 对冲请求的准入优先级。
+            cost (int): 单次请求的预估用量。
+        """
+        self.counts.incr("requests")
+        started = {}
+
+        def launch(label):
+            task = asyncio.ensure_future(make_call())
+            started[task] = (label, time.perf_counter())
+            return task
+
+        primary = launch("primary")
+        primary.add_done_callback(lambda task: self._record_primary(task, started[task][1]))
+        try:
+            delay = self.hedge_delay()
+            if delay is not None:
+                done, _ = await asyncio.wait({primary}, timeout=delay)
+                if not done and self._take_budget() and (
+                        service is None or governor.admit(service, priority, cost)):
+                    self.counts.incr("hedged")
+                    print(f"[{self.name}] 请求超过 {delay:.1f} 秒未返回，发出对冲请求。")
+                    launch("hedge")
+
+            pending = set(started)
+            first_error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        first_error = first_error or task.exception()
+                        continue
+                    label, _ = started[task]
+                    if len(started) > 1:
+                        self.counts.incr(f"{label}_won")
+                    return task.result()
+            raise first_error
+        finally:
+            for task in started:
+                if not task.done():
+                    task.cancel()
+                    # 被取消的请求服务端可能已经开始处理，按预估用量计入
+                    if service is not None:
+                        governor.record(service, cost)
+
+    def _record_primary(self, task, t0: float):
+        """
+        记录主请求的耗时，不论它成功、失败还是输给对冲请求被取消。
+        只记录赢家会漏掉慢的主请求，分位数随之越来越低、对冲越来越频繁；
+        被取消的主请求记为取消时已等待的时间（真实耗时只会更长）。
+        """
+        self.latency_stats.add(time.perf_counter() - t0)
+        if task.cancelled():
+            self.counts.incr("primary_censored")
+
+    def get_stats(self) -> dict:
+        counts = self.counts.snapshot()
+        hedged = counts.get("hedged", 0)
+        return {
+            "counts": counts,
+            "hedge_ratio": hedged / counts["requests"] if counts.get("requests") else None,
+            "hedge_win_rate": counts.get("hedge_won", 0) / hedged if hedged else None,
+            "latency": self.latency_stats.snapshot(),
+        }
@@ -0,0 +1,270 @@
+# ai_assistant/core/log_writer.py
+
+import glob
+import gzip
+import logging
+import os
+import queue
+import shutil
+import threading
+import time
+from datetime import datetime, timedelta
+
+from ai_assistant.utils import config
+from ai_assistant.utils.metrics import CounterGroup
+
+
+def _compress(path: str, archive_dir: str) -> str:
+    """把一个日志文件压缩为 archive_dir 下的 .gz 文件，成功后删除原文件。"""
+    os.makedirs(archive_dir, exist_ok=True)
+    target = os.path.join(archive_dir, os.path.basename(path) + ".gz")
+    with open(path, 'rb') as src, gzip.open(target, 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(path)
+    return target
+
+
+def purge_archives(archive_dir: str, retention_days: int):
+    """删除超过保留天数的归档文件，使磁盘占用有上限。"""
+    if not retention_days or not os.path.isdir(archive_dir):
+        return
+    cutoff = time.time() - retention_days * 86400
+    for path in glob.glob(os.path.join(archive_dir, "*.gz")):
+        if os.path.getmtime(path) < cutoff:
+            os.remove(path)
+
+
+def legacy_archive_dir() -> str:
+    """旧版日志的归档目录。它是 archive/ 的子目录，不参与按保留天数的清理。"""
+    return os.path.join(config.LOG_DIR, "archive", "legacy")
+
+
+def archive_legacy_logs(directory: str = ".", archive_dir: str = None, store=None) -> int:
+    """
+    处理旧版遗留的日志：每日的 observation_log_<日期>.jsonl（观察记录现在写入SQLite），
+    以及不分天、一直增长的 behavior_log.txt。这些文件之后都不会再被写入。
+    JSONL 先导入观察记录数据库并为涉及的日期重建统计（今天的由运行中的统计引擎重放），导入成功后才压缩；导入失败的文件原样保留，下次启动再试。
+    压缩后的文件放在 legacy 目录，不会被 purge_archives 删除。返回压缩的文件数。
+    """
+    archive_dir = archive_dir or legacy_archive_dir()
+    jsonl = sorted(glob.glob(os.path.join(directory, "observation_log_*.jsonl")))
+    legacy = []
+    if jsonl:
+        imported = _import_legacy_observations(jsonl, store)
+        legacy += imported
+        skipped = len(jsonl) - len(imported)
+        if skipped:
+            print(f"有 {skipped} 个旧版观察日志未能导入数据库，已保留原文件。")
+    if os.path.exists(os.path.join(directory, config.LOG_FILE)):
+        legacy.append(os.path.join(directory, config.LOG_FILE))
+    count = 0
+    for path in legacy:
+        try:
+            _compress(path, archive_dir)
+            count += 1
+        except OSError as e:
+            print(f"压缩旧日志 {path} 时出错: {e}")
+    return count
+
+
+def _import_legacy_observations(paths: list, store=None) -> list:
+    """把旧版JSONL导入数据库，返回导入成功的文件；导入了新记录时重建这些日期的统计。"""
+    from ai_assistant.core.observation_store import observation_store
+    from ai_assistant.core.rollups import RollupEngine, rollup_engine
+
+    store = store or observation_store
+    imported, days, added = [], [], 0
+    for path in paths:
+        try:
+            added += store.import_jsonl([path])
+        except Exception as e:
+            print(f"导入旧版观察日志 {path} 时出错: {e}")
+            continue
+        imported.append(path)
+        try:
+            days.append(datetime.strptime(os.path.basename(path)[len("observation_log_"):-len(".jsonl")], '%Y-%m-%d'))
+        except ValueError:
+            pass
+    if added and days:
+        # 之前日期的统计离线重建；今天的统计由运行中的统计引擎维护，让它重放今天的记录
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        end = min(max(days) + timedelta(days=1), today)
+        buckets = 0
+        if min(days) < end:
+            buckets += RollupEngine(store).rebuild(min(days), end)
+        if today in days and rollup_engine.store is store:
+            buckets += rollup_engine.rebuild_today()
+        print(f"已导入 {added} 条旧版观察记录，重建 {buckets} 个统计分桶。")
+    return imported
+
+
+class BatchedLogWriter:
+    """
+    后台批量日志写入器。
+    - 调用方只把一行文本放进有界队列就返回，磁盘I/O全部在写线程中完成；
+    - 写线程按批写入，批次间隔为 flush_interval，fsync 策略可配置：
+      "always" 每批都 fsync，"interval" 每隔 LOG_FSYNC_INTERVAL_SECONDS 一次，"never" 交给操作系统；
+    - 按天分文件 (<名称>_<日期>.txt)，跨天后把前一天的文件压缩进 archive/ 目录，
+      并删除超过保留天数的归档；
+    - 队列满时丢弃新记录并计数，而不是阻塞调用线程。
+    """
+
+    def __init__(self, filename: str = None, directory: str = None, max_queue: int = None,
+                 flush_interval: float = None, fsync_policy: str = None, retention_days: int = None):
+        filename = filename or config.LOG_FILE
+        self.stem, self.ext = os.path.splitext(os.path.basename(filename))
+        self.directory = directory or config.LOG_DIR
+        self.archive_dir = os.path.join(self.directory, "archive")
+        self.flush_interval = flush_interval or config.LOG_FLUSH_INTERVAL_SECONDS
+        self.fsync_policy = fsync_policy or config.LOG_FSYNC_POLICY
+        self.retention_days = config.LOG_RETENTION_DAYS if retention_days is None else retention_days
+        self.queue = queue.Queue(maxsize=max_queue or config.LOG_QUEUE_SIZE)
+        self.counts = CounterGroup()
+        self.running = False
+        self.thread = None
+        self._file = None
+        self._day = None
+        self._last_fsync = time.monotonic()
+
+    def _path_for(self, day: str) -> str:
+        return os.path.join(self.directory, f"{self.stem}_{day}{self.ext}")
+
+    def start(self):
+        if self.running:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name=f"log-writer-{self.stem}", daemon=True)
+        self.thread.start()
+
+    def write(self, line: str) -> bool:
+        """[任意线程] 提交一行日志，立即返回；队列已满时丢弃并返回 False。"""
+        try:
+            self.queue.put_nowait(line)
+            return True
+        except queue.Full:
+            self.counts.incr("dropped")
+            return False
+
+    def _run(self):
+        """[写线程] 启动时先归档之前遗留的旧文件，然后循环批量写入。"""
+        self._archive_stale_files()
+        stopping = False
+        while not stopping:
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    line = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if line is None:
+                    stopping = True
+                    break
+                batch.append(line)
+            if batch:
+                self._write_batch(batch)
+        self._close_file()
+
+    def _write_batch(self, batch: list):
+        try:
+            self._rotate_if_needed()
+            self._file.write("\n".join(batch) + "\n")
+            self._file.flush()
+            now = time.monotonic()
+            if self.fsync_policy == "always" or (
+                    self.fsync_policy == "interval" and now - self._last_fsync >= config.LOG_FSYNC_INTERVAL_SECONDS):
+                os.fsync(self._file.fileno())
+                self._last_fsync = now
+            self.counts.incr("written", len(batch))
+            self.counts.incr("batches")
+        except OSError as e:
+            self.counts.incr("dropped", len(batch))
+            print(f"写入日志文件时出错: {e}")
+
+    def _rotate_if_needed(self):
+        """跨天时关闭旧文件并压缩归档，然后打开当天的文件。"""
+        today = datetime.now().strftime('%Y-%m-%d')
+        if self._day == today and self._file:
+            return
+        previous = self._day
+        self._close_file()
+        if previous:
+            self._archive(self._path_for(previous))
+        self._day = today
+        self._file = open(self._path_for(today), 'a', encoding='utf-8')
+
+    def _archive(self, path: str):
+        if not os.path.exists(path):
+            return
+        try:
+            _compress(path, self.archive_dir)
+            self.counts.incr("rotated")
+            purge_archives(self.archive_dir, self.retention_days)
+        except OSError as e:
+            print(f"归档日志 {path} 时出错: {e}")
+
+    def _archive_stale_files(self):
+        """归档目录中不属于今天的日志文件（例如应用跨天关闭后遗留的）。"""
+        today_path = self._path_for(datetime.now().strftime('%Y-%m-%d'))
+        for path in glob.glob(os.path.join(self.directory, f"{self.stem}_*{self.ext}")):
+            if os.path.abspath(path) != os.path.abspath(today_path):
+                self._archive(path)
+        purge_archives(self.archive_dir, self.retention_days)
+
+    def _close_file(self):
+        if self._file:
+            try:
+                self._file.flush()
+                if self.fsync_policy != "never":
+                    os.fsync(self._file.fileno())
+                self._file.close()
+            except OSError as e:
+                print(f"关闭日志文件时出错: {e}")
+            self._file = None
+
+    def stop(self, timeout: float = 3.0):
+        """写完队列中剩余的日志后停止写线程。"""
+        if not self.running:
+            return
+        self.running = False
+        try:
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        self.thread.join(timeout=timeout)
+        print(f"日志写入器已停止。统计: {self.counts.snapshot()}")
+
+    def get_stats(self) -> dict:
+        data = self.counts.snapshot()
+        data["queued"] = self.queue.qsize()
+        return data
+
+
+class QueueLogHandler(logging.Handler):
+    """把 logging 模块的记录格式化后交给 BatchedLogWriter，替代同步写文件的 FileHandler。"""
+
+    def __init__(self, writer: BatchedLogWriter):
+        super().__init__()
+        self.writer = writer
+
+    def emit(self, record):
+        try:
+            self.writer.write(self.format(record))
+        except Exception:
+            self.handleError(record)
+
+
+def setup_logging(level=logging.INFO) -> BatchedLogWriter:
+    """配置根日志记录器，使其通过后台写线程写入 config.LOG_FILE 对应的按天日志。"""
+    writer = BatchedLogWriter()
+    writer.start()
+    handler = QueueLogHandler(writer)
+    handler.setFormatter(logging.Formatter('%(asctime)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S'))
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(handler)
+    return writer
@@ -0,0 +1,378 @@
+# ai_assistant/core/observation_store.py
+
+import glob
+import gzip
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from ai_assistant.utils import config
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS observations (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,             -- 本地时间的Unix时间戳（秒）
+    behavior_num TEXT,
+    behavior TEXT,
+    emotion TEXT,
+    detail TEXT,                  -- 视觉模型返回的完整分析文本
+    source TEXT NOT NULL DEFAULT 'webcam'
+);
+-- 按时间范围查询走这个索引；同时保证重复导入同一条记录时被忽略
+CREATE UNIQUE INDEX IF NOT EXISTS ux_observations_ts_source ON observations (ts, source);
+-- “本周玩手机的时间”这类按行为过滤的范围查询走这个索引
+CREATE INDEX IF NOT EXISTS ix_observations_behavior_ts ON observations (behavior, ts);
+-- 按分钟/小时/天预聚合的统计 (见 core/rollups.py)，bucket 是可按字符串排序的时间键
+CREATE TABLE IF NOT EXISTS rollups (
+    granularity TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (granularity, bucket)
+);
+-- 每日总结的小时摘要缓存 (见 core/daily_summary.py)，obs_count 为生成摘要时该小时的观察数
+CREATE TABLE IF NOT EXISTS summary_chunks (
+    bucket TEXT PRIMARY KEY,
+    obs_count INTEGER NOT NULL,
+    summary TEXT NOT NULL
+);
+"""
+
+_INSERT_SQL = (
+    "INSERT OR IGNORE INTO observations (ts, behavior_num, behavior, emotion, detail, source) "
+    "VALUES (?, ?, ?, ?, ?, ?)"
+)
+_UPSERT_ROLLUP_SQL = "INSERT OR REPLACE INTO rollups (granularity, bucket, data) VALUES (?, ?, ?)"
+
+
+def _to_epoch(value) -> float:
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, str):
+        return datetime.fromisoformat(value).timestamp()
+    return float(value)
+
+
+def time_range(name: str, now: datetime = None) -> tuple:
+    """
+    把常用的时间范围名称转换为 (start, end) 两个 datetime。
+    支持: "today"、"yesterday"、"last_hour"、"this_week"（从本周一0点开始）。
+    """
+    now = now or datetime.now()
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    if name == "today":
+        return midnight, now
+    if name == "yesterday":
+        return midnight - timedelta(days=1), midnight
+    if name == "last_hour":
+        return now - timedelta(hours=1), now
+    if name == "this_week":
+        return midnight - timedelta(days=midnight.weekday()), now
+    raise ValueError(f"未知的时间范围: {name}")
+
+
+class ObservationStore:
+    """
+    基于SQLite (WAL模式) 的观察记录存储，取代按天分文件的JSONL日志。
+    - 写入：add()/save_rollups() 只把记录放进内存队列，由后台写线程按批次在一个事务里插入，
+      不在分析流程或界面线程上做磁盘I/O；
+    - 读取：query() 通过时间戳索引做范围查询，“今天”、“最近一小时”、“本周只看玩手机”
+      这类查询与历史数据量无关，都在毫秒级完成。WAL模式下读写互不阻塞。
+    每个线程使用自己的连接。
+    """
+
+    def __init__(self, db_path: str = None):
+        self.db_path = db_path or config.OBSERVATION_DB_PATH
+        self._local = threading.local()
+        self._queue = queue.Queue()
+        self._writer = None
+        self._running = False
+        self._lock = threading.Lock()
+        self._flushed = threading.Condition()
+        self._pending = 0
+        self._schema_ready = False
+
+    # --- 连接管理 ---
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with self._lock:
+                if not self._schema_ready:
+                    conn.executescript(SCHEMA)
+                    self._schema_ready = True
+            self._local.conn = conn
+        return conn
+
+    # --- 写入 ---
+
+    def start(self):
+        """启动后台批量写线程（重复调用无副作用）。add() 首次调用时也会自动启动。"""
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+            self._writer = threading.Thread(target=self._writer_loop, name="observation-writer", daemon=True)
+            self._writer.start()
+
+    def add(self, observation: dict, source: str = "webcam"):
+        """[任意线程] 记录一条观察，立即返回，实际写入由后台线程批量完成。"""
+        row = (
+            _to_epoch(observation["timestamp"]),
+            observation.get("behavior_num"),
+            observation.get("behavior_desc"),
+            observation.get("emotion"),
+            observation.get("analysis"),
+            source,
+        )
+        self._enqueue("observation", row)
+
+    def save_rollups(self, rows: list):
+        """[任意线程] 异步保存预聚合统计，rows 为 [(granularity, bucket, data_json), ...]。"""
+        for row in rows:
+            self._enqueue("rollup", row)
+
+    def _enqueue(self, kind: str, row: tuple):
+        if not self._running:
+            self.start()
+        with self._flushed:
+            self._pending += 1
+        self._queue.put((kind, row))
+
+    def _writer_loop(self):
+        """[写线程] 攒够一批或到达刷新间隔后，在一个事务中批量插入。"""
+        conn = self._connect()
+        while True:
+            rows = []
+            try:
+                row = self._queue.get(timeout=config.OBSERVATION_STORE_FLUSH_SECONDS)
+            except queue.Empty:
+                if not self._running:
+                    break
+                continue
+            if row is None:
+                break
+            rows.append(row)
+            deadline = time.monotonic() + config.OBSERVATION_STORE_FLUSH_SECONDS
+            while len(rows) < config.OBSERVATION_STORE_BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    row = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if row is None:
+                    self._running = False
+                    break
+                rows.append(row)
+            self._write_batch(conn, rows)
+            if not self._running:
+                break
+        # 退出前写完队列中剩余的记录
+        rows = []
+        while True:
+            try:
+                row = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if row is not None:
+                rows.append(row)
+        if rows:
+            self._write_batch(conn, rows)
+
+    def _write_batch(self, conn, rows: list):
+        observations = [row for kind, row in rows if kind == "observation"]
+        rollups = [row for kind, row in rows if kind == "rollup"]
+        try:
+            with conn:
+                if observations:
+                    conn.executemany(_INSERT_SQL, observations)
+                if rollups:
+                    conn.executemany(_UPSERT_ROLLUP_SQL, rollups)
+        except Exception as e:
+            print(f"写入观察记录时出错（{len(rows)} 条）: {e}")
+        finally:
+            with self._flushed:
+                self._pending -= len(rows)
+                self._flushed.notify_all()
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """等待队列中已提交的记录全部写入数据库。"""
+        deadline = time.monotonic() + timeout
+        with self._flushed:
+            while self._pending > 0:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._flushed.wait(remaining)
+        return True
+
+    def close(self):
+        """写完剩余记录并停止写线程，然后关闭当前线程的数据库连接。"""
+        with self._lock:
+            running, self._running = self._running, False
+        if running:
+            self._queue.put(None)
+            self._writer.join(timeout=5.0)
+            print("观察记录存储已关闭。")
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # --- 读取 ---
+
+    def query(self, start: datetime = None, end: datetime = None, behavior: str = None,
+              emotion: str = None, limit: int = None, newest_first: bool = False) -> list:
+        """
+        按时间范围（左闭右开）及可选的行为/情绪过滤查询观察记录。
+        返回与实时观察相同结构的字典列表：timestamp(datetime)、behavior_num、behavior_desc、emotion、analysis、source。
+        """
+        sql = "SELECT ts, behavior_num, behavior, emotion, detail, source FROM observations WHERE 1=1"
+        params = []
+        if start is not None:
+            sql += " AND ts >= ?"
+            params.append(_to_epoch(start))
+        if end is not None:
+            sql += " AND ts < ?"
+            params.append(_to_epoch(end))
+        if behavior is not None:
+            sql += " AND behavior = ?"
+            params.append(behavior)
+        if emotion is not None:
+            sql += " AND emotion = ?"
+            params.append(emotion)
+        sql += " ORDER BY ts DESC" if newest_first else " ORDER BY ts"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        rows = self._connect().execute(sql, params).fetchall()
+        return [
+            {"timestamp": datetime.fromtimestamp(ts), "behavior_num": num, "behavior_desc": behavior_,
+             "emotion": emotion_, "analysis": detail, "source": source}
+            for ts, num, behavior_, emotion_, detail, source in rows
+        ]
+
+    def load_timeline(self, start: datetime = None, end: datetime = None) -> tuple:
+        """
+        只读取时间戳和行为编号两列，返回 (时间戳秒数组 float64, 行为编号数组 int8)，按时间排序。
+        供图表加载长时间范围（例如一个月）的数据，比 query() 构造字典快得多。
+        """
+        sql = "SELECT ts, behavior_num FROM observations WHERE ts >= ? AND ts < ? ORDER BY ts"
+        params = (_to_epoch(start) if start is not None else 0.0,
+                  _to_epoch(end) if end is not None else float("inf"))
+        rows = self._connect().execute(sql, params).fetchall()
+        ts = np.fromiter((row[0] for row in rows), dtype=np.float64, count=len(rows))
+        behavior = np.fromiter((int(row[1]) if row[1] and row[1].isdigit() and int(row[1]) < 128 else 0
+                                for row in rows), dtype=np.int8, count=len(rows))
+        return ts, behavior
+
+    def recent(self, range_name: str, **filters) -> list:
+        """query() 的便捷写法，例如 recent("this_week", behavior="玩手机")。"""
+        start, end = time_range(range_name)
+        return self.query(start, end, **filters)
+
+    def load_rollups(self, granularity: str, start_bucket: str = None, end_bucket: str = None) -> dict:
+        """读取某个粒度下 [start_bucket, end_bucket] 范围内的预聚合统计，返回按时间排序的 {bucket: data}。"""
+        sql = "SELECT bucket, data FROM rollups WHERE granularity = ?"
+        params = [granularity]
+        if start_bucket is not None:
+            sql += " AND bucket >= ?"
+            params.append(start_bucket)
+        if end_bucket is not None:
+            sql += " AND bucket <= ?"
+            params.append(end_bucket)
+        sql += " ORDER BY bucket"
+        rows = self._connect().execute(sql, params).fetchall()
+        return {bucket: json.loads(data) for bucket, data in rows}
+
+    def load_summary_chunks(self, start_bucket: str, end_bucket: str) -> dict:
+        """读取 [start_bucket, end_bucket] 范围内缓存的小时摘要，返回 {bucket: (obs_count, summary)}。"""
+        rows = self._connect().execute(
+            "SELECT bucket, obs_count, summary FROM summary_chunks WHERE bucket >= ? AND bucket <= ?",
+            (start_bucket, end_bucket)
+        ).fetchall()
+        return {bucket: (count, summary) for bucket, count, summary in rows}
+
+    def save_summary_chunk(self, bucket: str, obs_count: int, summary: str):
+        conn = self._connect()
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO summary_chunks (bucket, obs_count, summary) VALUES (?, ?, ?)",
+                         (bucket, obs_count, summary))
+
+    def replace_rollups(self, rows: list):
+        """[调用线程] 同步写入一批预聚合统计，用于离线重建。"""
+        conn = self._connect()
+        with conn:
+            conn.executemany(_UPSERT_ROLLUP_SQL, rows)
+
+    # --- 迁移 ---
+
+    def import_jsonl(self, paths: list) -> int:
+        """
+        把旧版的 observation_log_<日期>.jsonl 文件（或其 .gz 归档）导入数据库，返回新增的记录数。
+        重复导入是安全的：相同时间戳和来源的记录会被忽略。
+        """
+        conn = self._connect()
+        before = conn.total_changes
+        for path in paths:
+            rows = []
+            opener = gzip.open if path.endswith(".gz") else open
+            with opener(path, 'rt', encoding='utf-8') as f:
+                for line_no, line in enumerate(f, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        obs = json.loads(line)
+                        rows.append((
+                            _to_epoch(obs["timestamp"]), obs.get("behavior_num"), obs.get("behavior_desc"),
+                            obs.get("emotion"), obs.get("analysis"), obs.get("source", "webcam"),
+                        ))
+                    except (ValueError, KeyError) as e:
+                        print(f"{path}:{line_no} 格式错误，已跳过: {e}")
+            with conn:
+                conn.executemany(_INSERT_SQL, rows)
+            print(f"{path}: 读取 {len(rows)} 条记录")
+        return conn.total_changes - before
+
+
+# 进程级单例：主应用写入，每日总结、统计报表等读取
+observation_store = ObservationStore()
+
+
+def main(argv=None):
+    """命令行入口：把旧版JSONL观察日志导入SQLite数据库。"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="把 observation_log_*.jsonl 导入观察记录数据库")
+    parser.add_argument("paths", nargs="*",
+                        help="要导入的JSONL文件，默认为当前目录下的 observation_log_*.jsonl 及日志归档中的 .jsonl.gz")
+    parser.add_argument("--db", default=config.OBSERVATION_DB_PATH, help="SQLite数据库路径")
+    args = parser.parse_args(argv)
+
+    paths = args.paths or sorted(
+        glob.glob("observation_log_*.jsonl")
+        + glob.glob(os.path.join(config.LOG_DIR, "archive", "observation_log_*.jsonl.gz"))
+        + glob.glob(os.path.join(config.LOG_DIR, "archive", "legacy", "observation_log_*.jsonl.gz"))
+    )
+    if not paths:
+        print("没有找到需要导入的JSONL文件。")
+        return
+    store = ObservationStore(args.db)
+    added = store.import_jsonl(paths)
+    print(f"导入完成：{len(paths)} 个文件，新增 {added} 条记录 -> {args.db}")
+    if added:
+        # 导入的是历史数据，需要为它们重建一次预聚合统计
+        from ai_assistant.core.rollups import RollupEngine
+        buckets = RollupEngine(store).rebuild()
+        print(f"已重建 {buckets} 个统计分桶。")
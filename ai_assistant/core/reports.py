@@ -0,0 +1,157 @@
+# ai_assistant/core/reports.py
+
+from datetime import datetime, timedelta
+
+from ai_assistant.core.rollups import FOCUS_BEHAVIOR, bucket_key, merge_buckets
+from ai_assistant.utils import config
+
+
+PHONE_BEHAVIOR = "玩手机"
+WEEKDAYS = ["周一", "周二", "周三", "周四", "周五", "周六", "周日"]
+# 热力图的深浅等级，从无到多
+HEAT_SHADES = " ░▒▓█"
+
+
+def period_bounds(period: str, offset: int = 0, now: datetime = None) -> tuple:
+    """
+    返回某个自然周/自然月的 [开始, 结束) 时间范围。
+    offset=0 为本周/本月，-1 为上一周/上一月，以此类推。
+    """
+    now = now or datetime.now()
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    if period == "week":
+        start = midnight - timedelta(days=midnight.weekday()) + timedelta(weeks=offset)
+        return start, start + timedelta(weeks=1)
+    if period == "month":
+        month_index = midnight.year * 12 + midnight.month - 1 + offset
+        start = midnight.replace(year=month_index // 12, month=month_index % 12 + 1, day=1)
+        next_index = month_index + 1
+        return start, start.replace(year=next_index // 12, month=next_index % 12 + 1)
+    raise ValueError(f"未知的报表周期: {period}")
+
+
+def period_metrics(store, start: datetime, end: datetime) -> dict:
+    """
+    只读取 [start, end) 范围内的日分桶，计算一个周期的汇总指标。
+    日均值按有数据的天数计算，这样还没过完的本周/本月也能和完整的上一期比较。
+    """
+    days = store.load_rollups("day", bucket_key("day", start), bucket_key("day", end - timedelta(days=1)))
+    merged = merge_buckets(days.values())
+    active_days = sum(1 for b in days.values() if b["count"])
+    negative = sum(merged["emotion_counts"].get(e, 0) for e in config.NEGATIVE_EMOTIONS)
+    focus_hours = merged["behavior_seconds"].get(FOCUS_BEHAVIOR, 0) / 3600
+    phone_hours = merged["behavior_seconds"].get(PHONE_BEHAVIOR, 0) / 3600
+    return {
+        "start": start,
+        "end": end,
+        "active_days": active_days,
+        "count": merged["count"],
+        "focus_hours": focus_hours,
+        "phone_hours": phone_hours,
+        "focus_hours_per_day": focus_hours / active_days if active_days else 0.0,
+        "phone_hours_per_day": phone_hours / active_days if active_days else 0.0,
+        "negative_rate": negative / merged["count"] if merged["count"] else 0.0,
+        "longest_focus_hours": merged["longest_focus_seconds"] / 3600,
+    }
+
+
+def hourly_heatmap(store, start: datetime, end: datetime) -> dict:
+    """
+    从 [start, end) 范围内的小时分桶计算“星期 × 小时”的热力图：
+    专注时长与玩手机时长（分钟，7x24矩阵），以及各小时的负面情绪观察次数/总观察次数。
+    """
+    hours = store.load_rollups("hour", bucket_key("hour", start), bucket_key("hour", end - timedelta(hours=1)))
+    focus = [[0.0] * 24 for _ in range(7)]
+    phone = [[0.0] * 24 for _ in range(7)]
+    negative, totals = [0] * 24, [0] * 24
+    for key, b in hours.items():
+        ts = datetime.strptime(key, "%Y-%m-%d %H")
+        weekday, hour = ts.weekday(), ts.hour
+        focus[weekday][hour] += b["behavior_seconds"].get(FOCUS_BEHAVIOR, 0) / 60
+        phone[weekday][hour] += b["behavior_seconds"].get(PHONE_BEHAVIOR, 0) / 60
+        negative[hour] += sum(b["emotion_counts"].get(e, 0) for e in config.NEGATIVE_EMOTIONS)
+        totals[hour] += b["count"]
+    return {"focus_minutes": focus, "phone_minutes": phone, "negative": negative, "totals": totals}
+
+
+def trend_report(store, period: str = "week", offset: int = 0, now: datetime = None) -> dict:
+    """生成一期趋势报表：本期指标、上一期指标和本期的时段热力图。全部来自预聚合统计，不读取原始观察。"""
+    start, end = period_bounds(period, offset, now)
+    prev_start, prev_end = period_bounds(period, offset - 1, now)
+    return {
+        "period": period,
+        "current": period_metrics(store, start, end),
+        "previous": period_metrics(store, prev_start, prev_end),
+        "heatmap": hourly_heatmap(store, start, end),
+    }
+
+
+def _delta(current: float, previous: float) -> str:
+    if not previous:
+        return "（上期无数据）" if current else ""
+    change = (current - previous) / previous * 100
+    return f"（{'↑' if change >= 0 else '↓'}{abs(change):.0f}%）"
+
+
+def _heat_rows(matrix: list) -> list:
+    peak = max(max(row) for row in matrix) or 1
+    levels = len(HEAT_SHADES) - 1
+    lines = [" " * 8 + "".join(f"{h:<3d}" for h in range(0, 24, 3))]
+    for name, row in zip(WEEKDAYS, matrix):
+        cells = "".join(HEAT_SHADES[max(1, round(v / peak * levels))] if v else "·" for v in row)
+        lines.append(f"  {name}  {cells}")
+    return lines
+
+
+def format_report(report: dict) -> str:
+    """把趋势报表格式化为中文文本。"""
+    label = "周" if report["period"] == "week" else "月"
+    cur, prev = report["current"], report["previous"]
+    end_day = (cur["end"] - timedelta(days=1)).strftime('%Y-%m-%d')
+    lines = [
+        f"===== {label}度趋势报表：{cur['start'].strftime('%Y-%m-%d')} ~ {end_day} =====",
+        f"有记录的天数: {cur['active_days']}（上{label} {prev['active_days']}），观察次数: {cur['count']}",
+    ]
+    if not cur["count"]:
+        lines.append("本期暂无统计数据。")
+        return "\n".join(lines)
+    lines += [
+        f"专注工作: 共 {cur['focus_hours']:.1f} 小时，日均 {cur['focus_hours_per_day']:.1f} 小时"
+        f"{_delta(cur['focus_hours_per_day'], prev['focus_hours_per_day'])}",
+        f"玩手机:   共 {cur['phone_hours']:.1f} 小时，日均 {cur['phone_hours_per_day']:.1f} 小时"
+        f"{_delta(cur['phone_hours_per_day'], prev['phone_hours_per_day'])}",
+        f"负面情绪占比: {cur['negative_rate'] * 100:.1f}%（上{label} {prev['negative_rate'] * 100:.1f}%）",
+        f"最长连续专注: {cur['longest_focus_hours'] * 60:.0f} 分钟",
+        "",
+        "专注时段热力图（列为小时 0-23，颜色越深专注越久）:",
+        *_heat_rows(report["heatmap"]["focus_minutes"]),
+        "",
+        "玩手机时段热力图:",
+        *_heat_rows(report["heatmap"]["phone_minutes"]),
+    ]
+    negative, totals = report["heatmap"]["negative"], report["heatmap"]["totals"]
+    rates = [(h, negative[h] / totals[h]) for h in range(24) if totals[h] and negative[h]]
+    if rates:
+        worst = sorted(rates, key=lambda hr: -hr[1])[:3]
+        lines += ["", "负面情绪最集中的时段: " + "、".join(f"{h:02d}点 {r * 100:.0f}%" for h, r in worst)]
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    """命令行入口：打印周/月趋势报表。"""
+    import argparse
+    import time
+
+    from ai_assistant.core.observation_store import ObservationStore
+
+    parser = argparse.ArgumentParser(description="根据预聚合统计生成周/月趋势报表")
+    parser.add_argument("--period", choices=["week", "month"], default="week", help="报表周期")
+    parser.add_argument("--offset", type=int, default=0, help="0 为本期，-1 为上一期，以此类推")
+    parser.add_argument("--db", default=config.OBSERVATION_DB_PATH, help="SQLite数据库路径")
+    args = parser.parse_args(argv)
+
+    store = ObservationStore(args.db)
+    started = time.perf_counter()
+    report = trend_report(store, args.period, args.offset)
+    print(format_report(report))
+    print(f"\n（报表生成耗时 {(time.perf_counter() - started) * 1000:.0f} ms）")
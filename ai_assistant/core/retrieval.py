@@ -0,0 +1,310 @@
+# ai_assistant/core/retrieval.py
+
+import math
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from datetime import datetime, timedelta
+
+from ai_assistant.core.observation_store import observation_store
+from ai_assistant.core.rollups import rollup_engine, bucket_key, format_rollup
+from ai_assistant.utils import config
+from ai_assistant.utils.metrics import RollingStats
+
+
+def _load_jieba():
+    """分词优先使用可选依赖 jieba (pip install jieba)，未安装时退回按字的二元切分。"""
+    try:
+        import jieba
+        jieba.setLogLevel(60)  # 关闭加载词典时的日志
+        return jieba
+    except ImportError:
+        return None
+
+
+_jieba = _load_jieba()
+_CJK_RE = re.compile(r'[一-鿿]+')
+_WORD_RE = re.compile(r'[a-zA-Z0-9]+')
+# 出现在几乎所有提问里、对检索没有帮助的词
+_STOPWORDS = {"我", "你", "他", "的", "了", "吗", "呢", "吧", "啊", "是", "在", "有", "什么", "怎么", "一下"}
+
+
+def tokenize(text: str) -> list:
+    """把中文文本切成检索用的词：有 jieba 时按词切分，否则使用相邻两字组成的二元词。"""
+    if _jieba is not None:
+        return [t for t in _jieba.lcut_for_search(text)
+                if t.strip() and t not in _STOPWORDS and (_CJK_RE.match(t) or _WORD_RE.match(t))]
+    tokens = [w.lower() for w in _WORD_RE.findall(text)]
+    for run in _CJK_RE.findall(text):
+        if len(run) == 1:
+            if run not in _STOPWORDS:
+                tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+# 提问中的时间表达 -> 当天的小时范围 [开始, 结束)
+_DAYPART_HOURS = [
+    (re.compile(r'午饭前|午饭之前|中午之前|上午'), (6, 12)),
+    (re.compile(r'午饭后|午饭之后|中午之后|下午'), (12, 18)),
+    (re.compile(r'中午|午饭'), (11, 14)),
+    (re.compile(r'早上|早晨|早饭'), (6, 10)),
+    (re.compile(r'晚上|晚饭|傍晚'), (18, 24)),
+    (re.compile(r'凌晨|半夜'), (0, 6)),
+]
+_DAY_OFFSETS = {"前天": -2, "昨天": -1, "昨晚": -1, "今天": 0}
+_CLOCK_RE = re.compile(r'(\d{1,2})\s*点')
+
+
+def parse_time_hint(text: str, now: datetime = None):
+    """
+    从提问中识别时间范围，例如“昨天午饭前”“今天下午”“3点左右”“刚才”。
+    返回 (开始, 结束)；提问中没有时间表达时返回 None。
+    """
+    now = now or datetime.now()
+    if "刚才" in text or "刚刚" in text:
+        return now - timedelta(minutes=30), now
+    day_offset = next((offset for word, offset in _DAY_OFFSETS.items() if word in text), None)
+    hours = next((span for pattern, span in _DAYPART_HOURS if pattern.search(text)), None)
+    clock = _CLOCK_RE.search(text)
+    if clock:
+        hour = int(clock.group(1))
+        if hour < 12 and hours and hours[0] >= 12:  # “下午3点” -> 15点
+            hour += 12
+        hours = (max(hour - 1, 0), min(hour + 2, 24))
+    if day_offset is None and hours is None:
+        return None
+    day = now.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=day_offset or 0)
+    start_hour, end_hour = hours or (0, 24)
+    return day + timedelta(hours=start_hour), day + timedelta(hours=end_hour)
+
+
+class MemoryIndex:
+    """
+    本地检索索引：把过去的观察、统计和对话建成BM25倒排索引，回答语音提问时只取最相关的几条放进prompt。
+    - 观察：连续相同的 (行为, 情绪) 合并为一个时间段文档，当前时间段随新观察原地更新；
+    - 统计：每个已结束小时的预聚合统计，以及每日总结生成的小时摘要；
+    - 对话：每轮完成的语音问答。
+    所有更新都是增量的（只改动涉及的倒排项），文档数超过上限时淘汰最旧的，检索在内存中完成。
+    提问包含时间表达时（“昨天午饭前”），落在该时间范围内的文档会额外加分。
+    """
+
+    K1 = 1.5
+    B = 0.75
+
+    def __init__(self, store=None, rollups=None, max_docs: int = None):
+        self.store = store or observation_store
+        self.rollups = rollups or rollup_engine
+        self.max_docs = max_docs or config.RETRIEVAL_MAX_DOCS
+        self.lock = threading.Lock()
+        self.docs = OrderedDict()   # doc_id -> {"kind", "start", "end", "text", "tf", "length"}
+        self.postings = {}          # token -> {doc_id: 词频}
+        self.total_length = 0
+        self.next_id = 0
+        self.segment = None         # 当前正在延续的观察时间段
+        self.summary_docs = {}      # 小时开始时间 -> 该小时摘要的 doc_id（重新生成时替换）
+        self.rollup_docs = {}       # 小时开始时间 -> 该小时统计的 doc_id
+        self.current_hour = None    # 最近一条观察所在的小时；之前的小时已经结束并建立了索引
+        self.query_ms = RollingStats()
+
+    # --- 索引维护 ---
+
+    def _add_doc(self, kind: str, start: datetime, end: datetime, text: str, doc_id: int = None) -> int:
+        """[持有锁时调用] 加入（或以相同 doc_id 替换）一个文档。"""
+        if doc_id is None:
+            doc_id = self.next_id
+            self.next_id += 1
+        tf = Counter(tokenize(text))
+        length = sum(tf.values())
+        self.docs[doc_id] = {"kind": kind, "start": start, "end": end, "text": text, "tf": tf, "length": length}
+        self.total_length += length
+        for token, count in tf.items():
+            self.postings.setdefault(token, {})[doc_id] = count
+        while len(self.docs) > self.max_docs:
+            self._remove_doc(next(iter(self.docs)))
+        return doc_id
+
+    def _remove_doc(self, doc_id: int):
+        doc = self.docs.pop(doc_id, None)
+        if doc is None:
+            return
+        self.total_length -= doc["length"]
+        for token in doc["tf"]:
+            posting = self.postings.get(token)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self.postings[token]
+
+    def add_observation(self, observation: dict):
+        """[任意线程] 计入一条新观察：延续当前时间段，或结束它并开始新的时间段。"""
+        ts = observation["timestamp"]
+        key = (observation["behavior_desc"], observation["emotion"])
+        with self.lock:
+            seg = self.segment
+            if seg and seg["key"] == key and (ts - seg["end"]).total_seconds() <= config.ROLLUP_MAX_GAP_SECONDS:
+                seg["end"] = ts
+                seg["count"] += 1
+                self._remove_doc(seg["doc_id"])
+            else:
+                seg = self.segment = {"key": key, "start": ts, "end": ts, "count": 1,
+                                      "analysis": observation.get("analysis", ""), "doc_id": None}
+            seg["doc_id"] = self._add_doc("observation", seg["start"], seg["end"],
+                                          self._segment_text(seg), seg["doc_id"])
+            self._advance_hour(ts)
+
+    def _advance_hour(self, ts: datetime):
+        """[持有锁时调用] 观察进入新的小时后，为上一条观察之后结束的每个小时建立统计文档（不论时间段是否变化）。"""
+        hour = ts.replace(minute=0, second=0, microsecond=0)
+        if self.current_hour is not None:
+            finished = self.current_hour
+            while finished < hour:
+                self._index_hour(finished)
+                finished += timedelta(hours=1)
+        if self.current_hour is None or hour > self.current_hour:
+            self.current_hour = hour
+
+    @staticmethod
+    def _segment_text(seg: dict) -> str:
+        behavior, emotion = seg["key"]
+        analysis = seg["analysis"][:config.RETRIEVAL_ANALYSIS_MAX_CHARS]
+        return f"{behavior}，情绪{emotion}（共{seg['count']}次观察）。{analysis}"
+
+    def _index_hour(self, hour_start: datetime):
+        """[持有锁时调用] 一个小时结束后，把它的预聚合统计作为一个文档加入索引；没有观察的小时跳过。"""
+        stats = self.rollups.get("hour", hour_start)
+        if stats["count"]:
+            self._add_rollup_doc(hour_start, stats)
+
+    def _add_rollup_doc(self, hour_start: datetime, stats: dict):
+        """[持有锁时调用] 加入一个小时的统计文档；同一小时已有时替换（启动载入与增量更新可能重叠）。"""
+        self._remove_doc(self.rollup_docs.pop(hour_start, None))
+        self.rollup_docs[hour_start] = self._add_doc(
+            "rollup", hour_start, hour_start + timedelta(hours=1),
+            "这一小时的统计：" + format_rollup(stats).replace("\n", "；"))
+
+    def add_hour_summary(self, hour_start: datetime, summary: str):
+        """[任意线程] 每日总结生成的小时摘要；同一小时重新生成时替换旧的摘要。"""
+        with self.lock:
+            self._remove_doc(self.summary_docs.pop(hour_start, None))
+            self.summary_docs[hour_start] = self._add_doc(
+                "summary", hour_start, hour_start + timedelta(hours=1), summary)
+
+    def add_chat_turn(self, user_text: str, reply: str, ts: datetime = None):
+        """[任意线程] 一轮完成的语音问答。"""
+        ts = ts or datetime.now()
+        with self.lock:
+            self._add_doc("chat", ts, ts, f"溢涛问：{user_text} 婉晴答：{reply}")
+
+    def bootstrap(self, days: int = None):
+        """
+        [后台线程] 启动时从数据库载入最近几天的观察时间段、小时统计和小时摘要，
+        之后只做增量更新。在此期间到达的新观察照常加入索引。
+        """
+        days = config.RETRIEVAL_BOOTSTRAP_DAYS if days is None else days
+        now = datetime.now()
+        start = (now - timedelta(days=days)).replace(hour=0, minute=0, second=0, microsecond=0)
+        try:
+            history = MemoryIndex(self.store, self.rollups, self.max_docs)
+            history._index_hour = lambda hour_start: None  # 小时统计在下面一次性批量载入
+            for obs in self.store.query(start, now):
+                history.add_observation(obs)
+            for key, stats in self.store.load_rollups("hour", bucket_key("hour", start),
+                                                      bucket_key("hour", now - timedelta(hours=1))).items():
+                if stats["count"]:
+                    history._add_rollup_doc(datetime.strptime(key, "%Y-%m-%d %H"), stats)
+            for key, (_, summary) in self.store.load_summary_chunks(bucket_key("hour", start),
+                                                                    bucket_key("hour", now)).items():
+                history.add_hour_summary(datetime.strptime(key, "%Y-%m-%d %H"), summary)
+        except Exception as e:
+            print(f"载入历史检索索引时出错，将只索引新的记录: {e}")
+            return
+        with self.lock:
+            # 历史文档排在已有文档之前，使淘汰顺序仍然是从旧到新
+            # （历史中的 doc_id 与已有的 doc_id 各自编号，这里按新顺序统一重新编号）
+            live_segment = self.segment["doc_id"] if self.segment else None
+            ordered = [(False, doc_id, doc) for doc_id, doc in
+                       sorted(history.docs.items(), key=lambda item: item[1]["start"])]
+            ordered += [(True, doc_id, doc) for doc_id, doc in self.docs.items()]
+            self.docs, self.postings, self.total_length = OrderedDict(), {}, 0
+            self.summary_docs, self.rollup_docs = {}, {}
+            per_hour = {"summary": self.summary_docs, "rollup": self.rollup_docs}
+            for is_live, doc_id, doc in ordered:
+                hour_docs = per_hour.get(doc["kind"])
+                if hour_docs is not None:
+                    self._remove_doc(hour_docs.pop(doc["start"], None))
+                new_id = self._add_doc(doc["kind"], doc["start"], doc["end"], doc["text"])
+                if hour_docs is not None:
+                    hour_docs[doc["start"]] = new_id
+                if is_live and doc_id == live_segment:
+                    self.segment["doc_id"] = new_id
+        print(f"检索索引已载入最近 {days} 天的记录，共 {len(self.docs)} 个文档。")
+
+    # --- 检索 ---
+
+    def search(self, query: str, k: int = None, now: datetime = None) -> list:
+        """
+        返回与提问最相关的至多 k 个文档 [{"kind", "start", "end", "text", "score"}, ...]，按时间排序。
+        """
+        started = time.perf_counter()
+        k = k or config.RETRIEVAL_TOP_K
+        hint = parse_time_hint(query, now)
+        tokens = set(tokenize(query))
+        with self.lock:
+            n = len(self.docs)
+            if not n:
+                return []
+            avg_length = self.total_length / n or 1
+            scores = {}
+            for token in tokens:
+                posting = self.postings.get(token)
+                if not posting:
+                    continue
+                idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+                for doc_id, tf in posting.items():
+                    length = self.docs[doc_id]["length"]
+                    denom = tf + self.K1 * (1 - self.B + self.B * length / avg_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.K1 + 1) / denom
+            if hint:
+                # 时间范围内的文档即使没有共同的词也作为候选，并额外加分；
+                # 按小时的统计和摘要概括性更好，加分更多
+                start, end = hint
+                for doc_id, doc in self.docs.items():
+                    if doc["start"] < end and doc["end"] >= start:
+                        boost = config.RETRIEVAL_TIME_BOOST * (1.0 if doc["kind"] in ("rollup", "summary") else 0.5)
+                        scores[doc_id] = scores.get(doc_id, 0.0) + boost
+            # 分数相同时较新的文档优先
+            top = sorted(scores.items(), key=lambda kv: (-kv[1], -kv[0]))[:k]
+            results = [dict(self.docs[doc_id], score=score) for doc_id, score in top]
+        for r in results:
+            del r["tf"], r["length"]
+        self.query_ms.add((time.perf_counter() - started) * 1000)
+        return sorted(results, key=lambda r: r["start"])
+
+    def context_for(self, query: str, now: datetime = None) -> str:
+        """为一次语音提问组装检索到的背景片段，总长度不超过 RETRIEVAL_MAX_PROMPT_CHARS。"""
+        now = now or datetime.now()
+        lines, used = [], 0
+        for doc in self.search(query, now=now):
+            when = doc["start"].strftime('%H:%M') if doc["start"].date() == now.date() \
+                else doc["start"].strftime('%m月%d日 %H:%M')
+            if doc["end"] != doc["start"] and doc["kind"] == "observation":
+                when += f"-{doc['end'].strftime('%H:%M')}"
+            line = f"- [{when}] {doc['text'][:config.RETRIEVAL_SNIPPET_MAX_CHARS]}"
+            if used + len(line) > config.RETRIEVAL_MAX_PROMPT_CHARS:
+                break
+            lines.append(line)
+            used += len(line)
+        return "\n".join(lines)
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            data = {"docs": len(self.docs), "terms": len(self.postings)}
+        data["query_ms"] = self.query_ms.snapshot()
+        return data
+
+
+# 进程级单例：主应用写入观察和对话，语音提问时检索
+memory_index = MemoryIndex()
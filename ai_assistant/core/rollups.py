@@ -0,0 +1,255 @@
+# ai_assistant/core/rollups.py
+
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from ai_assistant.core.observation_store import observation_store
+from ai_assistant.utils import config
+
+
+FOCUS_BEHAVIOR = "认真专注工作"
+
+# 粒度 -> 分桶键的时间格式；键是可以按字符串排序的
+GRANULARITIES = {
+    "minute": "%Y-%m-%d %H:%M",
+    "hour": "%Y-%m-%d %H",
+    "day": "%Y-%m-%d",
+}
+
+
+def bucket_key(granularity: str, ts: datetime) -> str:
+    return ts.strftime(GRANULARITIES[granularity])
+
+
+def empty_bucket() -> dict:
+    return {
+        "count": 0,                  # 观察次数
+        "behavior_seconds": {},      # 行为 -> 累计时长（秒）
+        "behavior_counts": {},       # 行为 -> 观察次数
+        "emotion_counts": {},        # 情绪 -> 观察次数
+        "transitions": {},           # "行为A->行为B" -> 次数
+        "longest_focus_seconds": 0,  # 本分桶内结束的最长连续专注时长
+    }
+
+
+def _incr(d: dict, key: str, amount=1):
+    d[key] = d.get(key, 0) + amount
+
+
+def merge_buckets(buckets) -> dict:
+    """把多个分桶合并为一个（例如把一周的日分桶合并成周统计）。"""
+    merged = empty_bucket()
+    for b in buckets:
+        merged["count"] += b["count"]
+        for field in ("behavior_seconds", "behavior_counts", "emotion_counts", "transitions"):
+            for key, value in b[field].items():
+                _incr(merged[field], key, value)
+        merged["longest_focus_seconds"] = max(merged["longest_focus_seconds"], b["longest_focus_seconds"])
+    return merged
+
+
+class RollupEngine:
+    """
+    观察记录的在线增量聚合引擎。
+    每条观察到达时，以O(1)的代价更新它所在的分钟/小时/天三个分桶：
+    各行为的累计时长、情绪分布、行为切换次数、最长连续专注时长；
+    同时维护当前的连续负面情绪次数，供主动关怀使用。
+    分桶通过 observation_store 异步持久化，图表、报表和prompt都从这里读取统计，
+    而不必再扫描原始观察记录。
+    """
+
+    def __init__(self, store=None):
+        self.store = store or observation_store
+        self.lock = threading.RLock()
+        self.buckets = {g: OrderedDict() for g in GRANULARITIES}
+        self.last_ts = None
+        self.last_behavior = None
+        self.focus_started = None
+        self.negative_streak = 0
+        self.loaded = False
+
+    # --- 增量更新 ---
+
+    def add(self, observation: dict, persist: bool = True):
+        """[任意线程] 把一条新的观察计入统计。"""
+        ts = observation["timestamp"]
+        behavior = observation["behavior_desc"]
+        emotion = observation["emotion"]
+        with self.lock:
+            self._ensure_loaded()
+            touched = set()
+
+            # 1. 上一条观察到这一条之间的时长计入上一条的行为（间隔过长视为离开，不计入）
+            if self.last_ts is not None:
+                gap = (ts - self.last_ts).total_seconds()
+                if 0 < gap <= config.ROLLUP_MAX_GAP_SECONDS:
+                    for g in GRANULARITIES:
+                        b = self._bucket(g, self.last_ts, touched)
+                        _incr(b["behavior_seconds"], self.last_behavior, gap)
+                if self.last_behavior != behavior:
+                    for g in GRANULARITIES:
+                        _incr(self._bucket(g, ts, touched)["transitions"], f"{self.last_behavior}->{behavior}")
+                if gap > config.ROLLUP_MAX_GAP_SECONDS:
+                    self.focus_started = None
+
+            # 2. 本条观察的次数与情绪
+            for g in GRANULARITIES:
+                b = self._bucket(g, ts, touched)
+                b["count"] += 1
+                _incr(b["behavior_counts"], behavior)
+                _incr(b["emotion_counts"], emotion)
+
+            # 3. 连续专注时长
+            if behavior == FOCUS_BEHAVIOR:
+                if self.focus_started is None:
+                    self.focus_started = ts
+                streak = (ts - self.focus_started).total_seconds()
+                for g in GRANULARITIES:
+                    b = self._bucket(g, ts, touched)
+                    b["longest_focus_seconds"] = max(b["longest_focus_seconds"], streak)
+            else:
+                self.focus_started = None
+
+            # 4. 连续负面情绪次数
+            if emotion in config.NEGATIVE_EMOTIONS:
+                self.negative_streak += 1
+            else:
+                self.negative_streak = 0
+
+            self.last_ts, self.last_behavior = ts, behavior
+            self._prune()
+            rows = [(g, key, json.dumps(self.buckets[g][key], ensure_ascii=False)) for g, key in touched]
+        if persist:
+            self.store.save_rollups(rows)
+
+    def reset_negative_streak(self):
+        with self.lock:
+            self.negative_streak = 0
+
+    def _bucket(self, granularity: str, ts: datetime, touched: set) -> dict:
+        key = bucket_key(granularity, ts)
+        buckets = self.buckets[granularity]
+        b = buckets.get(key)
+        if b is None:
+            b = buckets[key] = empty_bucket()
+        touched.add((granularity, key))
+        return b
+
+    def _prune(self):
+        """内存中只保留最近的分桶，更早的分桶只在数据库里（按需读取）。"""
+        limits = {"minute": config.ROLLUP_MEMORY_MINUTES, "hour": 48, "day": 14}
+        for g, limit in limits.items():
+            buckets = self.buckets[g]
+            while len(buckets) > limit:
+                buckets.popitem(last=False)
+
+    # --- 读取 ---
+
+    def _ensure_loaded(self):
+        """[持有锁时调用] 首次使用时从数据库载入今天的分桶，重启后统计可以接着累计。"""
+        if self.loaded:
+            return
+        self.loaded = True
+        now = datetime.now()
+        try:
+            for g in GRANULARITIES:
+                start = bucket_key(g, now.replace(hour=0, minute=0))
+                self.buckets[g].update(self.store.load_rollups(g, start))
+        except Exception as e:
+            print(f"载入统计分桶时出错，将从零开始累计: {e}")
+
+    def get(self, granularity: str, ts: datetime = None) -> dict:
+        """返回某个时刻所在分桶的统计（副本）；没有数据时返回空分桶。"""
+        key = bucket_key(granularity, ts or datetime.now())
+        with self.lock:
+            self._ensure_loaded()
+            b = self.buckets[granularity].get(key)
+            if b is not None:
+                return json.loads(json.dumps(b))
+        return self.store.load_rollups(granularity, key, key).get(key, empty_bucket())
+
+    def today(self) -> dict:
+        return self.get("day")
+
+    def range(self, granularity: str, start: datetime, end: datetime) -> dict:
+        """返回 [start, end] 范围内的各分桶 {bucket: data}，内存中较新的数据优先。"""
+        start_key, end_key = bucket_key(granularity, start), bucket_key(granularity, end)
+        result = self.store.load_rollups(granularity, start_key, end_key)
+        with self.lock:
+            for key, b in self.buckets[granularity].items():
+                if start_key <= key <= end_key:
+                    result[key] = json.loads(json.dumps(b))
+        return dict(sorted(result.items()))
+
+    def rebuild_today(self) -> int:
+        """
+        [后台线程] 从数据库重放今天的观察，替换内存中今天的分桶（例如导入了今天的旧版日志之后）。
+        重放期间持有锁，新的观察等重放完成后再计入；只重放到已计入的最后一条观察为止，
+        数据库中还没有计入统计的新观察稍后由 add() 照常计入，不会重复。返回写入的分桶数。
+        """
+        self.store.flush()
+        midnight = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        with self.lock:
+            self._ensure_loaded()
+            cutoff = self.last_ts or datetime.now()
+            engine = RollupEngine(self.store)
+            engine.loaded = True
+            engine._prune = lambda: None
+            for obs in self.store.query(midnight, cutoff + timedelta(microseconds=1)):
+                engine.add(obs, persist=False)
+            rows = []
+            for g in GRANULARITIES:
+                start = bucket_key(g, midnight)
+                for key in [k for k in self.buckets[g] if k >= start]:
+                    del self.buckets[g][key]
+                for key, b in engine.buckets[g].items():
+                    self.buckets[g][key] = b
+                    rows.append((g, key, json.dumps(b, ensure_ascii=False)))
+            if engine.last_ts is not None:
+                self.last_ts, self.last_behavior = engine.last_ts, engine.last_behavior
+                self.focus_started, self.negative_streak = engine.focus_started, engine.negative_streak
+            self._prune()
+        self.store.replace_rollups(rows)
+        return len(rows)
+
+    # --- 离线重建 ---
+
+    def rebuild(self, start: datetime = None, end: datetime = None) -> int:
+        """
+        从原始观察记录重新计算统计（例如导入旧版JSONL之后），返回写入的分桶数。
+        仅用于迁移；正常运行时统计是增量维护的。
+        """
+        engine = RollupEngine(self.store)
+        engine.loaded = True          # 从零开始累计，不载入已有分桶
+        engine._prune = lambda: None  # 重建时保留全部分桶
+        for obs in self.store.query(start, end):
+            engine.add(obs, persist=False)
+        rows = [(g, key, json.dumps(b, ensure_ascii=False))
+                for g, items in engine.buckets.items() for key, b in items.items()]
+        self.store.replace_rollups(rows)
+        return len(rows)
+
+
+def format_rollup(bucket: dict) -> str:
+    """把一个分桶格式化为简短的中文统计文本，供prompt使用。"""
+    if not bucket["count"]:
+        return "暂无统计数据。"
+    minutes = lambda s: f"{s / 60:.0f}分钟"
+    behaviors = sorted(bucket["behavior_seconds"].items(), key=lambda kv: -kv[1])
+    emotions = sorted(bucket["emotion_counts"].items(), key=lambda kv: -kv[1])
+    transitions = sorted(bucket["transitions"].items(), key=lambda kv: -kv[1])[:3]
+    lines = [
+        f"观察次数: {bucket['count']}",
+        "各行为时长: " + ("、".join(f"{b} {minutes(s)}" for b, s in behaviors) or "无"),
+        "情绪分布: " + "、".join(f"{e} {n}次" for e, n in emotions),
+        f"最长连续专注: {minutes(bucket['longest_focus_seconds'])}",
+    ]
+    if transitions:
+        lines.append("常见的行为切换: " + "、".join(f"{t} {n}次" for t, n in transitions))
+    return "\n".join(lines)
+
+
+# 进程级单例：主应用写入，图表、报表和prompt读取
+rollup_engine = RollupEngine()
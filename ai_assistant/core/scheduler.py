@@ -0,0 +1,239 @@
+# ai_assistant/core/scheduler.py
+
+import itertools
+import threading
+import time
+
+from ai_assistant.utils import config
+from ai_assistant.utils.metrics import RollingStats, CounterGroup
+
+
+class JobCancelled(Exception):
+    """任务被更高优先级的任务抢占或被显式取消时抛出。"""
+    pass
+
+
+class Job:
+    """
+    调度器中的一个任务。
+    处理函数应在耗时步骤之间检查 cancelled，或通过 add_cancel_callback 注册
+    能中断阻塞操作的回调（例如关闭正在读取的HTTP流）。
+    """
+
+    def __init__(self, job_id: int, priority: int, msg_type: str, content: dict, lane: str):
+        self.id = job_id
+        self.priority = priority
+        self.msg_type = msg_type
+        self.content = content
+        self.lane = lane
+        self.created_at = time.time()
+        self.cancel_reason = None
+        self.finished = threading.Event()  # 处理函数执行结束（无论成功、失败或取消），或在开始前被移出队列后置位
+        self._cancel_event = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def cancel(self, reason: str = "cancelled"):
+        """取消任务并执行已注册的取消回调。可以从任意线程调用，重复调用无副作用。"""
+        with self._lock:
+            if self._cancel_event.is_set():
+                return
+            self.cancel_reason = reason
+            self._cancel_event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"执行任务取消回调时出错: {e}")
+
+    def add_cancel_callback(self, callback):
+        """注册取消回调；如果任务已被取消，则立即执行。"""
+        with self._lock:
+            if not self._cancel_event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            raise JobCancelled(self.cancel_reason)
+
+    def sort_key(self):
+        return (self.priority, self.id)
+
+
+class MessageScheduler:
+    """
+    多通道、可抢占的消息调度器，取代原先单线程逐个执行的消息队列。
+    - 语音、关怀、总结、图像分析各自走独立的通道 (lane)，每个通道一个工作线程，
+      共享并发数由 config.SCHEDULER_MAX_CONCURRENT_JOBS 限制，语音通道另有独占名额
+      (SCHEDULER_RESERVED_SLOTS)，不必等关怀、总结或图像分析让出名额；
+    - 任务只在拿到名额的同时才从队列中取出，等待名额期间仍在队列里，可以被抢占；
+    - 新任务到达时，会取消优先级更低（数值更大）且允许被抢占的排队中或执行中的任务，
+      因此用户的语音提问不会再排在一个已经过时的图像分析请求后面；
+    - priority 越小越重要，与原消息队列的约定一致。
+    """
+
+    LANES = {
+        "voice_input": "voice",
+        "special_care_prompt": "care",
+        "daily_summary": "summary",
+        "image_analysis": "vision",
+    }
+
+    def __init__(self, handlers: dict, max_concurrent: int = None):
+        """
+        Args:
+            handlers (dict): {msg_type: handler(content, job)}。
+            max_concurrent (int): 共享的同时执行任务数上限（不含各通道独占的名额）。
+        """
+        self.handlers = handlers
+        self.cond = threading.Condition()
+        self.queues = {lane: [] for lane in set(self.LANES.values())}
+        self.in_flight = {}  # job_id -> Job
+        self.shared_slots = max_concurrent or config.SCHEDULER_MAX_CONCURRENT_JOBS
+        self.reserved_slots = {lane: config.SCHEDULER_RESERVED_SLOTS.get(lane, 0) for lane in self.queues}
+        self.busy_shared = 0
+        self.busy_reserved = {lane: 0 for lane in self.queues}
+        self.running = False
+        self.threads = []
+        self._ids = itertools.count(1)
+
+        # --- 指标 ---
+        self.queue_wait_stats = {lane: RollingStats() for lane in self.queues}
+        self.counts = CounterGroup()
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        for lane in self.queues:
+            t = threading.Thread(target=self._lane_worker, args=(lane,), name=f"lane-{lane}", daemon=True)
+            t.start()
+            self.threads.append(t)
+        print(f"消息调度器已启动，通道: {', '.join(sorted(self.queues))}。")
+
+    def submit(self, priority: int, msg_type: str, content: dict) -> Job:
+        """提交一个任务，并抢占比它不重要的任务。返回 Job 以便调用方之后取消。"""
+        lane = self.LANES.get(msg_type)
+        if lane is None:
+            raise ValueError(f"未知的消息类型: {msg_type}")
+        job = Job(next(self._ids), priority, msg_type, content, lane)
+        with self.cond:
+            self._preempt_lower_priority(job)
+            self.queues[lane].append(job)
+            self.queues[lane].sort(key=Job.sort_key)
+            self.counts.incr("submitted")
+            self.cond.notify_all()
+        return job
+
+    def _preempt_lower_priority(self, new_job: Job):
+        """[持有锁时调用] 取消优先级更低且允许被抢占的任务。"""
+        preemptible = config.SCHEDULER_PREEMPTIBLE_TYPES
+        for lane, jobs in self.queues.items():
+            kept = []
+            for job in jobs:
+                if job.msg_type in preemptible and job.priority > new_job.priority:
+                    job.cancel(f"被 {new_job.msg_type} 抢占")
+                    job.finished.set()  # 不会再被通道线程取出，由这里标记结束
+                    self.counts.incr("cancelled_queued")
+                else:
+                    kept.append(job)
+            self.queues[lane] = kept
+        for job in list(self.in_flight.values()):
+            if job.msg_type in preemptible and job.priority > new_job.priority and not job.cancelled:
+                print(f"{new_job.msg_type} 到达，取消进行中的 {job.msg_type} 任务 #{job.id}。")
+                job.cancel(f"被 {new_job.msg_type} 抢占")
+                self.counts.incr("cancelled_in_flight")
+
+    def cancel(self, job: Job, reason: str = "cancelled"):
+        """显式取消某个任务（排队中或执行中）。"""
+        with self.cond:
+            queue_ = self.queues[job.lane]
+            dequeued = job in queue_
+            if dequeued:
+                queue_.remove(job)
+                self.counts.incr("cancelled_queued")
+            elif job.id in self.in_flight:
+                self.counts.incr("cancelled_in_flight")
+        job.cancel(reason)
+        if dequeued:
+            job.finished.set()
+
+    def _take_slot(self, lane: str):
+        """[持有锁时调用] 为通道取一个执行名额，先用独占名额再用共享名额；没有空闲名额时返回 None。"""
+        if self.busy_reserved[lane] < self.reserved_slots[lane]:
+            self.busy_reserved[lane] += 1
+            return "reserved"
+        if self.busy_shared < self.shared_slots:
+            self.busy_shared += 1
+            return "shared"
+        return None
+
+    def _release_slot(self, lane: str, slot: str):
+        """[持有锁时调用] 归还名额并唤醒等待名额的通道。"""
+        if slot == "reserved":
+            self.busy_reserved[lane] -= 1
+        else:
+            self.busy_shared -= 1
+        self.cond.notify_all()
+
+    def _lane_worker(self, lane: str):
+        """[通道线程] 按优先级取出本通道的任务并执行。"""
+        while self.running:
+            with self.cond:
+                # 等到既有任务又有名额；等待期间任务留在队列中，抢占和取消都能看到它
+                slot = None
+                while self.running and (not self.queues[lane] or (slot := self._take_slot(lane)) is None):
+                    self.cond.wait()
+                if not self.running:
+                    if slot:
+                        self._release_slot(lane, slot)
+                    break
+                job = self.queues[lane].pop(0)
+                self.in_flight[job.id] = job
+
+            try:
+                if job.cancelled:
+                    continue
+                self.queue_wait_stats[lane].add(time.time() - job.created_at)
+                try:
+                    self.handlers[job.msg_type](job.content, job)
+                    self.counts.incr("completed")
+                except JobCancelled:
+                    print(f"任务 #{job.id} ({job.msg_type}) 已取消: {job.cancel_reason}")
+                except Exception as e:
+                    self.counts.incr("failed")
+                    print(f"消息处理错误 ({job.msg_type}): {e}")
+            finally:
+                with self.cond:
+                    self.in_flight.pop(job.id, None)
+                    self._release_slot(lane, slot)
+                job.finished.set()
+
+    def get_stats(self) -> dict:
+        return {
+            "counts": self.counts.snapshot(),
+            "queue_wait": {lane: stats.snapshot() for lane, stats in self.queue_wait_stats.items()},
+        }
+
+    def stop(self):
+        """停止所有通道，取消排队中和执行中的任务。"""
+        with self.cond:
+            self.running = False
+            for jobs in self.queues.values():
+                for job in jobs:
+                    job.cancel("应用关闭")
+                    job.finished.set()
+                jobs.clear()
+            for job in self.in_flight.values():
+                job.cancel("应用关闭")
+            self.cond.notify_all()
+        for t in self.threads:
+            t.join(timeout=1.0)
+        print(f"消息调度器已停止。统计: {self.counts.snapshot()}")
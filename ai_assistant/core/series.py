@@ -0,0 +1,154 @@
+# ai_assistant/core/series.py
+
+import threading
+from datetime import datetime
+
+import numpy as np
+
+from ai_assistant.utils import config
+
+
+class ObservationSeries:
+    """
+    进程内共享的观察时间序列：基于numpy数组的环形缓冲区，线程安全。
+    - 时间戳以 int64 毫秒保存，行为用行为编号 (int8)，情绪用整数编码 (int8)，
+      默认容量 (OBSERVATION_SERIES_CAPACITY) 足够放下一整天，只占约两百KB；
+    - 提供向量化的窗口查询：次数、时长、最近一次变化的时间、末尾连续次数；
+    - 图表等使用方通过 subscribe 订阅新观察，而不是各自维护一份列表。
+    """
+
+    def __init__(self, capacity: int = None):
+        self.capacity = capacity or config.OBSERVATION_SERIES_CAPACITY
+        self.ts = np.zeros(self.capacity, dtype=np.int64)
+        self.behavior = np.zeros(self.capacity, dtype=np.int8)
+        self.emotion = np.zeros(self.capacity, dtype=np.int8)
+        self.behavior_names = {0: "未识别"}   # 行为编号 -> 行为描述
+        self.emotion_names = []               # 情绪编码 -> 情绪
+        self.emotion_codes = {}               # 情绪 -> 情绪编码
+        self.head = 0                         # 下一条写入的位置
+        self.size = 0
+        self.version = 0                      # 每写入一条加一，使用方可据此判断数据是否变化
+        self.lock = threading.RLock()
+        self.subscribers = []
+
+    # --- 写入与订阅 ---
+
+    def add(self, observation: dict):
+        """[任意线程] 追加一条观察，写满后覆盖最旧的一条，然后通知订阅者。"""
+        num = observation["behavior_num"]
+        code = int(num) if str(num).isdigit() and int(num) < 128 else 0
+        with self.lock:
+            self.behavior_names.setdefault(code, observation["behavior_desc"])
+            self.ts[self.head] = int(observation["timestamp"].timestamp() * 1000)
+            self.behavior[self.head] = code
+            self.emotion[self.head] = self._emotion_code(observation["emotion"])
+            self.head = (self.head + 1) % self.capacity
+            self.size = min(self.size + 1, self.capacity)
+            self.version += 1
+            subscribers = list(self.subscribers)
+        for callback in subscribers:
+            try:
+                callback(observation)
+            except Exception as e:
+                print(f"观察序列订阅者处理出错: {e}")
+
+    def _emotion_code(self, emotion: str) -> int:
+        code = self.emotion_codes.get(emotion)
+        if code is None:
+            code = self.emotion_codes[emotion] = len(self.emotion_names)
+            self.emotion_names.append(emotion)
+        return code
+
+    def subscribe(self, callback):
+        """注册回调 callback(observation)，每条新观察写入后在写入线程中调用。"""
+        with self.lock:
+            self.subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        with self.lock:
+            if callback in self.subscribers:
+                self.subscribers.remove(callback)
+
+    def __len__(self):
+        return self.size
+
+    # --- 窗口查询 ---
+
+    def _ordered(self) -> tuple:
+        """[持有锁时调用] 按时间顺序返回三个数组的副本。"""
+        start = (self.head - self.size) % self.capacity
+        if start + self.size <= self.capacity:
+            sl = slice(start, start + self.size)
+            return self.ts[sl].copy(), self.behavior[sl].copy(), self.emotion[sl].copy()
+        order = np.r_[start:self.capacity, 0:self.head]
+        return self.ts[order], self.behavior[order], self.emotion[order]
+
+    def window(self, start: datetime = None, end: datetime = None, last: int = None) -> tuple:
+        """
+        返回 [start, end) 范围内（或最近 last 条）的 (时间戳毫秒, 行为编号, 情绪编码) 三个数组。
+        """
+        with self.lock:
+            ts, behavior, emotion = self._ordered()
+        lo = np.searchsorted(ts, int(start.timestamp() * 1000)) if start else 0
+        hi = np.searchsorted(ts, int(end.timestamp() * 1000)) if end else len(ts)
+        if last is not None:
+            lo = max(lo, hi - last)
+        return ts[lo:hi], behavior[lo:hi], emotion[lo:hi]
+
+    def latest(self, n: int = 1) -> list:
+        """最近 n 条观察，结构与实时观察相同（不含分析原文），按时间排序。"""
+        ts, behavior, emotion = self.window(last=n)
+        return [{"timestamp": datetime.fromtimestamp(t / 1000), "behavior_num": str(b),
+                 "behavior_desc": self.behavior_names.get(int(b), "未识别"), "emotion": self.emotion_names[e]}
+                for t, b, e in zip(ts.tolist(), behavior.tolist(), emotion.tolist())]
+
+    def behavior_counts(self, start: datetime = None, end: datetime = None) -> dict:
+        """窗口内各行为的观察次数 {行为编号(str): 次数}。"""
+        _, behavior, _ = self.window(start, end)
+        counts = np.bincount(behavior.astype(np.int64), minlength=1)
+        return {str(code): int(n) for code, n in enumerate(counts) if n}
+
+    def emotion_counts(self, start: datetime = None, end: datetime = None) -> dict:
+        """窗口内各情绪的观察次数 {情绪: 次数}。"""
+        _, _, emotion = self.window(start, end)
+        counts = np.bincount(emotion.astype(np.int64), minlength=1)
+        return {self.emotion_names[code]: int(n) for code, n in enumerate(counts) if n}
+
+    def behavior_durations(self, start: datetime = None, end: datetime = None) -> dict:
+        """
+        窗口内各行为的累计时长（秒）{行为编号(str): 秒}。
+        与统计引擎的口径一致：相邻两次观察的间隔计入前一次的行为，超过 ROLLUP_MAX_GAP_SECONDS 的间隔视为离开。
+        """
+        ts, behavior, _ = self.window(start, end)
+        if len(ts) < 2:
+            return {}
+        gaps = np.diff(ts) / 1000.0
+        gaps[(gaps <= 0) | (gaps > config.ROLLUP_MAX_GAP_SECONDS)] = 0
+        seconds = np.bincount(behavior[:-1].astype(np.int64), weights=gaps)
+        return {str(code): float(s) for code, s in enumerate(seconds) if s}
+
+    def last_change(self, field: str = "behavior"):
+        """当前行为（或情绪，field="emotion"）从什么时候开始的；没有数据时返回 None。"""
+        ts, behavior, emotion = self.window()
+        values = behavior if field == "behavior" else emotion
+        if not len(values):
+            return None
+        changed = np.flatnonzero(values != values[-1])
+        first = changed[-1] + 1 if len(changed) else 0
+        return datetime.fromtimestamp(ts[first] / 1000)
+
+    def run_length(self, field: str = "behavior") -> int:
+        """末尾连续相同行为（或情绪）的观察次数。"""
+        _, behavior, emotion = self.window()
+        values = behavior if field == "behavior" else emotion
+        if not len(values):
+            return 0
+        changed = np.flatnonzero(values != values[-1])
+        return int(len(values) - (changed[-1] + 1 if len(changed) else 0))
+
+    def memory_bytes(self) -> int:
+        return self.ts.nbytes + self.behavior.nbytes + self.emotion.nbytes
+
+
+# 进程级单例：摄像头分析结果写入，主应用、预生成回复和图表读取
+observation_series = ObservationSeries()
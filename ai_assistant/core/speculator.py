@@ -0,0 +1,164 @@
+# ai_assistant/core/speculator.py
+
+import asyncio
+import threading
+import time
+
+from ai_assistant.core.api_clients import async_deepseek_client, synthesize_speech
+from ai_assistant.core.async_runtime import runtime
+from ai_assistant.core.conversation import estimate_message_tokens
+from ai_assistant.core.governor import governor
+from ai_assistant.core.http_transport import call_with_retry
+from ai_assistant.utils import config
+from ai_assistant.utils.metrics import CounterGroup
+
+
+WORK_BEHAVIOR = "认真专注工作"
+
+# 优先级低于所有前台任务，只使用限流器中的非预留额度
+SPECULATION_PRIORITY = 3
+
+
+class SpeculatedReply:
+    """一条预生成的候选回复：文本 + 已合成的语音。"""
+
+    def __init__(self, key: tuple, prompt: str, text: str, audio):
+        self.key = key
+        self.prompt = prompt
+        self.text = text
+        self.audio = audio
+        self.created_at = time.time()
+
+    def expired(self, now=None) -> bool:
+        return (now or time.time()) - self.created_at > config.SPECULATOR_TTL_SECONDS
+
+
+def predict_transitions(series) -> list:
+    """
+    根据共享观察序列中的最近记录，推测接下来最可能出现、且值得说点什么的状态 (行为, 情绪)。
+    - 正在专注工作 -> 拿起手机；
+    - 连续专注了很久 -> 出现疲惫；
+    - 正在做别的事 -> 回到工作。
+    返回按可能性排序的候选列表，长度不超过 SPECULATOR_MAX_CANDIDATES。
+    """
+    latest = series.latest()
+    if not latest:
+        return []
+    behavior, emotion = latest[0]["behavior_desc"], latest[0]["emotion"]
+
+    candidates = []
+    if behavior == WORK_BEHAVIOR:
+        if series.run_length() >= config.SPECULATOR_FOCUS_STREAK and emotion != "疲惫":
+            candidates.append((WORK_BEHAVIOR, "疲惫"))
+        candidates.append(("玩手机", emotion))
+    else:
+        candidates.append((WORK_BEHAVIOR, emotion))
+    return candidates[:config.SPECULATOR_MAX_CANDIDATES]
+
+
+class ReplySpeculator:
+    """
+    利用空闲时间预先生成并合成“下一次状态变化”时最可能用到的陪伴回复。
+    真实的观察结果与某个候选一致时，回复可以立即播放，而不用再等 DeepSeek 和 TTS。
+    - 候选缓存很小 (SPECULATOR_CACHE_SIZE) 且有过期时间 (SPECULATOR_TTL_SECONDS)；
+    - 只有在调度器和播放器都空闲、限流器仍有非预留额度时才会预生成；
+    - 统计命中率，以及过期/被挤出而白白花掉的请求数。
+    """
+
+    def __init__(self, app, build_prompt):
+        """
+        Args:
+            app: 主应用实例，需提供 conversation、scheduler、is_playing_audio。
+            build_prompt: 函数 (behavior_desc, emotion) -> str，与真实图像点评使用同一个prompt模板。
+        """
+        self.app = app
+        self.build_prompt = build_prompt
+        self.cache = {}          # (behavior_desc, emotion) -> SpeculatedReply
+        self.in_progress = set()
+        self.lock = threading.Lock()
+        self.counts = CounterGroup()
+
+    def is_idle(self) -> bool:
+        scheduler = self.app.scheduler
+        with scheduler.cond:
+            busy = scheduler.in_flight or any(scheduler.queues.values())
+        return not busy and not self.app.is_playing_audio
+
+    def _prune(self):
+        """[持有锁时调用] 清理过期条目，超出容量时挤掉最旧的条目。"""
+        now = time.time()
+        for key in [k for k, entry in self.cache.items() if entry.expired(now)]:
+            del self.cache[key]
+            self.counts.incr("wasted_expired")
+        while len(self.cache) > config.SPECULATOR_CACHE_SIZE:
+            oldest = min(self.cache, key=lambda k: self.cache[k].created_at)
+            del self.cache[oldest]
+            self.counts.incr("wasted_evicted")
+
+    def maybe_speculate(self, series):
+        """[主线程] 在一次观察之后调用；空闲时为尚未缓存的候选状态启动预生成。"""
+        if not config.SPECULATOR_ENABLED or not self.is_idle():
+            return
+        with self.lock:
+            self._prune()
+            keys = [k for k in predict_transitions(series)
+                    if k not in self.cache and k not in self.in_progress]
+            self.in_progress.update(keys)
+        for key in keys:
+            runtime.submit(self._speculate(key))
+
+    def take(self, behavior_desc: str, emotion: str):
+        """[主线程] 真实状态出现时取出匹配的预生成回复（取出后即从缓存删除），没有则返回 None。"""
+        with self.lock:
+            self._prune()
+            entry = self.cache.pop((behavior_desc, emotion), None)
+        self.counts.incr("hits" if entry else "misses")
+        return entry
+
+    async def _speculate(self, key: tuple):
+        """[事件循环] 为一个候选状态生成回复文本并合成语音，放入缓存。"""
+        behavior_desc, emotion = key
+        try:
+            prompt = self.build_prompt(behavior_desc, emotion)
+            # 使用与真实请求相同的上下文布局，前缀可以命中DeepSeek的上下文缓存；
+            # 只读组装：不移出历史、不触发摘要、不计入统计，命中后才由调用方 commit_turn
+            messages = self.app.conversation.peek_messages(prompt)
+            if not governor.admit("deepseek", SPECULATION_PRIORITY, cost=estimate_message_tokens(messages)):
+                return
+            response = await call_with_retry("deepseek", lambda: async_deepseek_client.chat.completions.create(
+                model="deepseek-chat", messages=messages, stream=False
+            ))
+            self.counts.incr("generated")
+            if response.usage:
+                governor.record("deepseek", response.usage.total_tokens)
+            text = response.choices[0].message.content.strip()
+            if not text:
+                return
+
+            audio = None
+            if governor.admit("tts", SPECULATION_PRIORITY, cost=len(text)):
+                audio_bytes = await synthesize_speech(text)
+                governor.record("tts", len(text))
+                audio = await asyncio.to_thread(self.app.audio_player.decode_audio, audio_bytes)
+
+            with self.lock:
+                self.cache[key] = SpeculatedReply(key, prompt, text, audio)
+                self._prune()
+            print(f"已预生成候选回复: {behavior_desc}/{emotion}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.counts.incr("failed")
+            print(f"预生成候选回复时出错: {e}")
+        finally:
+            with self.lock:
+                self.in_progress.discard(key)
+
+    def get_stats(self) -> dict:
+        counts = self.counts.snapshot()
+        lookups = counts.get("hits", 0) + counts.get("misses", 0)
+        return {
+            "counts": counts,
+            "hit_rate": counts.get("hits", 0) / lookups if lookups else None,
+            "wasted_calls": counts.get("wasted_expired", 0) + counts.get("wasted_evicted", 0),
+        }
@@ -2,6 +2,7 @@
 import cv2
 import time
 import io
+import asyncio
 import threading
 from PIL import Image
 from datetime import datetime
@@ -9,7 +10,10 @@ import logging
 import oss2
 
 # 从我们自己的包里导入所需模块
-from ai_assistant.core.api_clients import qwen_client, oss_bucket
+from ai_assistant.core.api_clients import async_qwen_client, oss_put_object
+from ai_assistant.core.http_transport import call_with_retry, HedgedRequester
+from ai_assistant.core.async_runtime import runtime
+from ai_assistant.core.governor import governor
 from ai_assistant.utils.helpers import extract_behavior_type, extract_emotion_type
 from ai_assistant.ui.camera_window import CameraWindow
 from ai_assistant.utils import config
@@ -33,6 +37,8 @@ class WebcamHandler:
         self.webcam_thread = None
         self.last_webcam_image = None
         self.camera_window = None
+        # 视觉模型请求的对冲器，用于削减长尾延迟
+        self.vl_hedger = HedgedRequester("qwen-vl")
 
     def start(self) -> bool:
         """启动摄像头捕获进程，并开始后台分析循环。"""
@@ -70,6 +76,7 @@ class WebcamHandler:
         if self.camera_window and self.camera_window.winfo_exists():
             self.camera_window.destroy()
         self.camera_window = None
+        print(f"视觉分析对冲统计: {self.vl_hedger.get_stats()}")
         print("WebcamHandler 已成功停止。")
 
     def _process_webcam_frames(self):
@@ -109,27 +116,32 @@ class WebcamHandler:
         if self.running and not self.paused and not self.processing:
             print(f"[{time.strftime('%H:%M:%S')}] 触发新一轮图像分析")
             
-            # 将耗时的分析任务放入一个新线程，以防阻塞UI
-            analysis_thread = threading.Thread(target=self._capture_and_analyze_pipeline)
-            analysis_thread.daemon = True
-            analysis_thread.start()
+            # 将耗时的分析流程交给后台事件循环，以防阻塞UI
+            self.processing = True
+            runtime.submit(self._capture_and_analyze_pipeline())
 
-    def _capture_and_analyze_pipeline(self):
-        """[分析线程] 执行完整的“捕获->上传->分析->回调”流程。"""
+    async def _capture_and_analyze_pipeline(self):
+        """[事件循环] 执行完整的“捕获->上传->分析->回调”流程。"""
         self.processing = True
         try:
+            # 图像分析是最不重要的云端调用，超出速率或预算时直接跳过本轮，连截图上传也省掉
+            if not governor.admit("qwen", priority=2, cost=config.GOVERNOR_VL_ESTIMATED_TOKENS):
+                self.app.update_status("图像分析已限流，稍后继续")
+                return
+
             self.app.update_status("正在捕捉图像...")
-            screenshots, current_screenshot = self._capture_screenshots()
+            # 读取摄像头是阻塞操作，放到线程池中执行，不占用事件循环
+            screenshots, current_screenshot = await asyncio.to_thread(self._capture_screenshots)
             if not screenshots:
                 raise ValueError("未能捕获有效截图")
                 
             self.app.update_status("正在上传图像...")
-            screenshot_urls = self._upload_screenshots(screenshots)
+            screenshot_urls = await self._upload_screenshots(screenshots)
             if not screenshot_urls:
                 raise ValueError("上传截图失败")
 
             self.app.update_status("正在分析图像...")
-            analysis_text = self._get_image_analysis(screenshot_urls)
+            analysis_text = await self._get_image_analysis(screenshot_urls)
             if not analysis_text:
                 raise ValueError("图像分析返回空结果")
 
@@ -137,22 +149,24 @@ class WebcamHandler:
             behavior_num, behavior_desc = extract_behavior_type(analysis_text)
             emotion = extract_emotion_type(analysis_text)
             
-            # 记录到日志文件
+            # 完整的观察记录由主应用写入 observation_store，文本日志只记一行摘要（由后台写线程批量写入）
             timestamp = datetime.now()
-            log_message = f"{timestamp.strftime('%Y-%m-%d %H:%M:%S')} - BEHAVIOR: {behavior_desc} ({behavior_num}) - EMOTION: {emotion} - DETAIL: {analysis_text}"
-            logging.info(log_message)
-            
+            logging.info(f"BEHAVIOR: {behavior_desc} ({behavior_num}) - EMOTION: {emotion}")
+
             # *** 关键一步：通过回调函数将结果传递给主应用 ***
             # WebcamHandler不关心结果如何被使用，它只负责产生结果。~！！！！！！！！！！！！！！
+            # 回调会操作界面，因此通过 after 交给Tk主线程执行，而不是在事件循环线程中直接调用。
 
-            self.app.handle_analysis_result(
-                timestamp, analysis_text, behavior_num, behavior_desc, 
+            self.app.after(
+                0, self.app.handle_analysis_result,
+                timestamp, analysis_text, behavior_num, behavior_desc,
                 emotion, current_screenshot
             )
 
         except Exception as e:
             error_msg = f"捕获与分析流程出错: {e}"
             print(error_msg)
+            logging.warning(error_msg)
             self.app.update_status(error_msg)
         finally:
             # 无论成功或失败，都必须重置processing状态并安排下一次捕获
@@ -171,7 +185,7 @@ class WebcamHandler:
 
 
     def _capture_screenshots(self, num_shots=4, interval=0.1) -> tuple:
-        """[分析线程] 从摄像头捕获多张连续截图以模拟动态信息。"""
+        """[线程池] 从摄像头捕获多张连续截图以模拟动态信息。"""
         screenshots = []
         # --- 关键修正：直接从摄像头硬件读取，确保每一帧都是新的 ---
         for _ in range(num_shots):
@@ -185,30 +199,46 @@ class WebcamHandler:
         
         return screenshots, self.last_webcam_image
 
-    def _upload_screenshots(self, screenshots: list) -> list:
-        """[分析线程] 将截图列表上传到OSS并返回URLs。"""
-        oss_urls = []
-        for i, img in enumerate(screenshots):
-            # 将PIL Image对象转换为内存中的JPEG字节流
-            buffer = io.BytesIO()
-            img.save(buffer, format='JPEG')
-            buffer.seek(0)
-            
-            object_key = f"screenshots/{int(time.time())}_{i}.jpg"
-            result = oss_bucket.put_object(object_key, buffer)
-            
+    async def _upload_screenshots(self, screenshots: list) -> list:
+        """[事件循环] 将截图列表并发上传到OSS，按原顺序返回上传成功的URLs。"""
+        batch_time = int(time.time())
+
+        async def upload_one(i, img):
+            # 将PIL Image对象转换为内存中的JPEG字节流（编码较耗CPU，放到线程池）
+            buffer = await asyncio.to_thread(self._encode_jpeg, img)
+            object_key = f"screenshots/{batch_time}_{i}.jpg"
+            result = await oss_put_object(object_key, buffer)
             if result.status == 200:
-                url = f"https://{config.OSS_BUCKET}.{config.OSS_ENDPOINT}/{object_key}"
-                oss_urls.append(url)
+                return f"https://{config.OSS_BUCKET}.{config.OSS_ENDPOINT}/{object_key}"
+            return None
+
+        # 多张截图同时上传，总耗时约等于最慢的一张，而不是逐张累加
+        results = await asyncio.gather(
+            *(upload_one(i, img) for i, img in enumerate(screenshots)),
+            return_exceptions=True
+        )
+        oss_urls = []
+        for r in results:
+            if isinstance(r, Exception):
+                print(f"上传截图失败: {r}")
+            elif r:
+                oss_urls.append(r)
         return oss_urls
 
+    @staticmethod
+    def _encode_jpeg(img: Image.Image) -> io.BytesIO:
+        buffer = io.BytesIO()
+        img.save(buffer, format='JPEG')
+        buffer.seek(0)
+        return buffer
+
 
 # url = f"https://{config.OSS_BUCKET}.{config.OSS_ENDPOINT}/{object_key}"
 # 这是在做什么？
 # 这行代码是根据OSS的规则，拼接出一个完整的、可以通过互联网访问的公开URL地址。
 
-    def _get_image_analysis(self, image_urls: list) -> str:
-        """[分析线程] 调用Qwen-VL API分析图像，同时获取行为和情感。"""
+    async def _get_image_analysis(self, image_urls: list) -> str:
+        """[事件循环] 调用Qwen-VL API分析图像，同时获取行为和情感。"""
         system_prompt = (
             "详细观察这个人的行为和面部情感和表情。行为需判断为：1.认真专注工作, 2.吃东西, "
             "3.用杯子喝水, 4.喝饮料, 5.玩手机, 6.睡觉, 7.其他。情感需判断为：开心、"
@@ -228,10 +258,20 @@ class WebcamHandler:
             }
         ]
         
-        completion = qwen_client.chat.completions.create(
-            model="qwen-vl-max",
-            messages=messages,
-        )
+        # 图像分析没有副作用，失败时可以重试，慢的时候也可以对冲
+        def make_call():
+            return call_with_retry("qwen", lambda: async_qwen_client.chat.completions.create(
+                model="qwen-vl-max",
+                messages=messages,
+            ))
+
+        if config.VL_HEDGE_ENABLED:
+            completion = await self.vl_hedger.run(make_call, service="qwen", priority=2,
+                                                  cost=config.GOVERNOR_VL_ESTIMATED_TOKENS)
+        else:
+            completion = await make_call()
+        if completion.usage:
+            governor.record("qwen", completion.usage.total_tokens)
         return completion.choices[0].message.content
 
     def toggle_pause(self):
@@ -2,87 +2,203 @@
 
 import customtkinter as ctk
 from matplotlib.figure import Figure
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
+from matplotlib.patches import Wedge
 import matplotlib.dates as mdates
 from datetime import datetime, timedelta
+import math
 import threading
 import time
 
+import numpy as np
+
+from ai_assistant.core.observation_store import observation_store
+from ai_assistant.core.rollups import merge_buckets
+from ai_assistant.core.series import observation_series
+from ai_assistant.ui.figures import BEHAVIOR_LABELS, BEHAVIOR_COLORS, DESC_TO_NUM, seconds_by_behavior, to_datenums
+from ai_assistant.utils import config
+from ai_assistant.utils.downsample import lttb
+from ai_assistant.utils.metrics import CounterGroup, RollingStats
+
+
+class _Blitter:
+    """
+    管理一个画布上的动态图元（animated=True）：
+    完整重绘时（首次显示、窗口缩放、坐标轴范围变化）保存不含动态图元的背景，
+    之后只需恢复背景、重画动态图元并 blit，不再重新绘制坐标轴、刻度和图例。
+    """
+
+    def __init__(self, canvas, artists: list):
+        self.canvas = canvas
+        self.artists = artists
+        self.background = None
+        for artist in artists:
+            artist.set_animated(True)
+        canvas.mpl_connect("draw_event", self._on_draw)
+
+    def _on_draw(self, event):
+        self.background = self.canvas.copy_from_bbox(self.canvas.figure.bbox)
+        self._draw_artists()
+
+    def _draw_artists(self):
+        for artist in self.artists:
+            self.canvas.figure.draw_artist(artist)
+
+    def update(self) -> bool:
+        """只重画动态图元；还没有可用的背景时退回完整重绘。返回是否使用了blit。"""
+        if self.background is None:
+            self.canvas.draw()
+            return False
+        self.canvas.restore_region(self.background)
+        self._draw_artists()
+        self.canvas.blit(self.canvas.figure.bbox)
+        return True
+
+
 class BehaviorVisualizer:
     """
     一个UI组件，用于处理和显示行为数据的可视化图表。
-    它在自己的后台线程中定期刷新，以避免阻塞主UI线程。
+    - 订阅共享观察序列，只有数据变化后才重绘，空闲时几乎没有开销；
+    - 坐标轴、刻度、图例和布局只创建一次（布局在窗口缩放时重新计算），
+      刷新时用 set_data / 修改扇形角度原地更新图元，再通过 blit 只重画变化的部分；
+    - 记录每次重绘耗时以及跳过的刷新次数；
+    - 除“实时”外还可以查看最近1小时到1个月的历史：时间线从数据库加载后按当前可见范围
+      用LTTB降采样到 CHART_MAX_POINTS 个点，行为分布直接取预聚合统计，平移缩放时只重新降采样。
     """
-    
-    def __init__(self, parent_frame):
+
+    # 长时间范围视图的可选范围
+    HISTORY_RANGES = {
+        "1小时": timedelta(hours=1),
+        "1天": timedelta(days=1),
+        "1周": timedelta(weeks=1),
+        "1月": timedelta(days=30),
+    }
+
+    def __init__(self, parent_frame, rollups=None, series=None, store=None):
+        """
+        Args:
+            parent_frame: 放置图表的父容器。
+            rollups: 可选的 RollupEngine。提供时，饼图显示今天各行为的累计时长（来自统计引擎），
+                     否则退回到共享观察序列中的观察次数。
+            series: 共享的观察时间序列，默认为进程级单例 observation_series。
+            store: 读取历史观察的 ObservationStore，默认为进程级单例 observation_store。
+        """
         self.parent_frame = parent_frame
-        # 定义行为及其对应的颜色，方便统一管理
-        self.behavior_map = {
-            "1": "专注工作", "2": "吃东西", "3": "喝水", "4": "喝饮料",
-            "5": "玩手机", "6": "睡觉", "7": "其他", "0": "未识别"
-        }
-        self.behavior_colors = {
-            "1": "#4CAF50", "2": "#FFC107", "3": "#2196F3", "4": "#9C27B0",
-            "5": "#F44336", "6": "#607D8B", "7": "saddlebrown", "0": "#9E9E9E"
-        }
-        
-        # 数据存储
-        self.behavior_history = []  # 存储元组 (timestamp, behavior_num)
-        self.behavior_counts = {key: 0 for key in self.behavior_map}
-        self.data_lock = threading.Lock() # 线程锁，用于保护共享数据
-        
+        self.rollups = rollups
+        self.series = series if series is not None else observation_series
+        self.store = store or observation_store
+        self.history = None          # 长时间范围视图的数据；None 表示“实时”
+        self.history_render_id = None
+        # 行为及其对应的颜色，与离线导出 (ui/figures.py) 共用
+        self.behavior_map = BEHAVIOR_LABELS
+        self.behavior_colors = BEHAVIOR_COLORS
+        self.desc_to_num = DESC_TO_NUM
+
+        # 折线图显示的最近观察数；数据本身保存在共享观察序列中，这里不再单独保存一份
+        self.line_points = 100
+        self.data_changed = threading.Event()
+        self.counts = CounterGroup()
+        self.redraw_ms = RollingStats()
+
         self._setup_charts_ui()
-        
+        self.series.subscribe(self._on_new_observation)
+
         # 启动后台更新线程
         self.running = True
+        self.stop_event = threading.Event()
         self.update_thread = threading.Thread(target=self._update_charts_loop)
         self.update_thread.daemon = True
         self.update_thread.start()
 
     def _setup_charts_ui(self):
-        """创建并配置图表的UI元素。"""
+        """创建图表的UI元素，以及之后只需原地更新的图元。"""
         charts_frame = ctk.CTkFrame(self.parent_frame, fg_color="transparent")
         charts_frame.pack(fill="both", expand=True)
         charts_frame.grid_columnconfigure(0, weight=3) # 折线图占3/4空间
         charts_frame.grid_columnconfigure(1, weight=1) # 饼图占1/4空间
-        charts_frame.grid_rowconfigure(0, weight=1)
+        charts_frame.grid_rowconfigure(1, weight=1)
+
+        # --- 显示范围选择 ---
+        self.range_selector = ctk.CTkSegmentedButton(charts_frame, values=["实时", *self.HISTORY_RANGES],
+                                                     command=self._on_range_selected)
+        self.range_selector.set("实时")
+        self.range_selector.grid(row=0, column=0, sticky="w", pady=(5, 0))
 
         # --- 折线图 ---
         self.line_fig = Figure(figsize=(7, 4), dpi=100)
         self.line_fig.patch.set_facecolor('#242424')
         self.line_ax = self.line_fig.add_subplot(111, facecolor='#242424')
         self.line_canvas = FigureCanvasTkAgg(self.line_fig, master=charts_frame)
-        self.line_canvas.get_tk_widget().grid(row=0, column=0, sticky="nsew", padx=(0, 5), pady=5)
+        self.line_canvas.get_tk_widget().grid(row=1, column=0, sticky="nsew", padx=(0, 5), pady=5)
+        # 平移/缩放工具栏；历史视图下可见范围变化后重新降采样
+        self.toolbar = NavigationToolbar2Tk(self.line_canvas, charts_frame, pack_toolbar=False)
+        self.toolbar.grid(row=2, column=0, sticky="w")
+
+        ax = self.line_ax
+        ax.set_title("行为随时间变化", color='white')
+        ax.set_xlabel("时间", color='white')
+        ax.tick_params(axis='x', colors='white', rotation=30)
+        ax.tick_params(axis='y', colors='white')
+        for spine in ax.spines.values():
+            spine.set_edgecolor('gray')
+        ax.set_yticks(range(1, 8))
+        ax.set_yticklabels([self.behavior_map[str(i)] for i in range(1, 8)])
+        ax.set_ylim(0.5, 7.5)
+        ax.xaxis_date()
+        ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M:%S'))
+        ax.grid(True, linestyle='--', alpha=0.2, color='gray')
+        now = datetime.now()
+        ax.set_xlim(mdates.date2num(now - timedelta(minutes=5)), mdates.date2num(now + timedelta(minutes=5)))
+        self.line, = ax.plot([], [], color='gray', linestyle='--', alpha=0.5, marker='o', markersize=4)
+        self.line_blitter = _Blitter(self.line_canvas, [self.line])
+        ax.callbacks.connect("xlim_changed", self._on_xlim_changed)
 
-        # --- 饼图 ---
+        # --- 饼图：为每种行为预先创建扇形和百分比标签，刷新时只修改角度和文字 ---
         self.pie_fig = Figure(figsize=(3.5, 4), dpi=100)
         self.pie_fig.patch.set_facecolor('#242424')
         self.pie_ax = self.pie_fig.add_subplot(111, facecolor='#242424')
         self.pie_canvas = FigureCanvasTkAgg(self.pie_fig, master=charts_frame)
-        self.pie_canvas.get_tk_widget().grid(row=0, column=1, sticky="nsew", padx=(5, 0), pady=5)
-        
-        # 初始绘制一次空图表
+        self.pie_canvas.get_tk_widget().grid(row=1, column=1, sticky="nsew", padx=(5, 0), pady=5)
+
+        ax = self.pie_ax
+        self.pie_title = "今日行为时长分布" if self.rollups else "行为分布"
+        ax.set_title(self.pie_title, color='white')
+        ax.set_xlim(-1.1, 1.1)
+        ax.set_ylim(-1.1, 1.1)
+        ax.set_aspect('equal')
+        ax.axis('off')
+        self.wedges, self.wedge_labels = {}, {}
+        for num in [str(i) for i in range(1, 8)]:
+            self.wedges[num] = ax.add_patch(Wedge((0, 0), 1, 90, 90, facecolor=self.behavior_colors[num],
+                                                  label=self.behavior_map[num]))
+            self.wedge_labels[num] = ax.text(0, 0, "", ha='center', va='center', color='white', fontsize=9)
+        ax.legend(handles=list(self.wedges.values()), title="行为类型",
+                  loc="center left", bbox_to_anchor=(0.95, 0.5),
+                  frameon=False, labelcolor='white', fontsize='small')
+        self.pie_placeholder = ax.text(0.5, 0.5, "等待数据...", ha='center', va='center', color='white',
+                                       transform=ax.transAxes)
+        self.pie_blitter = _Blitter(self.pie_canvas,
+                                    list(self.wedges.values()) + list(self.wedge_labels.values()) + [self.pie_placeholder])
+
+        # 布局只在首次显示和窗口缩放时计算
+        for fig, canvas in ((self.line_fig, self.line_canvas), (self.pie_fig, self.pie_canvas)):
+            fig.tight_layout()
+            canvas.mpl_connect("resize_event", lambda event, fig=fig: fig.tight_layout())
+
+        # 初始绘制一次（显示历史数据或空图表）
         self._redraw_charts()
 
-    def add_behavior_data(self, timestamp: datetime, behavior_num: str):
-        """
-        [主线程调用] 添加新的行为数据点。
-        使用线程锁来确保数据添加的线程安全。
-        """
-        with self.data_lock:
-            if behavior_num not in self.behavior_map:
-                behavior_num = "0" # 安全兜底
-            self.behavior_history.append((timestamp, behavior_num))
-            self.behavior_counts[behavior_num] += 1
-            
-            # 限制历史记录的长度，防止内存无限增长
-            if len(self.behavior_history) > 100:
-                self.behavior_history.pop(0)
+    def _on_new_observation(self, observation: dict):
+        """[写入观察的线程] 共享观察序列有新数据，标记需要重绘。"""
+        self.data_changed.set()
 
     def _update_charts_loop(self):
-        """[后台线程] 定期刷新图表。"""
-        while self.running:
-            time.sleep(5) # 每5秒刷新一次
+        """[后台线程] 定期检查数据是否变化，有变化才在主线程中重绘。"""
+        while not self.stop_event.wait(config.CHART_REFRESH_SECONDS):
+            if not self.data_changed.is_set():
+                self.counts.incr("skipped")
+                continue
+            self.data_changed.clear()
             try:
                 # 在主UI线程中安全地调用重绘函数
                 self.parent_frame.after(0, self._redraw_charts)
@@ -90,66 +206,169 @@ class BehaviorVisualizer:
                 print(f"图表更新线程调度错误: {e}")
 
     def _redraw_charts(self):
-        """[主线程调用] 在主线程中重新绘制所有图表，确保UI操作的线程安全。"""
-        with self.data_lock: # 读取数据时加锁
-            self._update_line_chart(self.behavior_history)
-            self._update_pie_chart(self.behavior_counts)
-
-    def _update_line_chart(self, history):
-        """用最新数据更新折线图。"""
-        self.line_ax.clear()
-        self.line_ax.set_title("行为随时间变化", color='white')
-        self.line_ax.set_xlabel("时间", color='white')
-        self.line_ax.tick_params(axis='x', colors='white', rotation=30)
-        self.line_ax.tick_params(axis='y', colors='white')
-        for spine in self.line_ax.spines.values():
-            spine.set_edgecolor('gray')
-        
-        self.line_ax.set_yticks(range(1, 8))
-        self.line_ax.set_yticklabels([self.behavior_map[str(i)] for i in range(1, 8)])
-        self.line_ax.set_ylim(0.5, 7.5)
-
-        if history:
-            times, behaviors = zip(*history)
-            behavior_ints = [int(b) for b in behaviors]
-            
-            self.line_ax.plot(times, behavior_ints, color='gray', linestyle='--', alpha=0.5, marker='o', markersize=4)
-            self.line_ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M:%S'))
-        
-        self.line_ax.grid(True, linestyle='--', alpha=0.2, color='gray')
-        self.line_fig.tight_layout()
-        self.line_canvas.draw()
+        """[主线程调用] 原地更新两个图表，确保UI操作的线程安全。"""
+        if self.history is not None:
+            return  # 历史视图是一个固定时间段的快照，不随新数据刷新
+        started = time.perf_counter()
+        self._update_line_chart(self._line_data())
+        self._update_pie_chart(self._pie_data())
+        self.redraw_ms.add((time.perf_counter() - started) * 1000)
+        self.counts.incr("redraws")
+
+    def _line_data(self) -> tuple:
+        """折线图数据：共享观察序列中最近的若干条，返回 (matplotlib日期数组, 行为编号数组)。"""
+        ts, behavior, _ = self.series.window(last=self.line_points)
+        times = to_datenums(ts / 1000.0)
+        behavior = behavior.copy()
+        behavior[(behavior < 0) | (behavior > 7)] = 0
+        return times, behavior
+
+    def _pie_data(self) -> dict:
+        """饼图数据：优先使用统计引擎中今天的各行为时长。"""
+        if self.rollups is None:
+            counts = {}
+            for num, n in self.series.behavior_counts().items():
+                num = num if num in self.behavior_map else "0"
+                counts[num] = counts.get(num, 0) + n
+            return counts
+        return seconds_by_behavior(self.rollups.today())
+
+    def _update_line_chart(self, data, relimit: bool = False):
+        """用 set_data 更新折线；新数据超出当前时间范围（或 relimit）时才移动坐标轴并完整重绘一次。"""
+        times, behaviors = data
+        self.line.set_data(times, behaviors)
+        if len(times):
+            left, right = self.line_ax.get_xlim()
+            if relimit or times[-1] > right or times[0] < left - 1:
+                # 右侧留出1/4的空白，之后一段时间内的新数据都只需要blit
+                span = max(times[-1] - times[0], 10 / 1440)
+                self.line_ax.set_xlim(times[0] - span * 0.02, times[-1] + span * 0.25)
+                self.line_canvas.draw()
+                self.counts.incr("full_draws")
+                return
+        if self.line_blitter.update():
+            self.counts.incr("blits")
 
     def _update_pie_chart(self, counts):
-        """用最新分布更新饼图。"""
-        self.pie_ax.clear()
-        self.pie_ax.set_title("行为分布", color='white')
-        
-        valid_sizes, valid_labels, valid_colors = [], [], []
-        for num, count in counts.items():
-            if count > 0 and num != "0": # 只显示有数据的、非"未识别"的行为
-                valid_sizes.append(count)
-                valid_labels.append(self.behavior_map[num])
-                valid_colors.append(self.behavior_colors[num])
-
-        if not valid_sizes:
-            self.pie_ax.text(0.5, 0.5, "等待数据...", ha='center', va='center', color='white', transform=self.pie_ax.transAxes)
+        """原地修改各扇形的角度和百分比标签。"""
+        total = sum(v for num, v in counts.items() if v > 0 and num != "0") # 不显示"未识别"
+        angle = 90.0
+        for num, wedge in self.wedges.items():
+            value = counts.get(num, 0)
+            share = value / total if total and value > 0 else 0.0
+            wedge.set_theta1(angle)
+            wedge.set_theta2(angle + share * 360)
+            wedge.set_visible(share > 0)
+            label = self.wedge_labels[num]
+            if share > 0:
+                middle = math.radians(angle + share * 180)
+                label.set_position((0.6 * math.cos(middle), 0.6 * math.sin(middle)))
+                label.set_text(f"{share * 100:.1f}%")
+            else:
+                label.set_text("")
+            angle += share * 360
+        self.pie_placeholder.set_visible(not total)
+        self.pie_blitter.update()
+
+    # --- 长时间范围视图 ---
+
+    def _on_range_selected(self, value: str):
+        """[主线程] 切换显示范围：“实时”显示共享序列中的最近观察，其余范围在后台从数据库加载。"""
+        if value not in self.HISTORY_RANGES:
+            self.history = None
+            self.line.set_markersize(4)
+            self.line_ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M:%S'))
+            self.pie_ax.set_title(self.pie_title, color='white')
+            self._update_line_chart(self._line_data(), relimit=True)
+            self._update_pie_chart(self._pie_data())
+            self.line_canvas.draw_idle()
+            self.pie_canvas.draw_idle()
+            self.toolbar.update()
+            return
+        end = datetime.now()
+        start = end - self.HISTORY_RANGES[value]
+        threading.Thread(target=self._load_history, args=(value, start, end), daemon=True).start()
+
+    def _load_history(self, label: str, start: datetime, end: datetime):
+        """[后台线程] 读取这段时间的时间线，并从预聚合统计计算行为分布。"""
+        started = time.perf_counter()
+        try:
+            ts, behavior = self.store.load_timeline(start, end)
+            behavior[(behavior < 0) | (behavior > 7)] = 0
+            pie = self._range_distribution(start, end, behavior)
+        except Exception as e:
+            print(f"加载历史数据时出错: {e}")
+            return
+        data = {"label": label, "start": start, "end": end, "times": to_datenums(ts),
+                "behavior": behavior, "pie": pie}
+        print(f"已加载最近{label}的 {len(ts)} 条观察，耗时 {(time.perf_counter() - started) * 1000:.0f} ms")
+        self.parent_frame.after(0, self._apply_history, data)
+
+    def _range_distribution(self, start: datetime, end: datetime, behavior: np.ndarray) -> dict:
+        """历史视图的饼图数据：两天以内用小时统计、更长的范围用天统计；没有统计引擎时按观察次数。"""
+        if self.rollups is None:
+            counts = np.bincount(behavior.astype(np.int64), minlength=8)
+            return {str(num): int(n) for num, n in enumerate(counts) if n}
+        granularity = "hour" if end - start <= timedelta(days=2) else "day"
+        return seconds_by_behavior(merge_buckets(self.rollups.range(granularity, start, end).values()))
+
+    def _apply_history(self, data: dict):
+        """[主线程] 显示加载好的历史数据（加载期间用户又切换了范围时丢弃）。"""
+        if self.range_selector.get() != data["label"]:
+            return
+        self.history = None  # 设置范围时不触发重新降采样，下面直接完整绘制一次
+        self.line_ax.set_xlim(mdates.date2num(data["start"]), mdates.date2num(data["end"]))
+        self.history = data
+        self.line.set_markersize(2)
+        # 跨天的范围下刻度需要带上日期
+        locator = self.line_ax.xaxis.get_major_locator()
+        self.line_ax.xaxis.set_major_formatter(mdates.ConciseDateFormatter(locator))
+        self.pie_ax.set_title(f"最近{data['label']}行为时长分布" if self.rollups else f"最近{data['label']}行为分布",
+                              color='white')
+        self._render_history_view(full=True)
+        self._update_pie_chart(data["pie"])
+        self.pie_canvas.draw_idle()
+        self.toolbar.update()  # 工具栏的“主页”回到这个范围
+
+    def _on_xlim_changed(self, ax):
+        """平移/缩放改变了可见范围：稍后按新的范围重新降采样（连续拖动时合并为一次）。"""
+        if self.history is None:
+            return
+        if self.history_render_id is not None:
+            self.parent_frame.after_cancel(self.history_render_id)
+        self.history_render_id = self.parent_frame.after(config.CHART_HISTORY_RENDER_DELAY_MS,
+                                                         self._render_history_view)
+
+    def _render_history_view(self, full: bool = False):
+        """[主线程] 取当前可见范围内的历史数据，用LTTB降采样后更新折线。"""
+        self.history_render_id = None
+        if self.history is None:
+            return
+        started = time.perf_counter()
+        times, behavior = self.history["times"], self.history["behavior"]
+        left, right = self.line_ax.get_xlim()
+        # 两侧各多取一个点，使折线延伸到可见范围的边缘
+        lo = max(int(np.searchsorted(times, left)) - 1, 0)
+        hi = min(int(np.searchsorted(times, right)) + 1, len(times))
+        keep = lttb(times[lo:hi], behavior[lo:hi], config.CHART_MAX_POINTS)
+        self.line.set_data(times[lo:hi][keep], behavior[lo:hi][keep])
+        if full:
+            self.line_canvas.draw_idle()
         else:
-            wedges, texts, autotexts = self.pie_ax.pie(
-                valid_sizes, autopct='%1.1f%%', colors=valid_colors,
-                startangle=90, textprops={'color': 'white', 'fontsize': 9}
-            )
-            self.pie_ax.legend(wedges, valid_labels, title="行为类型",
-                               loc="center left", bbox_to_anchor=(0.95, 0.5),
-                               frameon=False, labelcolor='white', fontsize='small')
-        
-        self.pie_ax.axis('equal')
-        self.pie_fig.tight_layout()
-        self.pie_canvas.draw()
+            self.line_blitter.update()
+        self.redraw_ms.add((time.perf_counter() - started) * 1000)
+        self.counts.incr("history_renders")
+
+    def get_stats(self) -> dict:
+        data = self.counts.snapshot()
+        data["redraw_ms"] = self.redraw_ms.snapshot()
+        return data
 
     def stop(self):
         """停止后台更新线程。"""
         self.running = False
+        self.stop_event.set()
+        self.series.unsubscribe(self._on_new_observation)
         if self.update_thread and self.update_thread.is_alive():
             self.update_thread.join(timeout=1.0)
-        print("BehaviorVisualizer 已成功停止。")
\ No newline at end of file
+        print(f"BehaviorVisualizer 已成功停止。图表刷新统计: {self.get_stats()}")
@@ -0,0 +1,124 @@
+# ai_assistant/ui/export.py
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from ai_assistant.core.observation_store import ObservationStore
+from ai_assistant.core.rollups import bucket_key, format_rollup, merge_buckets
+from ai_assistant.ui.figures import FIGURES, BACKGROUND
+from ai_assistant.utils import config
+
+
+def build_tasks(db_paths: list, start: datetime, end: datetime, out_dir: str, formats: list,
+                per_day: bool = False, figures: list = None) -> list:
+    """
+    把一次导出拆成互相独立的任务：每个数据库（每个用户）× 每个时间段（整段或逐天）× 每张图表各一个任务，
+    另外每个时间段再加一个统计文本任务。输出目录为 out_dir/<数据库名>/<时间段>/。
+    """
+    figures = figures or list(FIGURES)
+    spans = []
+    if per_day:
+        day = start
+        while day < end:
+            spans.append((day, min(day + timedelta(days=1), end)))
+            day += timedelta(days=1)
+    else:
+        spans.append((start, end))
+
+    tasks = []
+    for db_path in db_paths:
+        user = os.path.splitext(os.path.basename(db_path))[0]
+        for span_start, span_end in spans:
+            label = span_start.strftime('%Y-%m-%d')
+            if span_end - span_start > timedelta(days=1):
+                label += "_" + (span_end - timedelta(seconds=1)).strftime('%Y-%m-%d')
+            target = os.path.join(out_dir, user, label)
+            common = {"db": db_path, "start": span_start, "end": span_end, "dir": target}
+            tasks += [dict(common, kind=name, formats=formats) for name in figures]
+            tasks.append(dict(common, kind="summary"))
+    return tasks
+
+
+def render_task(task: dict) -> list:
+    """
+    [工作进程] 执行一个导出任务，返回写出的文件路径。
+    只使用 Agg 画布，不需要显示器；每个进程各自打开数据库连接。
+    """
+    os.makedirs(task["dir"], exist_ok=True)
+    store = ObservationStore(task["db"])
+    try:
+        if task["kind"] == "summary":
+            days = store.load_rollups("day", bucket_key("day", task["start"]),
+                                      bucket_key("day", task["end"] - timedelta(seconds=1)))
+            path = os.path.join(task["dir"], "summary.txt")
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(format_rollup(merge_buckets(days.values())) + "\n")
+            return [path]
+
+        draw, size = FIGURES[task["kind"]]
+        fig = Figure(figsize=size, dpi=config.EXPORT_DPI)
+        FigureCanvasAgg(fig)
+        fig.patch.set_facecolor(BACKGROUND)
+        draw(fig, store, task["start"], task["end"])
+    finally:
+        store.close()
+    fig.tight_layout()
+    paths = []
+    for fmt in task["formats"]:
+        path = os.path.join(task["dir"], f"{task['kind']}.{fmt}")
+        fig.savefig(path, format=fmt, facecolor=fig.get_facecolor())
+        paths.append(path)
+    return paths
+
+
+def export(db_paths: list, start: datetime, end: datetime, out_dir: str, formats: list = None,
+           per_day: bool = False, figures: list = None, workers: int = None) -> list:
+    """
+    批量导出图表与统计文本，返回写出的全部文件路径。
+    各任务互不依赖，分发到进程池并行渲染（matplotlib 渲染受GIL限制，线程池无法并行）；
+    workers=1 时在当前进程中顺序执行。
+    数据库文件不存在时抛出 FileNotFoundError（否则 sqlite 会新建一个空库，导出空白图表）。
+    """
+    missing = [path for path in db_paths if not os.path.exists(path)]
+    if missing:
+        raise FileNotFoundError(f"找不到观察记录数据库: {', '.join(missing)}")
+    tasks = build_tasks(db_paths, start, end, out_dir, formats or ["png"], per_day, figures)
+    workers = workers or min(len(tasks), os.cpu_count() or 1)
+    if workers <= 1:
+        results = [render_task(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(render_task, tasks))
+    return [path for paths in results for path in paths]
+
+
+def main(argv=None):
+    """命令行入口：无界面地导出指定日期范围的图表，可用于定时任务或服务器。"""
+    import argparse
+
+    today = datetime.now().strftime('%Y-%m-%d')
+    parser = argparse.ArgumentParser(description="把行为时间线、行为分布和情绪热力图导出为 PNG/SVG")
+    parser.add_argument("--start", default=today, help="开始日期 YYYY-MM-DD（含），默认今天")
+    parser.add_argument("--end", default=None, help="结束日期 YYYY-MM-DD（含），默认与开始日期相同")
+    parser.add_argument("--db", nargs="+", default=[config.OBSERVATION_DB_PATH],
+                        help="一个或多个观察记录数据库（每个用户一个）")
+    parser.add_argument("--out", default=config.EXPORT_DIR, help="输出目录")
+    parser.add_argument("--format", nargs="+", choices=["png", "svg"], default=["png"], help="输出格式")
+    parser.add_argument("--figures", nargs="+", choices=list(FIGURES), default=None, help="只导出部分图表")
+    parser.add_argument("--per-day", action="store_true", help="范围内每天单独导出一组")
+    parser.add_argument("--workers", type=int, default=None, help="并行进程数，默认按CPU核数")
+    args = parser.parse_args(argv)
+    missing = [path for path in args.db if not os.path.exists(path)]
+    if missing:
+        parser.error(f"找不到观察记录数据库: {', '.join(missing)}")
+
+    start = datetime.strptime(args.start, '%Y-%m-%d')
+    end = datetime.strptime(args.end or args.start, '%Y-%m-%d') + timedelta(days=1)
+    started = time.perf_counter()
+    paths = export(args.db, start, end, args.out, args.format, args.per_day, args.figures, args.workers)
+    print(f"已导出 {len(paths)} 个文件到 {args.out}，耗时 {time.perf_counter() - started:.1f} 秒")
@@ -0,0 +1,123 @@
+# ai_assistant/ui/figures.py
+
+from datetime import datetime, timedelta
+
+import matplotlib.dates as mdates
+import numpy as np
+
+from ai_assistant.core.rollups import bucket_key, merge_buckets
+from ai_assistant.utils import config
+from ai_assistant.utils.downsample import lttb
+
+
+# 行为编号 -> 图表中显示的名称与颜色，实时图表和离线导出共用
+BEHAVIOR_LABELS = {
+    "1": "专注工作", "2": "吃东西", "3": "喝水", "4": "喝饮料",
+    "5": "玩手机", "6": "睡觉", "7": "其他", "0": "未识别"
+}
+BEHAVIOR_COLORS = {
+    "1": "#4CAF50", "2": "#FFC107", "3": "#2196F3", "4": "#9C27B0",
+    "5": "#F44336", "6": "#607D8B", "7": "saddlebrown", "0": "#9E9E9E"
+}
+# 统计引擎按完整的行为描述分桶，这里换算回编号
+DESC_TO_NUM = {
+    "认真专注工作": "1", "吃东西": "2", "用杯子喝水": "3", "喝饮料": "4",
+    "玩手机": "5", "睡觉": "6", "其他": "7", "未识别": "0"
+}
+BACKGROUND = '#242424'
+
+
+def to_datenums(ts_seconds: np.ndarray) -> np.ndarray:
+    """把Unix时间戳（秒）数组转换为 matplotlib 的日期数值（本地时间），向量化计算。"""
+    if not len(ts_seconds):
+        return np.empty(0)
+    base = mdates.date2num(datetime.fromtimestamp(ts_seconds[0]))
+    return base + (ts_seconds - ts_seconds[0]) / 86400.0
+
+
+def seconds_by_behavior(bucket: dict) -> dict:
+    """把统计分桶中按行为描述累计的时长换算为 {行为编号: 秒}。"""
+    seconds = {}
+    for desc, value in bucket["behavior_seconds"].items():
+        num = DESC_TO_NUM.get(desc, "0")
+        seconds[num] = seconds.get(num, 0) + value
+    return seconds
+
+
+def _style_axes(ax, title: str):
+    ax.set_facecolor(BACKGROUND)
+    ax.set_title(title, color='white')
+    ax.tick_params(colors='white')
+    for spine in ax.spines.values():
+        spine.set_edgecolor('gray')
+
+
+def draw_timeline(fig, store, start: datetime, end: datetime):
+    """[无界面] 行为时间线：从数据库读取 [start, end) 的观察，用LTTB降采样后绘制。"""
+    ts, behavior = store.load_timeline(start, end)
+    behavior[(behavior < 0) | (behavior > 7)] = 0
+    times = to_datenums(ts)
+    keep = lttb(times, behavior, config.CHART_MAX_POINTS)
+    ax = fig.add_subplot(111)
+    _style_axes(ax, f"行为时间线（{len(ts)} 条观察）")
+    ax.plot(times[keep], behavior[keep], color='gray', linestyle='--', alpha=0.5, marker='o', markersize=2)
+    ax.set_yticks(range(1, 8))
+    ax.set_yticklabels([BEHAVIOR_LABELS[str(i)] for i in range(1, 8)])
+    ax.set_ylim(0.5, 7.5)
+    ax.set_xlim(mdates.date2num(start), mdates.date2num(end))
+    locator = mdates.AutoDateLocator()
+    ax.xaxis.set_major_locator(locator)
+    ax.xaxis.set_major_formatter(mdates.ConciseDateFormatter(locator))
+    ax.grid(True, linestyle='--', alpha=0.2, color='gray')
+
+
+def draw_distribution(fig, store, start: datetime, end: datetime):
+    """[无界面] 行为时长分布饼图：直接合并 [start, end) 内的日统计分桶。"""
+    days = store.load_rollups("day", bucket_key("day", start), bucket_key("day", end - timedelta(seconds=1)))
+    seconds = seconds_by_behavior(merge_buckets(days.values()))
+    items = [(num, v) for num, v in sorted(seconds.items()) if v > 0 and num != "0"]
+    ax = fig.add_subplot(111)
+    _style_axes(ax, "行为时长分布")
+    if not items:
+        ax.text(0.5, 0.5, "暂无数据", ha='center', va='center', color='white', transform=ax.transAxes)
+        ax.axis('off')
+        return
+    wedges, _, _ = ax.pie(
+        [v for _, v in items], autopct='%1.1f%%', colors=[BEHAVIOR_COLORS[num] for num, _ in items],
+        startangle=90, textprops={'color': 'white', 'fontsize': 9}
+    )
+    ax.legend(wedges, [f"{BEHAVIOR_LABELS[num]} {v / 3600:.1f}小时" for num, v in items], title="行为类型",
+              loc="center left", bbox_to_anchor=(0.95, 0.5), frameon=False, labelcolor='white', fontsize='small')
+    ax.axis('equal')
+
+
+def draw_emotion_heatmap(fig, store, start: datetime, end: datetime):
+    """[无界面] 情绪热力图：各情绪在一天中各小时出现的次数，来自 [start, end) 内的小时统计分桶。"""
+    hours = store.load_rollups("hour", bucket_key("hour", start), bucket_key("hour", end - timedelta(seconds=1)))
+    per_hour = {}
+    for key, b in hours.items():
+        hour = int(key[-2:])
+        for emotion, n in b["emotion_counts"].items():
+            per_hour.setdefault(emotion, np.zeros(24))[hour] += n
+    ax = fig.add_subplot(111)
+    _style_axes(ax, "情绪时段分布（观察次数）")
+    if not per_hour:
+        ax.text(0.5, 0.5, "暂无数据", ha='center', va='center', color='white', transform=ax.transAxes)
+        return
+    emotions = sorted(per_hour, key=lambda e: -per_hour[e].sum())
+    matrix = np.vstack([per_hour[e] for e in emotions])
+    image = ax.imshow(matrix, aspect='auto', cmap='magma', interpolation='nearest', vmin=0)
+    ax.set_yticks(range(len(emotions)))
+    ax.set_yticklabels(emotions)
+    ax.set_xticks(range(0, 24, 2))
+    ax.set_xlabel("小时", color='white')
+    colorbar = fig.colorbar(image, ax=ax)
+    colorbar.ax.tick_params(colors='white')
+
+
+# 可导出的图表：名称 -> (绘制函数, 图尺寸)
+FIGURES = {
+    "timeline": (draw_timeline, (10, 4)),
+    "distribution": (draw_distribution, (6, 4.5)),
+    "emotions": (draw_emotion_heatmap, (10, 4)),
+}
@@ -15,10 +15,70 @@ NEGATIVE_EMOTIONS = ["沮丧", "生气", "疲惫"]
 EMOTION_TRIGGER_THRESHOLD = 6
 
 
+# --- 对话上下文配置 ---
+# 每次请求DeepSeek时上下文的token预算（本地估算），超出部分会被折叠为摘要
+CONTEXT_TOKEN_BUDGET = 2000
+# 超出预算时一次性移出旧消息，直到剩余部分低于预算的这个比例。
+# 这样前缀在多轮对话中保持不变，有利于DeepSeek的上下文缓存命中
+CONTEXT_EVICT_TARGET_RATIO = 0.6
+# 滚动摘要的最大字数
+CONTEXT_SUMMARY_MAX_CHARS = 300
+
+
+# --- 语音片段合并配置 ---
+# 一段语音转录后再等多久，把紧接着的后续片段合并成同一轮提问（毫秒）。
+# 片段以句末标点结尾时用较短的窗口，说到一半时用较长的窗口
+VOICE_COALESCE_MIN_WINDOW_MS = 400
+VOICE_COALESCE_MAX_WINDOW_MS = 1200
+# 少于该字数的片段即使有句末标点也按“没说完”处理
+VOICE_COALESCE_SHORT_FRAGMENT_CHARS = 4
+# 上一轮已提交后，多少秒内到达的新片段仍会取消上一轮并合并重新提交
+VOICE_COALESCE_RESUBMIT_SECONDS = 4.0
+
+# --- 消息调度配置 ---
+# 同时执行的LLM任务数上限（语音、关怀、总结、图像分析各有独立通道）
+SCHEDULER_MAX_CONCURRENT_JOBS = 2
+# 各通道独占的额外并发名额（不计入上面的共享上限），语音提问因此不会等其他任务让出名额
+SCHEDULER_RESERVED_SLOTS = {"voice": 1}
+# 允许被更高优先级任务取消的任务类型。图像分析的回应时效性强，过时即可放弃；
+# 用户提问、主动关怀和每日总结不会被打断。
+SCHEDULER_PREEMPTIBLE_TYPES = {"image_analysis"}
+
+
+# --- 预生成回复配置 ---
+# 是否在空闲时预先生成并合成下一次状态变化时可能用到的回复
+SPECULATOR_ENABLED = True
+# 候选缓存容量与有效期（秒）
+SPECULATOR_CACHE_SIZE = 3
+SPECULATOR_TTL_SECONDS = 600
+# 每次最多为几个候选状态预生成
+SPECULATOR_MAX_CANDIDATES = 2
+# 连续观察到多少次专注工作后，开始预生成“疲惫”时的关怀回复
+SPECULATOR_FOCUS_STREAK = 6
+
 # --- 每日总结报告配置 ---
 # 触发每日总结的时间 (24小时制)
 DAILY_SUMMARY_HOUR = 18  # 晚上6点
 DAILY_SUMMARY_MINUTE = 0   # 0分
+# 分小时生成摘要时的最大并发请求数，以及每段小时摘要的字数上限
+DAILY_SUMMARY_MAX_CONCURRENCY = 4
+DAILY_SUMMARY_CHUNK_MAX_CHARS = 80
+# 小时摘要请求在费用控制器中的优先级：属于后台批量任务，高于 GOVERNOR_RESERVED_PRIORITY，不占用留给交互请求的预留额度
+DAILY_SUMMARY_CHUNK_PRIORITY = 2
+
+# --- 本地检索配置 ---
+# 回答语音提问时，从过去的观察、统计和对话中检索最相关的几条放进prompt
+RETRIEVAL_TOP_K = 5
+# 单条片段与检索背景总长度的上限（字），保证prompt大小有界
+RETRIEVAL_SNIPPET_MAX_CHARS = 120
+RETRIEVAL_MAX_PROMPT_CHARS = 600
+# 观察时间段文档中保留的图像分析原文长度
+RETRIEVAL_ANALYSIS_MAX_CHARS = 60
+# 提问包含时间表达（如“昨天午饭前”）时，落在该时间范围内的文档额外加的分数
+RETRIEVAL_TIME_BOOST = 3.0
+# 索引中最多保留的文档数（超出时淘汰最旧的），以及启动时载入最近几天的历史
+RETRIEVAL_MAX_DOCS = 20000
+RETRIEVAL_BOOTSTRAP_DAYS = 7
 
 
 
@@ -39,12 +99,86 @@ DEEPSEEK_BASE_URL = 'https://api.deepseek.com'
 QWEN_API_KEY = "xxxxxxxxxxxxx"
 QWEN_BASE_URL = "https://dashscope.aliyuncs.com/compatible-mode/v1"
 
+# --- 网络传输配置 (DeepSeek / Qwen / OSS / TTS) ---
+# 是否启用 HTTP/2（需要安装 h2: pip install "httpx[http2]"，未安装时自动使用 HTTP/1.1）
+HTTP2_ENABLED = True
+# 连接池大小与 keep-alive 连接的空闲保留时间（秒）
+HTTP_MAX_CONNECTIONS = 20
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 10
+HTTP_KEEPALIVE_EXPIRY_SECONDS = 60
+# 各端点的超时（秒）。read 对流式请求而言是两个数据块之间的最长间隔
+HTTP_TIMEOUTS = {
+    "default": {"connect": 5.0, "read": 30.0, "write": 10.0, "pool": 5.0},
+    "deepseek": {"read": 30.0},
+    "qwen": {"read": 45.0},   # 多张图片的视觉分析耗时较长
+    "oss": {"connect": 5.0, "read": 15.0},
+    "tts": {"read": 20.0},
+}
+# 幂等请求失败后的最大重试次数，以及指数退避的基数与上限（秒）
+HTTP_MAX_RETRIES = 2
+HTTP_RETRY_BASE_DELAY_SECONDS = 0.5
+HTTP_RETRY_MAX_DELAY_SECONDS = 4.0
+# 熔断器：连续失败多少次后熔断，熔断多久后放行一次试探请求（秒）
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_RESET_SECONDS = 30
+# 视觉模型请求对冲：超过历史延迟的该分位数仍未返回时，再发一个相同请求，先返回者胜出
+VL_HEDGE_ENABLED = True
+VL_HEDGE_PERCENTILE = 90
+# 对冲请求占全部请求的比例上限（额外开销上限）
+VL_HEDGE_MAX_RATIO = 0.1
+# 积累多少个延迟样本后才开始对冲，以及最短的对冲等待时间（秒）
+VL_HEDGE_MIN_SAMPLES = 10
+VL_HEDGE_MIN_DELAY_SECONDS = 3.0
+
+# --- 限流与费用控制 ---
+# 每个云端服务的请求速率（每分钟、可突发的数量）和每日用量预算。
+# qwen/deepseek 的预算单位是token，tts 的预算单位是字符。
+GOVERNOR_LIMITS = {
+    "qwen": {"rate_per_minute": 4, "burst": 2, "daily_budget": 600000, "unit": "tokens"},
+    "deepseek": {"rate_per_minute": 20, "burst": 6, "daily_budget": 800000, "unit": "tokens"},
+    "tts": {"rate_per_minute": 60, "burst": 15, "daily_budget": 60000, "unit": "chars"},
+}
+# 优先级数值 <= 该值的请求（关怀、用户语音）可以使用预留额度
+GOVERNOR_RESERVED_PRIORITY = 1
+# 令牌桶和每日预算中只留给高优先级请求的比例
+GOVERNOR_RESERVE_RATIO = 0.25
+# 一次多图视觉分析的预估token数，用于请求前的预算检查
+GOVERNOR_VL_ESTIMATED_TOKENS = 3000
+
 # --- TTS (文本转语音) 配置 ---
 TTS_MODEL = "cosyvoice-v1"
 TTS_VOICE = "longwan"
+# TTS调用专用线程池的线程数（dashscope 调用超时后无法中止，线程数即卡住调用数的上限）
+TTS_MAX_WORKERS = 2
+
+# TTS播报调度：各优先级条目的存活时间（秒），超时未播放则丢弃。
+# 0=主动关怀/每日总结, 1=回答用户提问, 2=图像分析的常规回应
+TTS_TTL_SECONDS = {0: 120, 1: 60, 2: 15}
+# 等待合成的条目上限，超过时丢弃最不重要且最旧的条目
+TTS_MAX_PENDING = 2
 
 # --- SenseVoice ASR (语音识别) 配置 ---
 ASR_MODEL_DIR = "iic/SenseVoiceSmall"
+# 推理设备: "auto" 表示有CUDA显卡时用 "cuda:0"，否则用 "cpu"；也可以直接指定设备名
+ASR_DEVICE = "auto"
+# 推理后端: "torch" (FunASR原生, fp32) 或 "onnx" (onnxruntime CPU推理，适合无显卡的机器)
+ASR_BACKEND = "torch"
+# onnx 后端是否使用 int8 量化模型
+ASR_ONNX_QUANTIZE = True
+# CPU推理线程数，None 表示自动（逻辑核数的一半）
+ASR_NUM_THREADS = None
+# 转录请求等待模型加载完成的最长时间（秒）
+ASR_READY_TIMEOUT_SECONDS = 60
+# 是否在独立子进程中运行ASR推理，避免与界面和摄像头循环争抢GIL
+ASR_OUT_OF_PROCESS = True
+# 子进程健康检查间隔与 ping 超时（秒）
+ASR_HEALTH_CHECK_INTERVAL_SECONDS = 5
+ASR_PING_TIMEOUT_SECONDS = 3
+# 单次转录的最长等待时间（秒）
+ASR_TRANSCRIBE_TIMEOUT_SECONDS = 30
+# ASR后端对比测试的音频目录：放入若干 .wav (16kHz 单声道) 和一个 transcripts.txt，
+# 每行格式为 "文件名<TAB>参考文本"
+ASR_BENCHMARK_DIR = "asr_fixtures"
 
 # --- 音频录制配置 ---
 AUDIO_CHUNK = 1024
@@ -52,9 +186,47 @@ AUDIO_FORMAT = 16  # 对应 pyaudio.paInt16
 AUDIO_CHANNELS = 1
 AUDIO_RATE = 16000
 AUDIO_WAVE_OUTPUT_FILENAME = "output.wav"
+# 读取前输入缓冲区积压达到多少个 AUDIO_CHUNK 时计为一次输入溢出（读取跟不上采集）
+AUDIO_INPUT_OVERFLOW_CHUNKS = 4
+# 音频设备出错（如麦克风被拔出）后，重新初始化前的等待时间（秒）
+AUDIO_RECOVERY_BACKOFF_SECONDS = 1.0
+
+# --- 统计聚合配置 ---
+# 两次观察间隔超过该值（秒）时视为离开，这段时间不计入任何行为
+ROLLUP_MAX_GAP_SECONDS = 120
+# 内存中保留的分钟级分桶数量，更早的分桶只在数据库中
+ROLLUP_MEMORY_MINUTES = 180
 
 # --- 日志文件配置 ---
+# 日志按天写入 LOG_DIR/behavior_log_<日期>.txt，跨天后压缩进 LOG_DIR/archive/
 LOG_FILE = "behavior_log.txt"
+LOG_DIR = "logs"
+# 后台写线程的队列长度（满了之后丢弃新日志并计数）与批量写入间隔（秒）
+LOG_QUEUE_SIZE = 2000
+LOG_FLUSH_INTERVAL_SECONDS = 1.0
+# fsync 策略: "always" 每批都落盘, "interval" 每隔 LOG_FSYNC_INTERVAL_SECONDS 落盘一次, "never" 交给操作系统
+LOG_FSYNC_POLICY = "interval"
+LOG_FSYNC_INTERVAL_SECONDS = 30
+# 归档保留天数，超过后删除，使磁盘占用有上限；旧版日志的归档 (archive/legacy/) 不受影响
+LOG_RETENTION_DAYS = 90
+
+# --- 观察记录数据库配置 ---
+OBSERVATION_DB_PATH = "observations.db"
+# 后台写线程每批最多写入的记录数，以及最长攒批时间（秒）
+OBSERVATION_STORE_BATCH_SIZE = 50
+OBSERVATION_STORE_FLUSH_SECONDS = 1.0
+# 内存中共享的观察时间序列（环形缓冲区）的容量：按最快每5秒一次观察，可容纳一整天
+OBSERVATION_SERIES_CAPACITY = 17280
+
+# --- 可视化图表配置 ---
+# 图表检查新数据的间隔（秒）；没有新观察时跳过重绘
+CHART_REFRESH_SECONDS = 5
+# 历史视图中时间线最多绘制的点数（超出时用LTTB降采样），以及平移缩放后重新降采样前的等待（毫秒）
+CHART_MAX_POINTS = 1500
+CHART_HISTORY_RENDER_DELAY_MS = 150
+# 无界面批量导出图表 (run_export_charts.py) 的默认输出目录与分辨率
+EXPORT_DIR = "exports"
+EXPORT_DPI = 120
 
 # --- Matplotlib 中文字体配置 ---
 # 尝试加载系统中的中文字体，以确保图表能正确显示中文。
@@ -0,0 +1,34 @@
+# ai_assistant/utils/downsample.py
+
+import numpy as np
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets 降采样，返回保留点的下标（按顺序）。
+    首尾两点总是保留；其余数据均分为 threshold-2 个桶，每个桶保留与
+    “上一个保留点”和“下一个桶的平均点”构成的三角形面积最大的那个点，
+    因此行为切换这类突变会被保留下来，而不是被平均掉。
+    点数不超过 threshold 时原样返回全部下标。
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    every = (n - 2) / (threshold - 2)
+    edges = (np.arange(threshold - 1) * every).astype(np.int64) + 1
+    edges[-1] = n - 1
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_lo, next_hi = hi, (edges[i + 2] if i + 2 < len(edges) else n)
+        avg_x = x[next_lo:next_hi].mean()
+        avg_y = y[next_lo:next_hi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(area.argmax())
+        selected[i + 1] = a
+    return selected
@@ -2,8 +2,6 @@
 
 import re
 from typing import Tuple
-import json
-from datetime import datetime
 
 def extract_emotion_type(analysis_text: str) -> str:
     """
@@ -48,30 +46,6 @@ def extract_language_emotion_content(text: str) -> str:
     # 如果没有匹配到格式，则返回原始文本（做安全兜底）
     return text.strip()
 
-def log_observation_to_file(observation: dict):
-    """
-    将单条观察记录以JSON格式追加到每日日志文件中。
-    文件名会根据日期自动创建，例如 'observation_log_2023-10-27.jsonl'
-    """
-    # 将datetime对象转换为ISO格式的字符串，方便之后读取
-    if 'timestamp' in observation and isinstance(observation['timestamp'], datetime):
-        observation['timestamp'] = observation['timestamp'].isoformat()
-        
-    # 获取当天的日期作为文件名的一部分
-    today_str = datetime.now().strftime('%Y-%m-%d')
-    log_file_path = f'observation_log_{today_str}.jsonl'
-    
-    try:
-        # 使用 'a' (append) 模式，将记录作为新的一行追加到文件末尾
-        with open(log_file_path, 'a', encoding='utf-8') as f:
-            # json.dumps将字典转换为JSON字符串
-            # ensure_ascii=False 确保中文字符能被正确写入
-            f.write(json.dumps(observation, ensure_ascii=False) + '\n')
-    except Exception as e:
-        print(f"写入观察日志文件时出错: {e}")
-
-
-
 def extract_behavior_type(analysis_text: str) -> Tuple[str, str]:
     """
     从AI分析文本中提取行为类型编号和描述。
@@ -111,5 +85,26 @@ def extract_behavior_type(analysis_text: str) -> Tuple[str, str]:
     return "0", "未识别"
 
 
+# 句子结束符：遇到这些字符即认为一句话已经完整，可以交给TTS
+_SENTENCE_END_RE = re.compile(r'[。！？!?；;…\n]+[”"』」）)]*')
 
-    
\ No newline at end of file
+def split_completed_sentences(buffer: str, min_length: int = 6) -> Tuple[list, str]:
+    """
+    从流式输出的缓冲区中切出已经完整的句子。
+    过短的句子（如"嗯。"）会与下一句合并，避免TTS频繁合成零碎片段。
+
+    Args:
+        buffer (str): 目前累积、尚未交给TTS的文本。
+        min_length (int): 单独成句的最少字符数。
+
+    Returns:
+        tuple[list, str]: (完整句子列表, 剩余未完成的文本)。
+    """
+    sentences = []
+    start = 0
+    for match in _SENTENCE_END_RE.finditer(buffer):
+        candidate = buffer[start:match.end()].strip()
+        if len(candidate) >= min_length:
+            sentences.append(candidate)
+            start = match.end()
+    return sentences, buffer[start:]
@@ -0,0 +1,178 @@
+# ai_assistant/utils/metrics.py
+
+import threading
+import time
+from collections import Counter, deque
+
+
+class RollingStats:
+    """
+    一个线程安全的滑动窗口统计器，用于记录最近N个耗时样本（单位：秒）。
+    提供均值和分位数（p50/p90/p99），供各模块上报延迟指标。
+    """
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0  # 累计样本数（不受窗口限制）
+
+    def add(self, value: float):
+        """添加一个新样本。"""
+        with self._lock:
+            self._samples.append(value)
+            self.count += 1
+
+    def percentile(self, q: float, default=None):
+        """
+        返回窗口内样本的第q分位数 (0 <= q <= 100)。
+        窗口为空时返回 default。
+        """
+        with self._lock:
+            if not self._samples:
+                return default
+            ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, max(0, int(round(q / 100.0 * (len(ordered) - 1)))))
+        return ordered[index]
+
+    def mean(self, default=None):
+        with self._lock:
+            if not self._samples:
+                return default
+            return sum(self._samples) / len(self._samples)
+
+    def snapshot(self) -> dict:
+        """返回一个便于打印的统计摘要字典。"""
+        return {
+            "count": self.count,
+            "mean": self.mean(),
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+        }
+
+
+class CounterGroup:
+    """线程安全的计数器集合，例如按原因统计丢弃次数。"""
+
+    def __init__(self):
+        self._counts = Counter()
+        self._lock = threading.Lock()
+
+    def incr(self, key: str, amount: int = 1):
+        with self._lock:
+            self._counts[key] += amount
+
+    def get(self, key: str) -> int:
+        with self._lock:
+            return self._counts[key]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self._counts)
+
+
+def format_stats(name: str, stats: dict) -> str:
+    """将 RollingStats.snapshot() 的结果格式化为一行毫秒级的可读文本。"""
+    if not stats.get("count"):
+        return f"{name}: 暂无数据"
+    ms = lambda v: f"{v * 1000:.0f}ms" if v is not None else "-"
+    return (f"{name}: n={stats['count']} 均值={ms(stats['mean'])} "
+            f"p50={ms(stats['p50'])} p90={ms(stats['p90'])} p99={ms(stats['p99'])}")
+
+
+class TurnTracker:
+    """
+    按对话回合记录关键时间点，例如首个token到达(first_token)、首段语音开始播放(first_audio)。
+    每个事件只记录第一次出现，相对回合开始时间的延迟汇总到对应的 RollingStats 中。
+    """
+
+    def __init__(self, max_turns: int = 50):
+        self._starts = {}
+        self._marked = {}
+        self._order = deque(maxlen=max_turns)
+        self._lock = threading.Lock()
+        self.stats = {}  # 事件名 -> RollingStats
+
+    def start(self, turn_id: str):
+        """标记一个回合的开始时间。"""
+        with self._lock:
+            if len(self._order) == self._order.maxlen:
+                old = self._order[0]
+                self._starts.pop(old, None)
+                self._marked.pop(old, None)
+            self._order.append(turn_id)
+            self._starts[turn_id] = time.perf_counter()
+            self._marked[turn_id] = set()
+
+    def mark(self, turn_id: str, event: str):
+        """记录回合内某事件的首次发生，返回相对回合开始的延迟（秒），重复或未知回合返回 None。"""
+        with self._lock:
+            started = self._starts.get(turn_id)
+            if started is None or event in self._marked[turn_id]:
+                return None
+            self._marked[turn_id].add(event)
+            elapsed = time.perf_counter() - started
+            stats = self.stats.setdefault(event, RollingStats())
+        stats.add(elapsed)
+        print(f"[{turn_id}] {event}: {elapsed * 1000:.0f}ms")
+        return elapsed
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            events = dict(self.stats)
+        return {event: stats.snapshot() for event, stats in events.items()}
+
+
+# 进程级单例：LLM 流式回复与 TTS 播放共用，统计每个回合的首token与首段语音延迟
+turn_metrics = TurnTracker()
+
+
+class UsageTracker:
+    """
+    汇总LLM接口返回的 usage 字段：prompt/completion token 数，
+    以及DeepSeek特有的上下文缓存命中 (prompt_cache_hit_tokens) 与未命中 (prompt_cache_miss_tokens) token 数，
+    用于计算本次会话的缓存命中率。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cache_hit_tokens = 0
+        self.cache_miss_tokens = 0
+
+    def record(self, usage) -> dict:
+        """记录一次请求的 usage 对象，返回本次请求的摘要。"""
+        hit = getattr(usage, "prompt_cache_hit_tokens", 0) or 0
+        miss = getattr(usage, "prompt_cache_miss_tokens", 0) or 0
+        prompt = getattr(usage, "prompt_tokens", 0) or 0
+        completion = getattr(usage, "completion_tokens", 0) or 0
+        with self._lock:
+            self.requests += 1
+            self.prompt_tokens += prompt
+            self.completion_tokens += completion
+            self.cache_hit_tokens += hit
+            self.cache_miss_tokens += miss
+        return {"prompt": prompt, "completion": completion, "hit": hit, "miss": miss}
+
+    def hit_rate(self):
+        with self._lock:
+            total = self.cache_hit_tokens + self.cache_miss_tokens
+            return self.cache_hit_tokens / total if total else None
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            data = {
+                "requests": self.requests,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "cache_hit_tokens": self.cache_hit_tokens,
+                "cache_miss_tokens": self.cache_miss_tokens,
+            }
+        data["cache_hit_rate"] = self.hit_rate()
+        return data
+
+
+# 进程级单例：统计本次会话中所有DeepSeek请求的token用量与缓存命中率
+llm_usage = UsageTracker()
@@ -0,0 +1,24 @@
+# run_asr_benchmark.py
+
+# ===============================================================
+# ASR后端对比测试 - 启动入口
+# ===============================================================
+#
+# 如何运行:
+# 1. 在 asr_fixtures/ 目录中放入若干 16kHz 单声道 .wav 文件，
+#    并创建 transcripts.txt，每行格式为 "文件名<TAB>参考文本"。
+# 2. 在项目根目录下，从终端运行此文件:
+#    python run_asr_benchmark.py --backends torch,onnx --threads 4
+#
+# ===============================================================
+
+import sys
+import os
+
+# 将项目根目录添加到Python的模块搜索路径中
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from ai_assistant.core.asr_benchmark import main
+
+if __name__ == "__main__":
+    main()
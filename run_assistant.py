@@ -13,18 +13,23 @@
 
 import sys
 import os
+import time
+
+# 尽早记录启动时间，用于统计从启动到窗口显示的耗时（包含模块导入）
+_launch_time = time.perf_counter()
 
 # 将项目根目录添加到Python的模块搜索路径中
 # 这样做可以确保 `from ai_assistant...` 导入语句能够正确找到模块
 sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
 
-# 从我们的包中导入主应用的入口函数
-from ai_assistant.apps.multimedia_assistant import main
-
 if __name__ == "__main__":
+    # 在 __main__ 保护块内导入主应用：ASR推理子进程以 spawn 方式启动时会重新导入本文件，
+    # 放在这里可以避免子进程加载界面、摄像头等与它无关的模块。
+    from ai_assistant.apps.multimedia_assistant import main
+
     print("===================================")
     print("  正在启动 多模态AI助手... ")
     print("===================================")
     
     # 调用主函数，启动应用
-    main()
\ No newline at end of file
+    main(launch_time=_launch_time)
\ No newline at end of file
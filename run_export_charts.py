@@ -0,0 +1,25 @@
+# run_export_charts.py
+
+# ===============================================================
+# 图表批量导出工具（无界面）- 启动入口
+# ===============================================================
+#
+# 如何运行:
+# 在项目根目录下，从终端运行此文件（不需要显示器，可用于定时任务或服务器）:
+#    python run_export_charts.py                                    # 导出今天
+#    python run_export_charts.py --start 2024-05-01 --end 2024-05-07 --per-day --format png svg
+#    python run_export_charts.py --db alice.db bob.db --workers 4   # 多个用户并行导出
+#
+# ===============================================================
+
+import sys
+import os
+
+# 将项目根目录添加到Python的模块搜索路径中
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+if __name__ == "__main__":
+    # 在 __main__ 保护块内导入：渲染进程池以 spawn 方式启动时会重新导入本文件
+    from ai_assistant.ui.export import main
+
+    main()
@@ -0,0 +1,24 @@
+# run_import_observations.py
+
+# ===============================================================
+# 旧版观察日志迁移工具 - 启动入口
+# ===============================================================
+#
+# 如何运行:
+# 在项目根目录下，从终端运行此文件，把 observation_log_*.jsonl 导入SQLite数据库:
+#    python run_import_observations.py
+#    python run_import_observations.py observation_log_2024-05-01.jsonl --db observations.db
+# 重复运行是安全的，已导入的记录会被忽略。
+#
+# ===============================================================
+
+import sys
+import os
+
+# 将项目根目录添加到Python的模块搜索路径中
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from ai_assistant.core.observation_store import main
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+# run_report.py
+
+# ===============================================================
+# 周/月趋势报表 - 启动入口
+# ===============================================================
+#
+# 如何运行:
+# 在项目根目录下，从终端运行此文件:
+#    python run_report.py                      # 本周与上周对比
+#    python run_report.py --period month       # 本月与上月对比
+#    python run_report.py --period week --offset -1
+# 报表只读取预聚合的日/小时统计，不扫描原始观察记录。
+#
+# ===============================================================
+
+import sys
+import os
+
+# 将项目根目录添加到Python的模块搜索路径中
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from ai_assistant.core.reports import main
+
+if __name__ == "__main__":
+    main()